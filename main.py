@@ -6,10 +6,10 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from src.audio.recorder import AudioRecorder
+from src.keyboard.inputState import InputState
 from src.keyboard.listener import KeyboardManager, check_accessibility_permissions
-from src.transcription.whisper import WhisperProcessor
+from src.transcription import create_processor
 from src.utils.logger import logger
-from src.transcription.senseVoiceSmall import SenseVoiceSmallProcessor
 from src.chat.deepseek import DeepSeekChat
 
 
@@ -91,7 +91,7 @@ class VoiceAssistant:
         self.audio_recorder.start_recording()
     
     def stop_chat_recording(self):
-        """停止录音并处理（对话模式）"""
+        """停止录音并处理（对话模式），在 KeyboardManager 的工作线程中执行"""
         audio = self.audio_recorder.stop_recording()
         if audio == "TOO_SHORT":
             logger.warning("录音时长太短，状态将重置")
@@ -109,9 +109,16 @@ class VoiceAssistant:
                 self.keyboard_manager.type_text("", error)
                 return
                 
-            # 使用 DeepSeek 处理对话
-            response = self.chat_processor.chat(text)
-            self.keyboard_manager.type_text(response)
+            if not text:
+                self.keyboard_manager.type_text(text)
+                return
+
+            if self.keyboard_manager.state != InputState.CHATTING:
+                logger.info("转录期间状态已重置，不再发起对话")
+                return
+
+            # 使用 DeepSeek 流式对话，收到第一个字就开始输入
+            self.keyboard_manager.type_stream(self.chat_processor.stream_chat(text))
         else:
             logger.error("没有录音数据，状态将重置")
             self.keyboard_manager.reset_state()
@@ -126,14 +133,8 @@ class VoiceAssistant:
         self.keyboard_manager.start_listening()
 
 def main():
-    # 判断是 Whisper 还是 SiliconFlow
-    service_platform = os.getenv("SERVICE_PLATFORM", "siliconflow")
-    if service_platform == "groq":
-        audio_processor = WhisperProcessor()
-    elif service_platform == "siliconflow":
-        audio_processor = SenseVoiceSmallProcessor()
-    else:
-        raise ValueError(f"无效的服务平台: {service_platform}")
+    # SERVICE_PLATFORM：groq（Whisper）/ siliconflow（SenseVoice API）/ local（本地 SenseVoice）
+    audio_processor = create_processor()
     try:
         assistant = VoiceAssistant(audio_processor)
         assistant.run()
@@ -1,10 +1,19 @@
+import os
+
 import uvicorn
-from src.front_display.main import app
+
+from src.utils.logger import logger
 
 if __name__ == "__main__":
+    # 多个 worker 时对话历史需要放在进程外（SESSION_STORE=sqlite 或其他共享存储）
+    workers = int(os.getenv("WEB_WORKERS", "1"))
+    if workers > 1 and os.getenv("SESSION_STORE", "memory").lower() == "memory":
+        logger.warning("WEB_WORKERS > 1 时 SESSION_STORE=memory 无法在 worker 之间共享对话历史")
+
     uvicorn.run(
-        app,
+        "src.front_display.main:app",
         host="0.0.0.0",
-        port=8000,
-        ws='websockets'
-    ) 
\ No newline at end of file
+        port=int(os.getenv("WEB_PORT", "8000")),
+        ws='websockets',
+        workers=workers
+    )
@@ -0,0 +1,66 @@
+"""批量识别 / 翻译录音文件
+
+示例：
+    # 识别目录下的所有录音，8 个并发，结果写入 results.jsonl
+    python run_batch.py recordings/ -o results.jsonl --concurrency 8
+
+    # 按清单翻译成英文；中断后重新运行同一命令会跳过已完成的文件
+    python run_batch.py files.txt -o translations.jsonl --mode translations
+
+识别服务由 SERVICE_PLATFORM 选择，ASR_CACHE / ASR_HEDGE 等开关与其他入口一致。
+"""
+import argparse
+import asyncio
+
+from dotenv import load_dotenv
+
+from src.batch.runner import BatchRunner, collect_inputs
+from src.transcription import create_processor
+from src.utils.http_client import aclose_clients
+
+load_dotenv()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="批量识别 / 翻译录音文件")
+    parser.add_argument("inputs", nargs="+", help="目录、清单文件（.txt / .jsonl，每行一个路径）或音频文件")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="结果 JSONL 文件（追加写入）")
+    parser.add_argument("--mode", choices=("transcriptions", "translations"), default="transcriptions")
+    parser.add_argument("--prompt", default="", help="提示词（Whisper 使用）")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时处理的文件数")
+    parser.add_argument("--platform", help="识别服务，默认取 SERVICE_PLATFORM")
+    parser.add_argument("--long-form", action="store_true", help="长录音在静音处分段并发识别")
+    parser.add_argument("--no-preprocess", action="store_true", help="不做重采样和裁剪静音，原样上传")
+    parser.add_argument("--no-recursive", action="store_true", help="只查找目录的第一层")
+    return parser.parse_args()
+
+
+async def main(args):
+    paths = collect_inputs(args.inputs, recursive=not args.no_recursive)
+    if not paths:
+        print("没有找到音频文件")
+        return
+
+    # 不加 --long-form 时沿用 ASR_LONG_FORM 环境变量
+    processor = create_processor(args.platform, long_form=True if args.long_form else None)
+    # 包装层（缓存、分段、对冲）把属性转发给主识别服务
+    print(f"识别服务: {getattr(processor, 'service_platform', '-')}，模型: {getattr(processor, 'DEFAULT_MODEL', None) or '-'}")
+    runner = BatchRunner(
+        processor, args.output,
+        mode=args.mode,
+        prompt=args.prompt,
+        concurrency=args.concurrency,
+        preprocess=not args.no_preprocess,
+    )
+    try:
+        await runner.run(paths)
+    finally:
+        await aclose_clients()
+        print(runner.report())
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        print("已中断，重新运行同一命令即可从断点继续")
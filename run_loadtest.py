@@ -0,0 +1,135 @@
+"""web 语音助手压测
+
+示例：
+    # 启动外部 API 替身和 web 服务，200 个客户端在 10 秒内陆续连上
+    python run_loadtest.py --stub --spawn-server --clients 200 --ramp 10
+
+    # 压测已经在运行的服务（该服务需自行把 *_BASE_URL 指向替身）
+    python run_loadtest.py --url ws://127.0.0.1:8000/ws --wav a.wav --wav b.wav
+
+语音合成（Kokoro）在 web 服务本地执行，不做替换，first_audio 包含真实的合成耗时。
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from src.loadtest.driver import Clip, LoadDriver
+from src.loadtest.stub_server import StubConfig, start_stub_server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="web 语音助手压测")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws", help="WebSocket 地址（--spawn-server 时忽略）")
+    parser.add_argument("--clients", type=int, default=100, help="并发客户端数")
+    parser.add_argument("--turns", type=int, default=1, help="每个客户端的对话回合数")
+    parser.add_argument("--ramp", type=float, default=5.0, help="所有客户端在多少秒内陆续连上")
+    parser.add_argument("--mode", choices=("clip", "stream"), default="clip", help="整段发送或流式发送")
+    parser.add_argument("--no-realtime", action="store_true", help="stream 模式下不按实时速度发送")
+    parser.add_argument("--wav", action="append", default=[], help="录音文件，可重复指定，默认使用合成测试音")
+    parser.add_argument("--idle-timeout", type=float, default=2.0, help="收到音频后多久没有新消息算回合结束")
+    parser.add_argument("--turn-timeout", type=float, default=60.0, help="单个回合的最长等待时间")
+
+    stub = parser.add_argument_group("外部 API 替身")
+    stub.add_argument("--stub", action="store_true", help="在本进程中启动替身服务")
+    stub.add_argument("--stub-port", type=int, default=9100)
+    stub.add_argument("--asr-latency", type=float)
+    stub.add_argument("--chat-first-token", type=float)
+    stub.add_argument("--chat-token-interval", type=float)
+    stub.add_argument("--chat-tokens", type=int)
+    stub.add_argument("--jitter", type=float)
+    stub.add_argument("--error-rate", type=float)
+
+    server = parser.add_argument_group("被测服务")
+    server.add_argument("--spawn-server", action="store_true", help="启动一个 web 服务子进程，外部 API 指向替身")
+    server.add_argument("--server-port", type=int, default=8000)
+    server.add_argument("--server-workers", type=int, default=1)
+    return parser.parse_args()
+
+
+def spawn_server(port, workers, stub_url):
+    env = dict(os.environ)
+    env.update({
+        "SILICONFLOW_BASE_URL": f"{stub_url}/v1",
+        "DEEPSEEK_BASE_URL": f"{stub_url}/v1",
+        "BAIDU_BASE_URL": stub_url,
+    })
+    # 替身不校验密钥，没有配置时填入占位值
+    for key in ("SILICONFLOW_API_KEY", "BAIDU_API_KEY", "BAIDU_SECRET_KEY"):
+        env.setdefault(key, "loadtest")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.front_display.main:app",
+         "--host", "127.0.0.1", "--port", str(port), "--ws", "websockets",
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env
+    )
+
+
+async def wait_for_server(process, port, timeout=300):
+    """等待 web 服务加载完模型（/debug 可访问）"""
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.time() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"web 服务启动失败，退出码 {process.returncode}")
+            try:
+                response = await client.get(f"http://127.0.0.1:{port}/debug", timeout=2)
+                if response.status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(1)
+    raise TimeoutError("等待 web 服务启动超时")
+
+
+async def main(args):
+    stub_server = process = None
+    clips = [Clip.from_file(path) for path in args.wav] or [Clip.synthetic()]
+    url = args.url
+    try:
+        if args.stub or args.spawn_server:
+            config = StubConfig(
+                asr_latency=args.asr_latency,
+                chat_first_token=args.chat_first_token,
+                chat_token_interval=args.chat_token_interval,
+                chat_tokens=args.chat_tokens,
+                jitter=args.jitter,
+                error_rate=args.error_rate,
+            )
+            stub_server, stub_task = await start_stub_server(port=args.stub_port, config=config)
+            print(f"外部 API 替身: http://127.0.0.1:{args.stub_port}")
+
+        if args.spawn_server:
+            process = spawn_server(args.server_port, args.server_workers, f"http://127.0.0.1:{args.stub_port}")
+            print("等待 web 服务启动...")
+            await wait_for_server(process, args.server_port)
+            url = f"ws://127.0.0.1:{args.server_port}/ws"
+
+        driver = LoadDriver(
+            url, clips,
+            clients=args.clients,
+            turns=args.turns,
+            ramp=args.ramp,
+            mode=args.mode,
+            idle_timeout=args.idle_timeout,
+            turn_timeout=args.turn_timeout,
+            realtime=not args.no_realtime,
+        )
+        print(f"开始压测: {args.clients} 个客户端 -> {url}")
+        await driver.run()
+        print(driver.report())
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if stub_server is not None:
+            stub_server.should_exit = True
+            await stub_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -6,7 +6,7 @@ from src.audio.text_to_speech import KokoroTTS
 import sounddevice as sd
 import numpy as np
 from pynput import keyboard
-from src.chat.stream_chat import StreamChat
+from src.chat.segmenter import SentenceSegmenter
 # from src.audio.text_to_speech import KokoroTTS
 # from src.llm.symbol import test
 
@@ -22,7 +22,6 @@ class VoiceAssistant:
         self.deepseek = DeepSeekChat()
         self.tts = KokoroTTS()
         self.is_recording = False
-        self.stream_chat = StreamChat()
         
     def on_press(self, key):
         """按键按下时的回调"""
@@ -72,20 +71,15 @@ class VoiceAssistant:
                 chat_start = time.time()
                 print("AI回复: ", end='', flush=True)
                 
-                current_text = ""
-                for response in self.stream_chat.stream_chat(result):
+                segmenter = SentenceSegmenter()
+                for response in self.deepseek.stream_chat(result):
                     print(response, end='', flush=True)
-                    current_text += response
                     
-                    # 4. 语音合成阶段（流式）
-                    if any(char in response for char in '.!?。！？'):
-                        tts_start = time.time()
-                        try:
-                            audio, _ = self.tts.speak(response)
-                            tts_time = time.time() - tts_start
-                            print(f"\n语音合成耗时: {tts_time:.2f}秒")
-                        except Exception as e:
-                            print(f"\n语音播放失败: {str(e)}")
+                    # 4. 语音合成阶段（流式），凑成完整的句子再合成
+                    for sentence in segmenter.feed(response):
+                        self.speak(sentence)
+                for sentence in segmenter.flush():
+                    self.speak(sentence)
                 
                 chat_time = time.time() - chat_start
                 print(f"\nAI对话总耗时: {chat_time:.2f}秒")
@@ -101,6 +95,18 @@ class VoiceAssistant:
         except AttributeError:
             pass
 
+    def speak(self, sentence):
+        """合成并播放一句话"""
+        if not sentence.strip():
+            return
+        tts_start = time.time()
+        try:
+            audio, _ = self.tts.speak(sentence)
+            tts_time = time.time() - tts_start
+            print(f"\n语音合成耗时: {tts_time:.2f}秒")
+        except Exception as e:
+            print(f"\n语音播放失败: {str(e)}")
+
     def run(self):
         """运行语音助手"""
         print("语音助手已启动，按住 Option/Alt 键开始录音，松开键结束录音...")
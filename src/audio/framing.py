@@ -0,0 +1,112 @@
+"""流式 TTS 音频帧协议
+
+每个二进制 WebSocket 消息是一帧：16 字节头 + 音频数据。
+
+头部（小端）：
+    magic       2s   b"KA"
+    version     B    1
+    codec       B    0 = pcm_s16le，1 = mu-law（8 位，带宽减半）
+    flags       B    FLAG_SENTENCE_START / FLAG_SENTENCE_END
+    reserved    B
+    turn        H    回合编号，浏览器据此丢弃被打断回合的残留帧
+    seq         I    回合内的帧序号
+    sample_rate I    采样率
+
+只有 FLAG_SENTENCE_END 且没有音频数据的帧用来标记一句话结束。
+"""
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"KA"
+VERSION = 1
+HEADER = struct.Struct("<2sBBBBHII")
+HEADER_SIZE = HEADER.size
+
+CODEC_PCM16 = 0
+CODEC_MULAW = 1
+CODECS = {"pcm": CODEC_PCM16, "mulaw": CODEC_MULAW}
+
+FLAG_SENTENCE_START = 1
+FLAG_SENTENCE_END = 2
+
+_MULAW_MU = 255.0
+
+
+def mulaw_encode(audio: np.ndarray) -> np.ndarray:
+    """[-1, 1] 浮点采样 -> 8 位 mu-law"""
+    audio = np.clip(audio, -1.0, 1.0)
+    compressed = np.sign(audio) * np.log1p(_MULAW_MU * np.abs(audio)) / np.log1p(_MULAW_MU)
+    return ((compressed + 1) / 2 * 255 + 0.5).astype(np.uint8)
+
+
+def mulaw_decode(data: np.ndarray) -> np.ndarray:
+    """8 位 mu-law -> [-1, 1] 浮点采样"""
+    compressed = data.astype(np.float32) / 255 * 2 - 1
+    return np.sign(compressed) * ((1 + _MULAW_MU) ** np.abs(compressed) - 1) / _MULAW_MU
+
+
+def encode_samples(audio: np.ndarray, codec: int) -> bytes:
+    if codec == CODEC_MULAW:
+        return mulaw_encode(audio).tobytes()
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+def decode_samples(payload: bytes, codec: int) -> np.ndarray:
+    if codec == CODEC_MULAW:
+        return mulaw_decode(np.frombuffer(payload, dtype=np.uint8))
+    return np.frombuffer(payload, dtype='<i2').astype(np.float32) / 32768
+
+
+def parse_frame(data: bytes):
+    """解析一帧，返回 (头部字段 dict, 音频 payload)"""
+    magic, version, codec, flags, _, turn, seq, sample_rate = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("不是音频帧")
+    header = {
+        "version": version,
+        "codec": codec,
+        "flags": flags,
+        "turn": turn,
+        "seq": seq,
+        "sample_rate": sample_rate,
+    }
+    return header, data[HEADER_SIZE:]
+
+
+class AudioFramer:
+    """把合成出的浮点音频切成固定时长的帧"""
+
+    FRAME_MS = int(os.getenv("TTS_FRAME_MS", "200"))
+    DEFAULT_CODEC = os.getenv("TTS_AUDIO_CODEC", "pcm")
+
+    def __init__(self, sample_rate, turn=0, codec=None):
+        codec = codec or self.DEFAULT_CODEC
+        if codec not in CODECS:
+            raise ValueError(f"不支持的音频编码: {codec}")
+        self.codec = CODECS[codec]
+        self.sample_rate = int(sample_rate)
+        self.turn = turn & 0xFFFF
+        self.seq = 0
+        self.frame_samples = max(self.sample_rate * self.FRAME_MS // 1000, 1)
+        self.bytes_sent = 0
+
+    def _frame(self, payload: bytes, flags: int) -> bytes:
+        header = HEADER.pack(MAGIC, VERSION, self.codec, flags, 0, self.turn, self.seq, self.sample_rate)
+        self.seq += 1
+        self.bytes_sent += HEADER_SIZE + len(payload)
+        return header + payload
+
+    def frames(self, audio: np.ndarray, sentence_start=False) -> list:
+        """把一段音频切成帧，sentence_start 表示这是一句话的第一段"""
+        frames = []
+        for offset in range(0, len(audio), self.frame_samples):
+            flags = FLAG_SENTENCE_START if sentence_start and offset == 0 else 0
+            chunk = audio[offset:offset + self.frame_samples]
+            frames.append(self._frame(encode_samples(chunk, self.codec), flags))
+        return frames
+
+    def end_of_sentence(self) -> bytes:
+        """一句话结束的标记帧（没有音频数据）"""
+        return self._frame(b"", FLAG_SENTENCE_END)
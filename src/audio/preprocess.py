@@ -0,0 +1,138 @@
+"""识别前的音频预处理
+
+录音设备常用 44.1/48kHz，浏览器端也可能按设备采样率发送，而识别模型只需要 16kHz 单声道。
+上传前统一做：下混为单声道 -> 多相滤波重采样到 16kHz -> 裁掉首尾静音 -> 编码，
+通常能把上传字节数降到原来的三分之一以下。
+
+ASR_UPLOAD_FORMAT 选择编码：
+- wav：16 位 PCM（默认，兼容性最好）
+- flac：无损压缩
+- opus：Ogg Opus 有损压缩，体积最小
+"""
+import io
+import math
+import os
+import time
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+from .vad import trim_silence
+from ..utils.logger import logger
+
+TARGET_SAMPLE_RATE = 16000
+UPLOAD_FORMAT = os.getenv("ASR_UPLOAD_FORMAT", "wav").lower()
+TRIM_SILENCE = os.getenv("ASR_TRIM_SILENCE", "true").lower() == "true"
+
+# 格式名 -> (soundfile format, subtype, 文件扩展名)
+FORMATS = {
+    "wav": ("WAV", "PCM_16", "wav"),
+    "flac": ("FLAC", "PCM_16", "flac"),
+    "opus": ("OGG", "OPUS", "ogg"),
+}
+
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """多声道 -> 单声道 float32"""
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    return samples
+
+
+def resample(samples: np.ndarray, sample_rate, target_rate=TARGET_SAMPLE_RATE) -> np.ndarray:
+    """多相滤波重采样（48k -> 16k 即 up=1, down=3）"""
+    if sample_rate == target_rate:
+        return samples
+    g = math.gcd(int(sample_rate), int(target_rate))
+    return resample_poly(samples, target_rate // g, int(sample_rate) // g).astype(np.float32)
+
+
+def encode(samples: np.ndarray, sample_rate=TARGET_SAMPLE_RATE, upload_format=None) -> io.BytesIO:
+    """编码为上传格式，返回的缓冲区带有对应扩展名的 name"""
+    upload_format = (upload_format or UPLOAD_FORMAT).lower()
+    if upload_format not in FORMATS:
+        raise ValueError(f"不支持的上传格式: {upload_format}")
+    file_format, subtype, extension = FORMATS[upload_format]
+    buffer = io.BytesIO()
+    sf.write(buffer, np.clip(samples, -1.0, 1.0), sample_rate, format=file_format, subtype=subtype)
+    buffer.seek(0)
+    buffer.name = f"audio.{extension}"
+    return buffer
+
+
+def upload_filename(audio_buffer, default="audio.wav"):
+    """上传时使用的文件名（扩展名与实际编码一致）"""
+    name = getattr(audio_buffer, "name", None)
+    return os.path.basename(name) if isinstance(name, str) and name else default
+
+
+def preprocess_samples(samples: np.ndarray, sample_rate, trim=None, upload_format=None,
+                       input_bytes=None) -> io.BytesIO:
+    """对采样做下混、重采样、裁剪静音和编码
+
+    Args:
+        samples: int16 或 [-1, 1] 浮点采样，单声道 (n,) 或多声道 (n, channels)
+        sample_rate: 原始采样率
+        trim: 是否裁掉首尾静音，默认取 ASR_TRIM_SILENCE
+        input_bytes: 原始数据字节数，仅用于日志；默认按 16 位 WAV 估算
+    """
+    start_time = time.perf_counter()
+    samples = np.asarray(samples)
+    channels = samples.shape[1] if samples.ndim == 2 else 1
+    input_duration = len(samples) / sample_rate
+    if input_bytes is None:
+        input_bytes = len(samples) * channels * 2 + 44
+    if samples.dtype == np.int16:
+        samples = samples.astype(np.float32) / 32768
+
+    audio = resample(downmix(samples), sample_rate)
+    if trim is None:
+        trim = TRIM_SILENCE
+    if trim:
+        trimmed = trim_silence(audio, TARGET_SAMPLE_RATE)
+        # 没检测到语音时保留原音频，交给识别模型判断（可能只是声音很小）
+        if len(trimmed):
+            audio = trimmed
+    buffer = encode(audio, upload_format=upload_format)
+
+    output_bytes = buffer.getbuffer().nbytes
+    logger.info(
+        f"音频预处理: {input_bytes / 1024:.1f}KB -> {output_bytes / 1024:.1f}KB "
+        f"(节省 {max(input_bytes - output_bytes, 0) / 1024:.1f}KB; "
+        f"{sample_rate}Hz {channels}ch {input_duration:.2f}s -> "
+        f"{TARGET_SAMPLE_RATE}Hz 1ch {len(audio) / TARGET_SAMPLE_RATE:.2f}s {buffer.name}), "
+        f"耗时 {(time.perf_counter() - start_time) * 1000:.1f}ms"
+    )
+    return buffer
+
+
+def preprocess_audio(audio_buffer, trim=None, upload_format=None):
+    """对已编码的音频（WAV / FLAC / OGG 等）做预处理
+
+    soundfile 无法解码的格式（如浏览器 MediaRecorder 的 webm）原样返回，由识别服务自行解码。
+    """
+    data = audio_buffer.read()
+    try:
+        samples, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    except RuntimeError as e:
+        logger.debug(f"无法解码音频，跳过预处理: {e}")
+        return io.BytesIO(data)
+    finally:
+        audio_buffer.close()
+    return preprocess_samples(samples, sample_rate, trim=trim, upload_format=upload_format, input_bytes=len(data))
+
+
+def test():
+    sample_rate = 48000
+    t = np.arange(sample_rate * 3) / sample_rate
+    tone = 0.3 * np.sin(2 * np.pi * 220 * t) * (t > 1) * (t < 2)
+    stereo = np.stack([tone, tone], axis=1)
+    for upload_format in FORMATS:
+        buffer = preprocess_samples(stereo, sample_rate, upload_format=upload_format)
+        print(upload_format, buffer.getbuffer().nbytes)
+
+
+if __name__ == "__main__":
+    test()
@@ -5,6 +5,7 @@ import queue
 import soundfile as sf
 import os
 import tempfile
+from .preprocess import preprocess_samples
 from ..utils.logger import logger
 import time
 
@@ -136,12 +137,8 @@ class AudioRecorder:
         audio = np.concatenate(audio_data)
         logger.info(f"音频数据长度: {len(audio)} 采样点")
 
-        # 将 numpy 数组转换为字节流
-        audio_buffer = io.BytesIO()
-        sf.write(audio_buffer, audio, self.sample_rate, format='WAV')
-        audio_buffer.seek(0)  # 将缓冲区指针移动到开始位置
-        
-        return audio_buffer
+        # 下混、重采样到 16kHz、裁掉静音并编码，减少上传字节数
+        return preprocess_samples(audio, self.sample_rate)
     
 
 def test():
@@ -0,0 +1,64 @@
+import io
+import os
+import time
+
+import numpy as np
+import soundfile as sf
+
+from ..utils.logger import logger
+
+
+class AudioStreamBuffer:
+    """流式录音缓冲区
+
+    客户端录音时不断发送小段 PCM（16 位小端、单声道），这里按到达顺序追加，
+    结束时直接拼成 WAV，不需要再等待整段上传和解码。
+    """
+
+    MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "120"))  # 单次录音上限，防止内存无限增长
+
+    def __init__(self, sample_rate=16000, sample_format="pcm_s16le"):
+        if sample_format != "pcm_s16le":
+            raise ValueError(f"不支持的音频格式: {sample_format}")
+        self.sample_rate = int(sample_rate)
+        self.sample_format = sample_format
+        self._data = bytearray()
+        self.frames = 0
+        self.started_at = time.time()
+        self.truncated = False
+
+    @property
+    def num_samples(self):
+        return len(self._data) // 2
+
+    @property
+    def duration(self):
+        """已缓冲的音频时长（秒）"""
+        return self.num_samples / self.sample_rate
+
+    def append(self, frame: bytes):
+        """追加一帧 PCM 数据"""
+        if self.duration >= self.MAX_SECONDS:
+            if not self.truncated:
+                logger.warning(f"录音超过 {self.MAX_SECONDS:.0f} 秒，后续数据将被丢弃")
+                self.truncated = True
+            return
+        self._data += frame
+        self.frames += 1
+
+    def samples(self, start=0) -> np.ndarray:
+        """返回从 start 开始的 int16 采样
+
+        返回副本：bytearray 被 numpy 引用期间无法继续追加数据
+        """
+        count = max(self.num_samples - start, 0)
+        return np.frombuffer(self._data, dtype=np.int16, count=count, offset=start * 2).copy()
+
+    def to_wav(self, samples=None) -> io.BytesIO:
+        """把当前缓冲的数据（或传入的采样）打包为 WAV"""
+        if samples is None:
+            samples = self.samples()
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, self.sample_rate, format='WAV', subtype='PCM_16')
+        buffer.seek(0)
+        return buffer
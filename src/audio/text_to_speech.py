@@ -2,7 +2,7 @@ import torch
 import sounddevice as sd
 import numpy as np
 import os
-from typing import Tuple, Optional
+from typing import Iterator, Tuple, Optional
 import requests
 from tqdm import tqdm
 from pathlib import Path
@@ -12,6 +12,8 @@ from transformers import BertConfig, BertModel, BertTokenizer
 import io
 
 class KokoroTTS:
+    SAMPLE_RATE = 24000  # Kokoro 输出采样率
+
     MODEL_FILES = {
         'models.py': 'https://huggingface.co/hexgrad/Kokoro-82M/raw/main/models.py',
         'kokoro.py': 'https://huggingface.co/hexgrad/Kokoro-82M/raw/main/kokoro.py',
@@ -24,6 +26,7 @@ class KokoroTTS:
     
     def __init__(self):
         self.model_dir = Path(__file__).parent / 'Kokoro-82M'
+        self.last_phonemes = None
         self._download_model_files()
         self._init_model()
     
@@ -110,6 +113,69 @@ class KokoroTTS:
         self.voicepack = torch.load(voice_file, weights_only=True).to(self.device)
         print(f"已加载声音: {self.voice_name}")
 
+    def _split_segments(self, text: str) -> list:
+        """清理文本并按句子切分为不超过 max_length 的分段"""
+        # 清理文本，移除多余的空白和换行
+        text = ' '.join(text.strip().split())
+
+        # 将长文本分段处理
+        max_length = 100  # 每段最大字符数
+        segments = []
+
+        # 按句子分割
+        sentences = text.split('. ')
+        current_segment = ''
+
+        for sentence in sentences:
+            if len(current_segment) + len(sentence) <= max_length:
+                current_segment += sentence + '. '
+            else:
+                if current_segment:
+                    segments.append(current_segment.strip())
+                current_segment = sentence + '. '
+
+        if current_segment:
+            segments.append(current_segment.strip())
+        return segments
+
+    def synthesize_stream(self, text: str) -> Iterator[np.ndarray]:
+        """
+        逐段合成语音，每生成一段就立即返回，不必等整句合成完
+        Args:
+            text: 要转换的文字
+        Yields:
+            np.ndarray: float32 单声道采样（SAMPLE_RATE），范围 [-1, 1]，末尾带短暂停顿
+        """
+        if not text or len(text.strip()) == 0:
+            return
+
+        for segment in self._split_segments(text):
+            print(f"正在生成语音: {segment}")
+
+            # 生成音频
+            audio, phonemes = self.generate(
+                self.model,
+                segment,
+                self.voicepack,
+                lang='a',  # 使用通用语言代码
+                speed=1.0
+            )
+            self.last_phonemes = phonemes
+
+            if audio is not None and isinstance(audio, np.ndarray):
+                # 确保音频是单声道
+                if len(audio.shape) > 1:
+                    audio = audio[:, 0]  # 只保留第一个通道
+                else:
+                    audio = audio.reshape(-1)
+                audio = np.clip(audio.astype(np.float32), -1.0, 1.0)
+            else:
+                audio = np.zeros(0, dtype=np.float32)
+
+            # 添加短暂停顿
+            silence = np.zeros(int(self.SAMPLE_RATE * 0.3), dtype=np.float32)  # 0.3秒静音
+            yield np.concatenate([audio, silence])
+
     def speak(self, text: str) -> Tuple[bytes, str]:
         """
         将文字转换为语音
@@ -123,91 +189,38 @@ class KokoroTTS:
             if not text or len(text.strip()) == 0:
                 print("文本为空")
                 return None, None
-                
-            # 清理文本，移除多余的空白和换行
-            text = ' '.join(text.strip().split())
-            
-            # 将长文本分段处理
-            max_length = 100  # 每段最大字符数
-            segments = []
-            
-            # 按句子分割
-            sentences = text.split('. ')
-            current_segment = ''
-            
-            for sentence in sentences:
-                if len(current_segment) + len(sentence) <= max_length:
-                    current_segment += sentence + '. '
-                else:
-                    if current_segment:
-                        segments.append(current_segment.strip())
-                    current_segment = sentence + '. '
-            
-            if current_segment:
-                segments.append(current_segment.strip())
-            
+
             # 处理每个分段
-            full_audio = []
-            for segment in segments:
-                print(f"正在生成语音: {segment}")
-                
-                # 生成音频
-                audio, phonemes = self.generate(
-                    self.model, 
-                    segment, 
-                    self.voicepack, 
-                    lang='a',  # 使用通用语言代码
-                    speed=1.0
-                )
-                
-                if audio is not None and isinstance(audio, np.ndarray):
-                    # 确保音频是单声道
-                    if len(audio.shape) > 1:
-                        audio = audio[:, 0]  # 只保留第一个通道
-                    else:
-                        audio = audio.reshape(-1)
-                    
-                    # 添加到完整音频
-                    full_audio.append(audio)
-                
-                # 添加短暂停顿
-                silence = np.zeros(int(24000 * 0.3))  # 0.3秒静音
-                full_audio.append(silence)
-            
+            full_audio = list(self.synthesize_stream(text))
+
             if full_audio:
                 # 合并所有音频片段
                 audio = np.concatenate(full_audio)
-                
-                # 确保音频数据是 float32 类型且在 [-1, 1] 范围内
-                if audio.dtype != np.float32:
-                    audio = audio.astype(np.float32)
-                if np.abs(audio).max() > 1:
-                    audio = audio / np.abs(audio).max()
-                
+
                 # 转换为 int16
                 audio_int16 = (audio * 32767).astype(np.int16)
-                
+
                 # 创建临时缓冲区保存为 WAV 格式
                 buffer = io.BytesIO()
-                sf.write(buffer, audio_int16, 24000, format='WAV', subtype='PCM_16')
+                sf.write(buffer, audio_int16, self.SAMPLE_RATE, format='WAV', subtype='PCM_16')
                 buffer.seek(0)
-                
+
                 # 读取 WAV 文件数据
                 audio_bytes = buffer.read()
                 buffer.close()
-                
+
                 print("语音生成完成")
-                return audio_bytes, phonemes
+                return audio_bytes, self.last_phonemes
             else:
                 print("音频生成失败")
                 return None, None
-                
+
         except Exception as e:
             print(f"TTS 生成失败: {str(e)}")
             import traceback
             traceback.print_exc()
             return None, None
-            
+
     def __del__(self):
         """析构函数，确保清理资源"""
         sd.stop()  # 停止任何正在播放的音频
@@ -0,0 +1,132 @@
+import math
+import os
+import time
+
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """基于能量的流式语音活动检测（纯 NumPy，只用 CPU）
+
+    每次送入一段 PCM，按帧（默认 30ms）一次性向量化计算能量，
+    再用自适应噪声底 + 迟滞判断语音的开始和结束。
+    """
+
+    FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+    THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-45"))  # 绝对能量阈值（dBFS）
+    MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "10"))         # 高于噪声底多少才算语音
+    MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "150"))  # 连续多长的语音才算开始说话
+    SILENCE_MS = int(os.getenv("VAD_SILENCE_MS", "800"))        # 连续多长的静音才算一句话结束
+
+    def __init__(self, sample_rate=16000, silence_ms=None):
+        self.sample_rate = int(sample_rate)
+        self.frame_size = max(self.sample_rate * self.FRAME_MS // 1000, 1)
+        silence_ms = self.SILENCE_MS if silence_ms is None else silence_ms
+        self.silence_frames = max(math.ceil(silence_ms / self.FRAME_MS), 1)
+        self.min_speech_frames = max(math.ceil(self.MIN_SPEECH_MS / self.FRAME_MS), 1)
+
+        self.noise_db = self.THRESHOLD_DB - self.MARGIN_DB
+        self.in_speech = False
+        self.segments = []        # 已结束的语音段 [(起始采样, 结束采样)]
+        self._segment_start = None
+        self._speech_run = 0
+        self._silence_run = 0
+        self._pending = np.empty(0, dtype=np.float32)  # 不足一帧的剩余采样
+        self.frame_index = 0
+
+        # 性能统计
+        self.frames_processed = 0
+        self.process_time = 0.0
+
+    @property
+    def has_speech(self):
+        return bool(self.segments) or self.in_speech
+
+    @property
+    def cost_per_frame_us(self):
+        """平均每帧耗时（微秒）"""
+        if not self.frames_processed:
+            return 0.0
+        return self.process_time / self.frames_processed * 1e6
+
+    def _threshold(self):
+        return max(self.THRESHOLD_DB, self.noise_db + self.MARGIN_DB)
+
+    def process(self, samples: np.ndarray) -> list:
+        """送入一段 PCM（int16 或 [-1, 1] 的浮点数），返回本段触发的事件
+
+        Returns:
+            list: [("speech_start" | "speech_end", 采样位置), ...]
+        """
+        start_time = time.perf_counter()
+        if samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        else:
+            samples = samples.astype(np.float32, copy=False)
+        if self._pending.size:
+            samples = np.concatenate([self._pending, samples])
+
+        num_frames = len(samples) // self.frame_size
+        self._pending = samples[num_frames * self.frame_size:]
+        if num_frames == 0:
+            return []
+
+        # 向量化计算每帧能量
+        frames = samples[:num_frames * self.frame_size].reshape(num_frames, self.frame_size)
+        energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+        events = []
+        for db in energy_db.tolist():
+            voiced = db > self._threshold()
+            if not voiced and not self.in_speech:
+                # 噪声底：快速下降，缓慢上升
+                self.noise_db = min(db, self.noise_db * 0.95 + db * 0.05)
+
+            if not self.in_speech:
+                self._speech_run = self._speech_run + 1 if voiced else 0
+                if self._speech_run >= self.min_speech_frames:
+                    self.in_speech = True
+                    self._silence_run = 0
+                    self._segment_start = (self.frame_index - self._speech_run + 1) * self.frame_size
+                    events.append(("speech_start", self._segment_start))
+            else:
+                self._silence_run = 0 if voiced else self._silence_run + 1
+                if self._silence_run >= self.silence_frames:
+                    segment_end = (self.frame_index - self._silence_run + 1) * self.frame_size
+                    self.segments.append((self._segment_start, segment_end))
+                    events.append(("speech_end", segment_end))
+                    self.in_speech = False
+                    self._segment_start = None
+                    self._speech_run = 0
+                    self._silence_run = 0
+            self.frame_index += 1
+
+        self.frames_processed += num_frames
+        self.process_time += time.perf_counter() - start_time
+        return events
+
+    def speech_bounds(self):
+        """所有语音段覆盖的范围 (起始采样, 结束采样)，没有语音时返回 None"""
+        segments = list(self.segments)
+        if self.in_speech:
+            segments.append((self._segment_start, self.frame_index * self.frame_size))
+        if not segments:
+            return None
+        return segments[0][0], segments[-1][1]
+
+    def trim(self, samples: np.ndarray, padding_ms=200) -> np.ndarray:
+        """按检测到的语音范围裁掉首尾静音，两端各保留 padding_ms"""
+        bounds = self.speech_bounds()
+        if bounds is None:
+            return samples[:0]
+        padding = self.sample_rate * padding_ms // 1000
+        start = max(bounds[0] - padding, 0)
+        end = min(bounds[1] + padding, len(samples))
+        return samples[start:end]
+
+
+def trim_silence(samples: np.ndarray, sample_rate=16000, padding_ms=200) -> np.ndarray:
+    """裁掉整段音频首尾的静音"""
+    vad = VoiceActivityDetector(sample_rate)
+    vad.process(samples)
+    return vad.trim(samples, padding_ms)
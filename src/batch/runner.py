@@ -0,0 +1,207 @@
+"""批量识别 / 翻译录音文件
+
+输入是目录（按扩展名查找音频）或清单文件（每行一个路径，或 {"path": ...} 形式的 JSON，
+相对路径相对清单所在目录）。结果逐条追加写入 JSONL，每完成一个文件写一行：
+    {"path", "mode", "text", "error", "audio_seconds", "latency_seconds", "finished_at"}
+
+中途崩溃或中断后用同样的参数重新运行即可续跑：输出文件中已经成功的 (path, mode) 会被跳过，
+失败的会重新处理（同一文件以最后一行为准）。
+"""
+import asyncio
+import io
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from ..audio.preprocess import preprocess_audio
+from ..utils.logger import logger
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".ogg", ".opus", ".mp3", ".m4a", ".webm"}
+
+
+def find_audio_files(directory, recursive=True, extensions=AUDIO_EXTENSIONS):
+    """目录下的音频文件，按路径排序保证每次运行顺序一致"""
+    pattern = "**/*" if recursive else "*"
+    return sorted(p for p in Path(directory).glob(pattern) if p.is_file() and p.suffix.lower() in extensions)
+
+
+def read_manifest(manifest):
+    """读取清单文件，返回路径列表"""
+    manifest = Path(manifest)
+    paths = []
+    for line in manifest.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        path = json.loads(line)["path"] if line.startswith("{") else line
+        path = Path(path)
+        paths.append(path if path.is_absolute() else manifest.parent / path)
+    return paths
+
+
+def collect_inputs(sources, recursive=True):
+    """把目录、清单（.txt / .jsonl）和单个音频文件展开为去重后的路径列表"""
+    paths = []
+    for source in sources:
+        source = Path(source)
+        if source.is_dir():
+            paths.extend(find_audio_files(source, recursive))
+        elif source.suffix.lower() in (".txt", ".jsonl", ".list"):
+            paths.extend(read_manifest(source))
+        else:
+            paths.append(source)
+    seen = set()
+    unique = []
+    for path in paths:
+        key = str(path.resolve())
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+
+def load_completed(output):
+    """输出文件中已经成功处理的 (绝对路径, 模式)；崩溃时写了一半的最后一行会被忽略"""
+    completed = set()
+    if not os.path.exists(output):
+        return completed
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("error") is None:
+                completed.add((record["path"], record["mode"]))
+            else:
+                completed.discard((record["path"], record["mode"]))
+    return completed
+
+
+def audio_duration(path):
+    """音频时长（秒），soundfile 无法解析时返回 None"""
+    try:
+        return sf.info(str(path)).duration
+    except RuntimeError:
+        return None
+
+
+def _ensure_trailing_newline(output):
+    """上次崩溃时最后一行可能没写完，补一个换行，新结果从新的一行开始"""
+    if not os.path.exists(output) or os.path.getsize(output) == 0:
+        return
+    with open(output, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+class BatchRunner:
+    """用 processor.aprocess_audio 并发处理文件，最多 concurrency 个同时进行"""
+
+    def __init__(self, processor, output, mode="transcriptions", prompt="", concurrency=4, preprocess=True):
+        self.processor = processor
+        self.output = output
+        self.mode = mode
+        self.prompt = prompt
+        self.concurrency = concurrency
+        self.preprocess = preprocess
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.audio_seconds = 0.0
+        self.latencies = []
+        self.elapsed = 0.0
+
+    def _load(self, path):
+        """读取并预处理一个文件，返回 (上传缓冲区, 时长)"""
+        with open(path, "rb") as f:
+            buffer = io.BytesIO(f.read())
+        buffer.name = os.path.basename(path)
+        duration = audio_duration(path)
+        if self.preprocess:
+            buffer = preprocess_audio(buffer)
+            if not getattr(buffer, "name", None):
+                buffer.name = os.path.basename(path)  # 无法解码时原样上传，保留原扩展名
+        return buffer, duration
+
+    async def _process(self, path):
+        start_time = time.perf_counter()
+        duration = None
+        try:
+            buffer, duration = await asyncio.to_thread(self._load, path)
+            text, error = await self.processor.aprocess_audio(buffer, self.mode, self.prompt)
+        except Exception as e:
+            text, error = None, f"❌ {e}"
+        latency = time.perf_counter() - start_time
+        return {
+            "path": str(path),
+            "mode": self.mode,
+            "text": text,
+            "error": error,
+            "audio_seconds": round(duration, 3) if duration is not None else None,
+            "latency_seconds": round(latency, 3),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+    def _write(self, f, record):
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())  # 每条结果落盘后才算完成，崩溃时最多丢正在处理的文件
+
+        if record["error"]:
+            self.failed += 1
+            logger.warning(f"处理失败: {record['path']} {record['error']}")
+        else:
+            self.processed += 1
+            self.audio_seconds += record["audio_seconds"] or 0.0
+        self.latencies.append(record["latency_seconds"])
+
+    async def run(self, paths):
+        completed = load_completed(self.output)
+        pending = [p for p in paths if (str(Path(p).resolve()), self.mode) not in completed]
+        self.skipped = len(paths) - len(pending)
+        if self.skipped:
+            logger.info(f"跳过已完成的 {self.skipped} 个文件")
+        logger.info(f"开始处理 {len(pending)} 个文件（并发 {self.concurrency}，模式 {self.mode}）")
+
+        queue = asyncio.Queue()
+        for path in pending:
+            queue.put_nowait(Path(path).resolve())
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.output)), exist_ok=True)
+        start_time = time.perf_counter()
+        _ensure_trailing_newline(self.output)
+        with open(self.output, "a", encoding="utf-8") as f:
+            async def worker():
+                while True:
+                    try:
+                        path = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    record = await self._process(path)
+                    self._write(f, record)
+                    done = self.processed + self.failed
+                    if done % 10 == 0 or done == len(pending):
+                        logger.info(f"进度: {done}/{len(pending)}")
+
+            try:
+                await asyncio.gather(*(worker() for _ in range(max(self.concurrency, 1))))
+            finally:
+                self.elapsed = time.perf_counter() - start_time
+
+    def report(self):
+        elapsed = max(self.elapsed, 1e-9)
+        done = self.processed + self.failed
+        lines = [
+            f"完成 {self.processed} 个，失败 {self.failed} 个，跳过 {self.skipped} 个，耗时 {self.elapsed:.1f}秒",
+            f"吞吐: {done / elapsed:.2f} 文件/秒，{self.audio_seconds / elapsed:.1f} 音频秒/秒",
+        ]
+        if self.latencies:
+            p50, p95 = np.percentile(self.latencies, [50, 95])
+            lines.append(f"单文件耗时: p50 {p50:.2f}秒，p95 {p95:.2f}秒")
+        return "\n".join(lines)
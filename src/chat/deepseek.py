@@ -1,6 +1,11 @@
+import json
 import os
-import httpx
+from typing import Generator
+
+from .history import ConversationHistory
+from ..utils.http_client import get_client, make_timeout, send_stream
 from ..utils.logger import logger
+from ..utils.resilience import get_endpoint
 
 class DeepSeekChat:
     def __init__(self):
@@ -8,8 +13,19 @@ class DeepSeekChat:
         if not self.api_key:
             raise ValueError("未设置 SILICONFLOW_API_KEY 环境变量")
         self.model = os.getenv("SILICONFLOW_TRANSLATE_MODEL", "THUDM/glm-4-9b-chat")
-        self.conversation_history = []
+        self.base_url = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").rstrip("/")
+        self.endpoint = get_endpoint("siliconflow-chat")
+        self.history = ConversationHistory()
         
+    @property
+    def conversation_history(self):
+        """对话历史（会话存储读写用），实际发送的上下文见 history.messages()"""
+        return self.history.to_list()
+
+    @conversation_history.setter
+    def conversation_history(self, messages):
+        self.history.load(messages)
+
     def chat(self, user_input: str) -> str:
         """处理用户输入并返回回应"""
         try:
@@ -17,7 +33,7 @@ class DeepSeekChat:
             logger.info(f"用户: {user_input}")
             
             # 添加用户输入到对话历史
-            self.conversation_history.append({"role": "user", "content": user_input})
+            self.history.append("user", user_input)
             
             # 准备请求数据
             headers = {
@@ -27,15 +43,16 @@ class DeepSeekChat:
             
             data = {
                 "model": self.model,
-                "messages": self.conversation_history,
+                "messages": self.history.messages(),
                 "temperature": 0.7,
                 "max_tokens": 2000,
                 "stream": False  # 关闭流式输出
             }
             
             # 调用 API
-            response = httpx.post(
-                "https://api.siliconflow.cn/v1/chat/completions",
+            response = self.endpoint.call(
+                get_client("siliconflow").post,
+                f"{self.base_url}/chat/completions",
                 headers=headers,
                 json=data,
                 timeout=30
@@ -54,7 +71,8 @@ class DeepSeekChat:
             logger.info(f"助手: {cleaned_message}")
             
             # 添加助手回应到对话历史
-            self.conversation_history.append({"role": "assistant", "content": cleaned_message})
+            self.history.append("assistant", cleaned_message)
+            self.history.maybe_summarize()
             
             return cleaned_message
             
@@ -63,6 +81,70 @@ class DeepSeekChat:
             logger.error(error_msg)
             return f"抱歉，{error_msg}"
             
+    def stream_chat(self, user_input: str) -> Generator[str, None, None]:
+        """流式处理用户输入，边生成边返回文字片段
+
+        完整回应原样记入对话历史（不经过 _clean_response）。只在收到第一个字之前重试；
+        出错且还没有输出时返回错误提示，已经输出的内容无法撤回，中途断开时直接结束。
+        调用方 close() 生成器时立即关闭 HTTP 响应。
+        """
+        emitted = False
+        full_response = ""
+        try:
+            logger.info(f"用户: {user_input}")
+            self.history.append("user", user_input)
+
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+            data = {
+                "model": self.model,
+                "messages": self.history.messages(),
+                "temperature": 0.7,
+                "max_tokens": 2000,
+                "stream": True
+            }
+
+            client = get_client("siliconflow")
+            request = client.build_request(
+                "POST", f"{self.base_url}/chat/completions",
+                headers=headers, json=data, timeout=make_timeout(30)
+            )
+            response = self.endpoint.call(send_stream, client, request)
+            try:
+                for line in response.iter_lines():
+                    line = line.strip()
+                    if not line.startswith("data:") or line == "data: [DONE]":
+                        continue
+                    try:
+                        content = json.loads(line[5:])["choices"][0]["delta"].get("content")
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    if content:
+                        emitted = True
+                        full_response += content
+                        yield content
+            except GeneratorExit:
+                # 调用方中途停止（如键盘输入被重置）：已输出的部分仍记入历史，保持 user / assistant 交替
+                logger.info(f"助手（已中断）: {full_response}")
+                if full_response:
+                    self.history.append("assistant", full_response)
+                raise
+            finally:
+                # 关闭响应即断开流式请求
+                response.close()
+
+            logger.info(f"助手: {full_response}")
+            self.history.append("assistant", full_response)
+            self.history.maybe_summarize()
+
+        except Exception as e:
+            error_msg = f"对话处理失败: {str(e)}"
+            logger.error(error_msg)
+            if not emitted:
+                yield f"抱歉，{error_msg}"
+
     def _clean_response(self, text: str) -> str:
         """清理回应文本，移除重复内容"""
         # 按行分割
@@ -83,11 +165,14 @@ class DeepSeekChat:
     
     def reset_conversation(self):
         """重置对话历史"""
-        self.conversation_history = [] 
+        self.history.clear()
 
 def test():
     deepseek = DeepSeekChat()
     print(deepseek.chat("你好，我是小明，今天天气很好，你吃了吗？"))
+    for chunk in deepseek.stream_chat("我刚才说我叫什么？"):
+        print(chunk, end="", flush=True)
+    print()
 
 if __name__ == "__main__":
     test()
\ No newline at end of file
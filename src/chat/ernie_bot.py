@@ -1,12 +1,16 @@
 import os
 import json
 import time
-import httpx
 from typing import AsyncGenerator
 import logging
 from dotenv import load_dotenv
 from pathlib import Path
 
+from .history import ConversationHistory
+from .segmenter import SentenceSegmenter
+from ..utils.http_client import asend_stream, awarmup, get_async_client
+from ..utils.resilience import get_endpoint
+
 # 加载环境变量
 env_path = Path(__file__).resolve().parent.parent.parent / '.env'
 load_dotenv(env_path)
@@ -14,6 +18,9 @@ load_dotenv(env_path)
 logger = logging.getLogger(__name__)
 
 class ErnieBot:
+    # 访问令牌与会话无关，进程内按 API Key 共享：{api_key: (token, expires)}
+    _token_cache = {}
+
     def __init__(self):
         print("正在初始化 ErnieBot...")
         print(f"环境变量文件路径: {env_path}")
@@ -27,29 +34,39 @@ class ErnieBot:
         if not self.api_key or not self.secret_key:
             raise ValueError(f"环境变量未正确加载。API Key: {self.api_key}, Secret Key: {self.secret_key}")
             
+        self.base_url = os.getenv("BAIDU_BASE_URL", "https://aip.baidubce.com").rstrip("/")
+        self.endpoint = get_endpoint("baidu")
         self.access_token = None
         self.token_expires = 0
-        # 初始化对话历史,确保输出为英文，禁止中文
-        self.conversation_history = [
-            {
-                "role": "user",
-                "content": "You must respond only in English. Never use Chinese or any other languages.回答问题要简洁明了"
-            }
-        ]
+        # 初始化对话历史,确保输出为英文，禁止中文（固定消息，不会被裁剪或总结）
+        # 文心一言要求 user / assistant 交替，摘要合并进这条 user 消息
+        self.history = ConversationHistory(
+            pinned=[
+                {
+                    "role": "user",
+                    "content": "You must respond only in English. Never use Chinese or any other languages.回答问题要简洁明了"
+                }
+            ],
+            summary_role="user"
+        )
         self._stop_streaming = False
-        
+
+    @property
+    def conversation_history(self):
+        """对话历史（会话存储读写用），实际发送的上下文见 history.messages()"""
+        return self.history.to_list()
+
+    @conversation_history.setter
+    def conversation_history(self, messages):
+        self.history.load(messages)
+
     def stop_streaming(self):
         """停止当前的流式输出"""
         self._stop_streaming = True
         
     def reset(self):
         """重置所有状态"""
-        self.conversation_history = [
-            {
-                "role": "user",
-                "content": "You must respond only in English. Never use Chinese or any other languages.回答问题要简洁明了"
-            }
-        ]
+        self.history.clear()
         self._stop_streaming = False
         
     async def _get_access_token(self):
@@ -57,23 +74,37 @@ class ErnieBot:
         now = time.time()
         if self.access_token and now < self.token_expires:
             return self.access_token
+
+        cached = ErnieBot._token_cache.get(self.api_key)
+        if cached and now < cached[1]:
+            self.access_token, self.token_expires = cached
+            return self.access_token
             
-        url = "https://aip.baidubce.com/oauth/2.0/token"
+        url = f"{self.base_url}/oauth/2.0/token"
         params = {
             "grant_type": "client_credentials",
             "client_id": self.api_key,
             "client_secret": self.secret_key
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, params=params)
-            response.raise_for_status()
-            result = response.json()
+        client = get_async_client("baidu")
+        response = await self.endpoint.acall(client.post, url, params=params)
+        response.raise_for_status()
+        result = response.json()
             
         self.access_token = result["access_token"]
         self.token_expires = now + result["expires_in"] - 60  # 提前60秒刷新
+        ErnieBot._token_cache[self.api_key] = (self.access_token, self.token_expires)
         return self.access_token
         
+    async def awarmup(self):
+        """提前建立到百度的连接并获取访问令牌，第一句对话不用等握手和令牌"""
+        await awarmup("baidu", self.base_url)
+        try:
+            await self._get_access_token()
+        except Exception as e:
+            logger.warning(f"预取访问令牌失败: {e}")
+
     async def stream_chat(self, user_input: str) -> AsyncGenerator[str, None]:
         """流式对话"""
         try:
@@ -81,95 +112,73 @@ class ErnieBot:
                 return
                 
             # 记录用户输入
-            self.conversation_history.append({"role": "user", "content": user_input})
+            self.history.append("user", user_input)
             
             # 获取访问令牌
             access_token = await self._get_access_token()
             
             # 准备请求数据
-            url = f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro?access_token={access_token}"
+            url = f"{self.base_url}/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro?access_token={access_token}"
             
             headers = {
                 "Content-Type": "application/json"
             }
             
             data = {
-                "messages": self.conversation_history,
+                "messages": self.history.messages(),
                 "stream": True,
                 "temperature": 0.7,
                 "top_p": 0.8
             }
             
-            async with httpx.AsyncClient() as client:
-                async with client.stream('POST', url, json=data, headers=headers) as response:
-                    response.raise_for_status()
-                    full_response = ""
-                    current_sentence = ""  # 用于缓存当前句子
-                    
-                    async for line in response.aiter_lines():
-                        if self._stop_streaming:
-                            break
-                            
-                        if line.startswith("data: "):
-                            try:
-                                json_data = json.loads(line[6:])  # 去掉 "data: " 前缀
-                                if not json_data.get("is_end", False):
-                                    content = json_data.get("result", "")
-                                    if content:
-                                        current_sentence += content
-                                        # 检查是否有完整的句子
-                                        sentences = self._split_into_sentences(current_sentence)
-                                        if sentences:
-                                            # 输出完整的句子
-                                            for sentence in sentences[:-1]:  # 除了最后一个不完整的句子
-                                                if sentence.strip():
-                                                    full_response += sentence
-                                                    yield sentence
-                                            # 保留最后一个可能不完整的句子
-                                            current_sentence = sentences[-1]
-                            except json.JSONDecodeError as e:
-                                logger.error(f"解析响应出错: {e}")
-                                continue
-                    
-                    # 输出最后一个句子（如果有的话）
-                    if current_sentence and not self._stop_streaming:
-                        full_response += current_sentence
-                        yield current_sentence
+            # 共享连接池，热连接上第一个字不用等 DNS / TCP / TLS
+            client = get_async_client("baidu")
+            # 只在收到第一个字之前重试；已经输出的句子无法撤回，中途断开不再重试
+            request = client.build_request('POST', url, json=data, headers=headers)
+            response = await self.endpoint.acall(asend_stream, client, request)
+            try:
+                full_response = ""
+                segmenter = SentenceSegmenter()  # 按句输出，便于逐句合成语音
+
+                async for line in response.aiter_lines():
+                    if self._stop_streaming:
+                        break
                         
+                    if line.startswith("data: "):
+                        try:
+                            json_data = json.loads(line[6:])  # 去掉 "data: " 前缀
+                            if not json_data.get("is_end", False):
+                                content = json_data.get("result", "")
+                                for sentence in segmenter.feed(content):
+                                    if sentence.strip():
+                                        full_response += sentence
+                                        yield sentence
+                        except json.JSONDecodeError as e:
+                            logger.error(f"解析响应出错: {e}")
+                            continue
+                
+                # 输出最后一个句子（如果有的话）
+                if not self._stop_streaming:
+                    for sentence in segmenter.flush():
+                        if sentence.strip():
+                            full_response += sentence
+                            yield sentence
+            finally:
+                await response.aclose()
+                    
             # 如果没有被中断，记录完整的对话历史
             if not self._stop_streaming and full_response:
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": full_response
-                })
+                self.history.append("assistant", full_response)
+                # 较早的对话在后台总结，不影响下一轮的首字延迟
+                self.history.maybe_summarize()
                 
         except Exception as e:
             logger.error(f"对话出错: {e}")
             yield f"Error: {str(e)}"
 
-    def _split_into_sentences(self, text: str) -> list[str]:
-        """将文本分割成句子"""
-        # 定义句子结束标记
-        sentence_endings = '.。!！?？'
-        result = []
-        current = ""
-        
-        for char in text:
-            current += char
-            if char in sentence_endings:
-                # 找到一个完整的句子
-                result.append(current)
-                current = ""
-        
-        # 添加剩余的不完整句子（如果有的话）
-        if current:
-            result.append(current)
-            
-        return result
-        
     def reset_conversation(self):
         """重置对话历史"""
-        self.conversation_history = []
+        self.history.clear(drop_pinned=True)
 
 async def test():
     """测试函数"""
@@ -0,0 +1,241 @@
+"""按 token 预算管理对话历史
+
+对话历史原来无限增长，每轮都整段重发，请求体积、上游 prefill 时间和首字延迟随会话长度线性增加。
+ConversationHistory 把发送的上下文控制在 CHAT_HISTORY_TOKEN_BUDGET 以内：
+- 固定消息（如 ErnieBot 的“只用英文回答”）始终保留
+- 最近 CHAT_HISTORY_KEEP_RECENT 条消息原样保留
+- 超过预算的 CHAT_HISTORY_SUMMARY_RATIO 时，在后台线程中把更早的消息总结成一段摘要，
+  不阻塞当前回合；摘要还没生成时，超出预算的最早消息直接丢弃
+
+token 数按字符估算（中日韩字符每字 1 个，其他约 4 个字符 1 个），不依赖分词器。
+"""
+import os
+import re
+import threading
+
+from ..utils.http_client import get_client
+from ..utils.logger import logger
+from ..utils.resilience import get_endpoint
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]")
+MESSAGE_OVERHEAD = 4  # 每条消息的角色、分隔符等
+
+
+def estimate_tokens(text):
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(messages):
+    return sum(estimate_tokens(m.get("content", "")) + MESSAGE_OVERHEAD for m in messages)
+
+
+class LLMSummarizer:
+    """调用硅基流动的对话模型生成摘要（同步，在后台线程中执行）"""
+
+    TIMEOUT = float(os.getenv("CHAT_SUMMARY_TIMEOUT", "30"))
+
+    def __init__(self):
+        self.api_key = os.getenv("SILICONFLOW_API_KEY")
+        self.base_url = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").rstrip("/")
+        self.model = os.getenv(
+            "CHAT_SUMMARY_MODEL", os.getenv("SILICONFLOW_TRANSLATE_MODEL", "THUDM/glm-4-9b-chat")
+        )
+        self.endpoint = get_endpoint("siliconflow-chat")
+
+    def __call__(self, previous_summary, messages):
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if previous_summary:
+            transcript = f"Summary of the conversation so far: {previous_summary}\n{transcript}"
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": """
+                Summarize the following conversation between a user and an assistant.
+                Keep facts, names, numbers, decisions and open questions that later turns may refer to.
+                Write at most 150 words in the language of the conversation. Output only the summary.
+                """},
+                {"role": "user", "content": transcript}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 400
+        }
+        response = self.endpoint.call(
+            get_client("siliconflow").post, f"{self.base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {self.api_key}"}, json=payload, timeout=self.TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+
+class ConversationHistory:
+    """固定消息 + 摘要 + 最近的消息，发送前裁剪到 token 预算以内"""
+
+    TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))
+    KEEP_RECENT = int(os.getenv("CHAT_HISTORY_KEEP_RECENT", "6"))
+    SUMMARY_RATIO = float(os.getenv("CHAT_HISTORY_SUMMARY_RATIO", "0.75"))
+    SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+    def __init__(self, pinned=None, token_budget=None, keep_recent=None, summarizer=None, summary_role="system"):
+        """
+        Args:
+            pinned: 固定消息，始终放在最前面
+            summarizer: summarizer(上一次的摘要, 待总结的消息) -> 摘要，默认 LLMSummarizer
+            summary_role: 摘要消息的角色；与最后一条固定消息角色相同时合并进该消息
+                （文心一言等要求 user / assistant 交替的接口使用 "user"）
+        """
+        self.pinned = [dict(m) for m in pinned or []]
+        self.token_budget = token_budget or self.TOKEN_BUDGET
+        self.keep_recent = keep_recent if keep_recent is not None else self.KEEP_RECENT
+        self.summarizer = summarizer
+        self.summary_role = summary_role
+        self.summary = ""
+        self.turns = []
+        self.last_prompt_tokens = 0
+        self.last_prompt_messages = 0
+        self.summaries = 0
+        self._lock = threading.Lock()
+        self._generation = 0  # clear() 后丢弃进行中的摘要
+        self._summarizing = None  # 进行中的摘要线程结束时 set 的 Event
+
+    def append(self, role, content):
+        with self._lock:
+            self.turns.append({"role": role, "content": content})
+
+    def clear(self, drop_pinned=False):
+        with self._lock:
+            self._generation += 1
+            self.turns = []
+            self.summary = ""
+            if drop_pinned:
+                self.pinned = []
+
+    def _head(self):
+        """固定消息和摘要"""
+        head = [dict(m) for m in self.pinned]
+        if self.summary:
+            text = self.SUMMARY_PREFIX + self.summary
+            if head and head[-1]["role"] == self.summary_role:
+                head[-1]["content"] = f"{head[-1]['content']}\n{text}"
+            else:
+                head.append({"role": self.summary_role, "content": text})
+        return head
+
+    def messages(self):
+        """本轮要发送的消息；超出预算时丢弃最早的消息（至少保留最后一条）"""
+        with self._lock:
+            head = self._head()
+            turns = list(self.turns)
+        available = self.token_budget - message_tokens(head)
+        dropped = 0
+        while len(turns) > 1 and message_tokens(turns) > available:
+            turns.pop(0)
+            dropped += 1
+            # 保持以用户消息开头，user / assistant 交替
+            while len(turns) > 1 and turns[0]["role"] != "user":
+                turns.pop(0)
+                dropped += 1
+        if dropped:
+            logger.warning(f"对话上下文超出预算，丢弃最早的 {dropped} 条消息（摘要尚未生成）")
+
+        messages = head + turns
+        self.last_prompt_tokens = message_tokens(messages)
+        self.last_prompt_messages = len(messages)
+        logger.info(f"对话上下文: {len(messages)} 条消息，约 {self.last_prompt_tokens} tokens"
+                    f"（预算 {self.token_budget}）")
+        return messages
+
+    def maybe_summarize(self):
+        """超过预算的 SUMMARY_RATIO 时在后台线程中总结较早的消息，立即返回"""
+        with self._lock:
+            if self._summarizing is not None:
+                return
+            total = message_tokens(self._head()) + message_tokens(self.turns)
+            count = len(self.turns) - self.keep_recent
+            # 在用户消息处切开，保留的最近消息仍以用户消息开头
+            while 0 < count < len(self.turns) and self.turns[count]["role"] != "user":
+                count -= 1
+            if total <= self.token_budget * self.SUMMARY_RATIO or count <= 0:
+                return
+            older = list(self.turns[:count])
+            previous = self.summary
+            generation = self._generation
+            done = self._summarizing = threading.Event()
+
+        def run():
+            try:
+                summarizer = self.summarizer or LLMSummarizer()
+                summary = summarizer(previous, older)
+                with self._lock:
+                    if generation == self._generation and self.turns[:count] == older:
+                        self.summary = summary
+                        self.turns = self.turns[count:]
+                        self.summaries += 1
+                logger.info(f"已将 {count} 条较早的消息总结为摘要（约 {estimate_tokens(summary)} tokens）")
+            except Exception as e:
+                logger.error(f"生成对话摘要失败: {e}")
+            finally:
+                with self._lock:
+                    self._summarizing = None
+                done.set()
+
+        threading.Thread(target=run, name="chat-summary", daemon=True).start()
+
+    def wait_summary(self, timeout=None):
+        """等待进行中的摘要完成（测试和退出时使用）"""
+        done = self._summarizing
+        if done is not None:
+            done.wait(timeout)
+
+    def to_list(self):
+        """序列化为消息列表（会话存储使用），固定消息和摘要带有标记"""
+        with self._lock:
+            items = [dict(m, pinned=True) for m in self.pinned]
+            if self.summary:
+                items.append({"role": self.summary_role, "content": self.summary, "summary": True})
+            return items + [dict(m) for m in self.turns]
+
+    def load(self, messages):
+        """从 to_list 的结果（或旧格式的普通消息列表）恢复"""
+        pinned = [{"role": m["role"], "content": m["content"]} for m in messages if m.get("pinned")]
+        summaries = [m["content"] for m in messages if m.get("summary")]
+        # 旧格式里没有标记，与当前固定消息相同的消息不重复加入
+        pinned_contents = {m["content"] for m in (pinned or self.pinned)}
+        turns = [
+            {"role": m["role"], "content": m["content"]} for m in messages
+            if not m.get("pinned") and not m.get("summary") and m["content"] not in pinned_contents
+        ]
+        with self._lock:
+            self._generation += 1
+            if pinned:
+                self.pinned = pinned
+            self.summary = summaries[-1] if summaries else ""
+            self.turns = turns
+
+    def __len__(self):
+        return len(self.pinned) + bool(self.summary) + len(self.turns)
+
+
+def test():
+    def fake_summarizer(previous, messages):
+        return f"{len(messages)} messages about the weather"
+
+    history = ConversationHistory(
+        pinned=[{"role": "user", "content": "You must respond only in English."}],
+        token_budget=200, keep_recent=4, summarizer=fake_summarizer, summary_role="user"
+    )
+    for i in range(10):
+        history.append("user", f"第 {i} 个问题：今天天气怎么样？明天呢？后天呢？")
+        history.messages()
+        history.append("assistant", f"Answer {i}: it will be sunny with a light breeze in the afternoon.")
+        history.maybe_summarize()
+        history.wait_summary()
+    for message in history.messages():
+        print(message)
+
+
+if __name__ == "__main__":
+    test()
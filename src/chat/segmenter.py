@@ -0,0 +1,279 @@
+"""流式断句：把 LLM 逐字输出的片段切成适合 TTS 合成的句子
+
+原来的做法各不相同：ErnieBot 每收到一个片段就把整段缓冲区逐字重新扫描一遍，
+网页流水线每次对整个缓冲区 rfind，run_symbol.py 只看单个片段里有没有句末标点。
+SentenceSegmenter 保存扫描状态，每个字只看一次、只在输出时复制一次（均摊 O(1)），
+切出来的句子首尾相接等于原文。
+
+断句规则：
+- 中英文句末标点（。！？!?…、换行）之后断句，紧跟的引号、括号和重复标点归入前一句
+- 英文句点要看下一个字：小数（3.14）、缩写（Mr. / e.g.）、文件名和网址中的点不断句
+- 句子短于 min_chars 时与下一句合并，避免 TTS 合成过碎的片段
+- 超过 max_chars 仍没有句末标点时，在最后一个逗号、分号等处切开，没有则在空格处，再没有就直接切断；
+  第一句用更小的 first_max_chars，缩短首段音频的等待时间
+
+每次 feed 结束时，末尾已经确定的句末标点立即断句，不等下一个片段。
+紧跟在英文字母或数字后面的句点（可能是小数、缩写、文件名或网址）留到下一个片段再判断，
+这类句子要多等一个片段才输出。
+"""
+import os
+import time
+
+STRONG_ENDINGS = frozenset("。！？!?…\n")
+CLOSERS = frozenset("\"')]}”’」』）】》")
+SOFT_BREAKS = frozenset("，,、；;：:")
+ABBREVIATIONS = frozenset({
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "a.m", "p.m", "u.s", "fig", "approx",
+})
+_MAX_ABBREVIATION = max(len(word) for word in ABBREVIATIONS)
+_WORD_STRIP = "\"'([{“‘"
+
+
+def _is_cjk(char):
+    """中日韩文字及全角标点"""
+    return char >= "\u2e80"
+
+
+class SentenceSegmenter:
+    """有状态的流式断句器，每个回合（每次流式回复）用一个实例
+
+    用法：
+        segmenter = SentenceSegmenter()
+        for chunk in stream:
+            for sentence in segmenter.feed(chunk):
+                ...
+        for sentence in segmenter.flush():
+            ...
+    """
+
+    MIN_CHARS = int(os.getenv("SEGMENTER_MIN_CHARS", "6"))
+    MAX_CHARS = int(os.getenv("SEGMENTER_MAX_CHARS", "120"))
+    FIRST_MAX_CHARS = int(os.getenv("SEGMENTER_FIRST_MAX_CHARS", "40"))
+
+    def __init__(self, min_chars=None, max_chars=None, first_max_chars=None):
+        self.min_chars = self.MIN_CHARS if min_chars is None else min_chars
+        self.max_chars = max_chars or self.MAX_CHARS
+        self.first_max_chars = first_max_chars or self.FIRST_MAX_CHARS
+        self.emitted = 0
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        # 以下位置都是 _chars 中的下标；已输出的部分不立即删除，只移动 _start，攒够一半时再整体压缩
+        self._chars = []
+        self._start = 0         # 当前句子的起点
+        self._end = None        # 候选断句位置（句末标点及其后的引号之后），等下一个字决定
+        self._dot = False       # 候选位置由英文句点产生，需要看下一个字
+        self._dot_word = ""     # 句点前的单词（只在可能是缩写时记录）
+        self._dot_in_word = False  # 句点紧跟在英文字母或数字后面，可能是小数、缩写、文件名或网址
+        self._word_start = 0
+        self._soft = 0          # 最后一个逗号、分号等之后的位置
+        self._space = 0         # 最后一个空白之后的位置
+
+    def reset(self):
+        """丢弃缓冲的内容，开始新的回合"""
+        self.emitted = 0
+        self._reset_buffer()
+
+    def feed(self, text):
+        """追加一个片段，返回已经完整的句子（可能为空列表）"""
+        units = []
+        for char in text:
+            self._push(char, units)
+        if self._end is not None and (not self._dot or self._dot_is_boundary_at_end()):
+            end, self._end = self._end, None
+            self._cut(end, units)
+        return units
+
+    def flush(self):
+        """流结束时返回剩余的内容"""
+        units = []
+        if len(self._chars) > self._start:
+            units.append("".join(self._chars[self._start:]))
+            self.emitted += 1
+        self._reset_buffer()
+        return units
+
+    def _push(self, char, units):
+        chars = self._chars
+        if self._end is not None:
+            if char in STRONG_ENDINGS or char in CLOSERS or char == ".":
+                # 连续的标点和收尾的引号、括号跟着前一句
+                chars.append(char)
+                self._end = len(chars)
+                if char in STRONG_ENDINGS:
+                    self._dot = False
+                return
+            end, self._end = self._end, None
+            if not self._dot or self._dot_is_boundary(char):
+                self._cut(end, units)
+
+        chars.append(char)
+        position = len(chars)
+        length = position - self._start
+        if char in STRONG_ENDINGS:
+            self._end = position
+            self._dot = False
+        elif char == ".":
+            self._end = position
+            self._dot = True
+            start = max(self._word_start, self._start)
+            # 只有短单词才可能是缩写，长单词（如网址）不拼接，保证每个字的开销是常数
+            self._dot_word = "".join(chars[start:position - 1]) if position - 1 - start <= _MAX_ABBREVIATION + 2 else ""
+            self._dot_in_word = length > 1 and chars[position - 2].isalnum() and not _is_cjk(chars[position - 2])
+        elif char.isspace():
+            self._space = self._word_start = position
+        elif char in SOFT_BREAKS:
+            self._soft = position
+        elif length >= (self.first_max_chars if self.emitted == 0 else self.max_chars):
+            self._split_long(units)
+
+    def _is_abbreviation(self):
+        return self._dot_word.strip(_WORD_STRIP).lower() in ABBREVIATIONS
+
+    def _dot_is_boundary(self, next_char):
+        """英文句点后面跟着 next_char 时是否断句"""
+        if next_char.isspace():
+            return not self._is_abbreviation()
+        # 句点后紧跟中文时断句；紧跟字母、数字（3.14、e.g、example.com）时不断
+        return _is_cjk(next_char)
+
+    def _dot_is_boundary_at_end(self):
+        """片段以英文句点结束时，只有句点不紧跟在单词后面（如中文、引号之后）才直接断句
+
+        "See example." 之后可能是 "com"，"3." 之后可能是 "14"，都要等下一个片段。
+        """
+        return not self._dot_in_word
+
+    def _split_long(self, units):
+        """没有句末标点但已经太长：在逗号、空白处或直接切开"""
+        for position in (self._soft, self._space):
+            if position - self._start > self.min_chars:
+                self._cut(position, units)
+                return
+        self._cut(len(self._chars), units)
+
+    def _cut(self, end, units):
+        """把当前句子到 end 为止的部分作为一句输出；太短时留着与下一句合并"""
+        if end - self._start < self.min_chars:
+            return
+        chars = self._chars
+        units.append("".join(chars[self._start:end]))
+        self._start = end
+        self.emitted += 1
+        if end * 2 >= len(chars):
+            # 已输出的部分不少于剩余部分时才删除，每个字均摊 O(1)
+            self._compact()
+
+    def _compact(self):
+        start = self._start
+        del self._chars[:start]
+        self._start = 0
+        if self._end is not None:
+            self._end -= start
+        self._word_start = max(self._word_start - start, 0)
+        self._soft = max(self._soft - start, 0)
+        self._space = max(self._space - start, 0)
+
+
+def split_sentences(text, **kwargs):
+    """一次性切分整段文本"""
+    segmenter = SentenceSegmenter(**kwargs)
+    return segmenter.feed(text) + segmenter.flush()
+
+
+def _stream(text, chunk_size):
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def _rescan_split(chunks):
+    """原 ErnieBot 的做法：每个片段到来时把缓冲区整段逐字重新扫描"""
+    units = []
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        sentences = []
+        current = ""
+        for char in pending:
+            current += char
+            if char in ".。!！?？":
+                sentences.append(current)
+                current = ""
+        if current:
+            sentences.append(current)
+        units += sentences[:-1]
+        pending = sentences[-1] if sentences else ""
+    return units + ([pending] if pending else [])
+
+
+def _rfind_split(chunks):
+    """原网页流水线的做法：每个片段到来时对整个缓冲区 rfind 各个句末标点"""
+    units = []
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        end = max(pending.rfind(char) for char in ".!?。！？")
+        if end >= 0:
+            units.append(pending[:end + 1])
+            pending = pending[end + 1:]
+    return units + ([pending] if pending else [])
+
+
+def _segmenter_split(chunks):
+    segmenter = SentenceSegmenter()
+    units = []
+    for chunk in chunks:
+        units += segmenter.feed(chunk)
+    return units + segmenter.flush()
+
+
+def benchmark(repeat=5):
+    """比较三种做法处理同一段流式输出的耗时（每次 3 个字的片段，模拟 LLM 逐 token 输出）"""
+    samples = {
+        "中文短句": "你好！今天天气怎么样？我想出去走走，顺便买点东西。" * 40,
+        "英文": "Dr. Smith paid $3.50 for coffee, e.g. a latte. It was fine! Was it? Yes. " * 40,
+        # 长段落没有句末标点，缓冲区越积越长，重新扫描的做法退化为平方复杂度
+        "无标点长段": "这是一段没有句末标点的很长的文字，" * 200,
+    }
+    for name, text in samples.items():
+        chunks = _stream(text, 3)
+        print(f"{name}（{len(text)} 字，{len(chunks)} 个片段）")
+        for label, split in (("逐字重扫", _rescan_split), ("rfind", _rfind_split), ("SentenceSegmenter", _segmenter_split)):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                units = split(chunks)
+                best = min(best, time.perf_counter() - start)
+            assert "".join(units) == text
+            lengths = [len(u) for u in units]
+            print(f"  {label:<18} {best * 1000:8.2f} ms  {len(units):4d} 句  "
+                  f"最短 {min(lengths)} 最长 {max(lengths)} 字，每字 {best / len(text) * 1e9:.0f} ns")
+
+
+def test():
+    text = ("你好！我是小明。“今天天气很好。”你吃了吗？？Mr. Smith paid $3.50 for it, e.g. a latte. "
+            "See example.com for details.Ok\n好的.然后呢……")
+    for sentence in split_sentences(text, min_chars=2):
+        print(repr(sentence))
+
+    # 流式输入：每次 3 个字
+    segmenter = SentenceSegmenter(min_chars=2)
+    streamed = []
+    for chunk in _stream(text, 3):
+        streamed += segmenter.feed(chunk)
+    streamed += segmenter.flush()
+    print("流式输入:", len(streamed), "句，拼接后与原文相同:", "".join(streamed) == text)
+
+    # 片段恰好在网址、小数的句点处断开
+    for chunks in (["See example.", "com for details. ", "Ok."], ["Pi is 3.", "14 today. ", "好的."]):
+        segmenter = SentenceSegmenter(min_chars=2)
+        streamed = []
+        for chunk in chunks:
+            streamed += segmenter.feed(chunk)
+        streamed += segmenter.flush()
+        print("流式输入:", chunks, "->", streamed)
+
+    benchmark()
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,150 @@
+"""会话状态存储
+
+对话历史按客户端会话 ID 保存在进程之外，web 服务可以跑多个 worker，
+断线重连落到任意 worker 都能恢复上下文。
+
+内置两种实现：
+- memory：进程内字典，只适合单 worker
+- sqlite：本地文件（WAL 模式），同一台机器上的多个 worker 共享
+其他存储（如 Redis）只需实现 SessionStore 的三个方法。
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from ..utils.logger import logger
+
+# 会话 ID 由客户端提供（浏览器生成的 UUID），作为存储的键之前先检查长度和字符
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def is_valid_session_id(session_id) -> bool:
+    return isinstance(session_id, str) and SESSION_ID_PATTERN.fullmatch(session_id) is not None
+
+
+class SessionStore(ABC):
+    """会话状态存储接口，缺少任一抽象方法的实现在创建时即报错"""
+
+    @abstractmethod
+    def load(self, session_id: str):
+        """读取对话历史，不存在时返回 None"""
+
+    @abstractmethod
+    def save(self, session_id: str, history: list):
+        """保存对话历史"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """删除会话"""
+
+    def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    MAX_SESSIONS = int(os.getenv("SESSION_STORE_MAX_SESSIONS", "10000"))
+
+    def __init__(self, max_sessions=None):
+        self.max_sessions = max_sessions or self.MAX_SESSIONS
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            history = self._sessions.get(session_id)
+            if history is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            return json.loads(history)
+
+    def save(self, session_id, history):
+        # 存序列化后的副本，避免调用方之后修改列表影响已保存的状态
+        data = json.dumps(history, ensure_ascii=False)
+        with self._lock:
+            self._sessions[session_id] = data
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    DEFAULT_PATH = os.getenv("SESSION_STORE_PATH", "sessions.db")
+    TTL = float(os.getenv("SESSION_STORE_TTL", str(7 * 24 * 3600)))  # 会话过期时间（秒）
+
+    def __init__(self, path=None):
+        self.path = path or self.DEFAULT_PATH
+        self._local = threading.local()
+        self._conns = set()  # 所有线程创建的连接，close() 时统一关闭
+        self._conns_lock = threading.Lock()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, history TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.TTL,))
+        conn.commit()
+
+    def _connect(self):
+        """每个线程一个连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 连接只在创建它的线程里使用，但 close() 要在其他线程关闭它
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            # WAL 模式下多个 worker 进程可以并发读写同一个文件
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.add(conn)
+        return conn
+
+    def load(self, session_id):
+        row = self._connect().execute(
+            "SELECT history FROM sessions WHERE session_id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.TTL)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id, history):
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO sessions (session_id, history, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET history = excluded.history, updated_at = excluded.updated_at",
+            (session_id, json.dumps(history, ensure_ascii=False), time.time())
+        )
+        conn.commit()
+
+    def delete(self, session_id):
+        conn = self._connect()
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        conn.commit()
+
+    def close(self):
+        """关闭所有线程的连接（asyncio.to_thread 的工作线程各自创建过连接）"""
+        with self._conns_lock:
+            conns, self._conns = self._conns, set()
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+
+def create_session_store(backend=None) -> SessionStore:
+    """根据 SESSION_STORE 环境变量创建存储（memory / sqlite）"""
+    backend = (backend or os.getenv("SESSION_STORE", "memory")).lower()
+    if backend == "memory":
+        store = InMemorySessionStore()
+    elif backend == "sqlite":
+        store = SQLiteSessionStore()
+    else:
+        raise ValueError(f"未知的会话存储: {backend}")
+    logger.info(f"会话存储: {backend}")
+    return store
@@ -1,9 +1,12 @@
 import os
-import httpx
 import json
 from typing import AsyncGenerator, Optional
 import logging
 
+from .history import ConversationHistory
+from ..utils.http_client import asend_stream, get_async_client
+from ..utils.resilience import get_endpoint
+
 # 配置日志
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -25,16 +28,27 @@ class StreamChat:
         if not self.api_key:
             raise ValueError("未设置 SILICONFLOW_API_KEY 环境变量")
         self.model = os.getenv("SILICONFLOW_TRANSLATE_MODEL", "THUDM/glm-4-9b-chat")
-        self.conversation_history = []
+        self.history = ConversationHistory()
         self._stop_streaming = False  # 添加停止标志
+        self.base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1").rstrip("/")
+        self.endpoint = get_endpoint("deepseek-chat")
         
+    @property
+    def conversation_history(self):
+        """对话历史（会话存储读写用），实际发送的上下文见 history.messages()"""
+        return self.history.to_list()
+
+    @conversation_history.setter
+    def conversation_history(self, messages):
+        self.history.load(messages)
+
     def stop_streaming(self):
         """停止当前的流式输出"""
         self._stop_streaming = True
         
     def reset(self):
         """重置所有状态"""
-        self.conversation_history = []
+        self.history.clear()
         self._stop_streaming = False
         
     async def stream_chat(self, user_input: str) -> AsyncGenerator[str, None]:
@@ -44,7 +58,7 @@ class StreamChat:
                 return
                 
             # 记录用户输入
-            self.conversation_history.append({"role": "user", "content": user_input})
+            self.history.append("user", user_input)
             full_response = ""  # 添加这一行
             
             # 准备请求数据
@@ -55,33 +69,37 @@ class StreamChat:
             
             data = {
                 "model": self.model,
-                "messages": self.conversation_history,
+                "messages": self.history.messages(),
                 "stream": True
             }
             
-            async with httpx.AsyncClient() as client:
-                async with client.stream('POST', 'https://api.deepseek.com/v1/chat/completions', json=data, headers=headers) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if self._stop_streaming:  # 检查是否需要停止
-                            return
-                            
-                        if line.strip():
-                            try:
-                                json_line = json.loads(line.removeprefix('data: '))
-                                content = json_line['choices'][0]['delta'].get('content', '')
-                                if content:
-                                    full_response += content  # 累积响应
-                                    yield content
-                            except Exception as e:
-                                print(f"Error parsing streaming response: {e}")
-                                
+            # 共享连接池，热连接上第一个字不用等 DNS / TCP / TLS
+            client = get_async_client("deepseek")
+            # 只在收到第一个字之前重试；已经输出的内容无法撤回，中途断开不再重试
+            request = client.build_request('POST', f'{self.base_url}/chat/completions', json=data, headers=headers)
+            response = await self.endpoint.acall(asend_stream, client, request)
+            try:
+                async for line in response.aiter_lines():
+                    if self._stop_streaming:  # 检查是否需要停止
+                        return
+                        
+                    if line.strip():
+                        try:
+                            json_line = json.loads(line.removeprefix('data: '))
+                            content = json_line['choices'][0]['delta'].get('content', '')
+                            if content:
+                                full_response += content  # 累积响应
+                                yield content
+                        except Exception as e:
+                            print(f"Error parsing streaming response: {e}")
+            finally:
+                await response.aclose()
+
             # 如果没有被中断，记录完整的对话历史
             if not self._stop_streaming:
-                self.conversation_history.append({
-                    "role": "assistant", 
-                    "content": full_response  # 改用 full_response 而不是 response_text
-                })
+                self.history.append("assistant", full_response)
+                # 较早的对话在后台总结，不影响下一轮的首字延迟
+                self.history.maybe_summarize()
                 
         except Exception as e:
             print(f"Error in stream chat: {e}")
@@ -89,7 +107,7 @@ class StreamChat:
     
     def reset_conversation(self):
         """重置对话历史"""
-        self.conversation_history = []
+        self.history.clear()
 
 def test():
     import asyncio
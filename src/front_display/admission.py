@@ -0,0 +1,132 @@
+"""准入控制
+
+语音流水线的每个阶段（asr / chat / tts）都有全局和单连接两级并发限制：
+超过并发上限的请求排队，排队也满了就立即拒绝（BusyError），
+由会话给浏览器回复 {"type": "busy", "stage": ...}，而不是让所有请求一起变慢。
+
+配置（环境变量，<STAGE> 为 ASR / CHAT / TTS）：
+- <STAGE>_MAX_ACTIVE：全局同时执行数（TTS 默认取 TTS_WORKERS）
+- <STAGE>_MAX_QUEUE：全局排队上限
+- <STAGE>_QUEUE_TIMEOUT：排队最长等待秒数，超时同样拒绝
+- SESSION_<STAGE>_MAX_ACTIVE：单个连接同时执行数
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+STAGES = ("asr", "chat", "tts")
+
+_DEFAULTS = {
+    # 阶段: (全局并发, 全局排队, 排队超时, 单连接并发)
+    "asr": (16, 32, 10.0, 2),
+    "chat": (32, 64, 10.0, 1),
+    # TTS 的全局并发默认等于合成线程数（TTS_WORKERS），多放行的请求只会在线程池里排队
+    "tts": (int(os.getenv("TTS_WORKERS", "1")), 16, 30.0, 1),
+}
+
+
+class BusyError(Exception):
+    """某个阶段已满，请求被拒绝"""
+
+    def __init__(self, stage, reason="queue_full"):
+        super().__init__(f"{stage} 阶段繁忙 ({reason})")
+        self.stage = stage
+        self.reason = reason
+
+
+class StageLimiter:
+    """单个阶段的并发限制：最多 max_active 个同时执行，最多 max_queue 个排队"""
+
+    def __init__(self, stage, max_active, max_queue, queue_timeout=None):
+        self.stage = stage
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_active)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个执行名额，排队已满或等待超时时抛出 BusyError"""
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise BusyError(self.stage)
+
+        self.queued += 1
+        try:
+            if self.queue_timeout:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            else:
+                await self._semaphore.acquire()
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise BusyError(self.stage, "queue_timeout")
+        finally:
+            self.queued -= 1
+
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+        }
+
+
+def _stage_config(stage):
+    max_active, max_queue, queue_timeout, session_active = _DEFAULTS[stage]
+    prefix = stage.upper()
+    return (
+        int(os.getenv(f"{prefix}_MAX_ACTIVE", str(max_active))),
+        int(os.getenv(f"{prefix}_MAX_QUEUE", str(max_queue))),
+        float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", str(queue_timeout))),
+        int(os.getenv(f"SESSION_{prefix}_MAX_ACTIVE", str(session_active))),
+    )
+
+
+class ConnectionAdmission:
+    """单个连接的准入：先过连接级限制，再过全局限制"""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.limiters = {}
+        for stage in STAGES:
+            session_active = controller.config[stage][3]
+            # 连接内不排队：同一连接的同一阶段超过上限直接拒绝
+            self.limiters[stage] = StageLimiter(stage, session_active, 0)
+
+    @asynccontextmanager
+    async def slot(self, stage):
+        async with self.limiters[stage].slot():
+            async with self.controller.limiters[stage].slot():
+                yield
+
+
+class AdmissionController:
+    """进程级的准入控制"""
+
+    def __init__(self):
+        self.config = {stage: _stage_config(stage) for stage in STAGES}
+        self.limiters = {
+            stage: StageLimiter(stage, max_active, max_queue, queue_timeout)
+            for stage, (max_active, max_queue, queue_timeout, _) in self.config.items()
+        }
+
+    def for_connection(self) -> ConnectionAdmission:
+        return ConnectionAdmission(self)
+
+    def stats(self):
+        return {stage: limiter.stats() for stage, limiter in self.limiters.items()}
@@ -0,0 +1,145 @@
+"""引擎注册表
+
+重量级模型（Kokoro TTS、ASR 处理器）每个进程只加载一次，
+每个 WebSocket 连接只拿到一个轻量的会话句柄，对话历史等会话状态保存在句柄里。
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.audio.text_to_speech import KokoroTTS
+from src.chat.ernie_bot import ErnieBot
+from src.chat.session_store import create_session_store
+from src.front_display.admission import AdmissionController
+from src.transcription import create_processor
+from src.utils.http_client import aclose_clients, close_clients
+from src.utils.logger import logger
+
+
+class EngineSession:
+    """单个连接使用的引擎句柄：共享模型 + 独立的对话状态"""
+
+    def __init__(self, registry, chat, session_id):
+        self.registry = registry
+        self.session_id = session_id
+        self.asr = registry.asr  # 共享，无会话状态
+        self.tts = registry.tts  # 共享，模型权重只有一份
+        self.chat = chat         # 每个会话独立，保存对话历史
+        self.admission = registry.admission.for_connection()
+
+    async def load_history(self):
+        """从会话存储恢复对话历史（断线重连、换 worker 后继续上下文）"""
+        history = await asyncio.to_thread(self.registry.session_store.load, self.session_id)
+        if history:
+            self.chat.conversation_history = history
+            logger.info(f"已恢复会话 {self.session_id}，历史消息 {len(history)} 条")
+
+    async def save_history(self):
+        """把对话历史写回会话存储"""
+        history = list(self.chat.conversation_history)
+        await asyncio.to_thread(self.registry.session_store.save, self.session_id, history)
+
+    async def transcribe(self, audio_buffer, mode="transcriptions"):
+        """语音识别（异步请求，共享连接池），回合被取消时上传随之中断"""
+        return await self.asr.aprocess_audio(audio_buffer, mode)
+
+    async def synthesize(self, text):
+        """在 TTS 线程池中执行语音合成，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.registry.tts_executor, self.tts.speak, text)
+
+    async def synthesize_stream(self, text):
+        """在 TTS 线程池中逐段合成，每段生成后立即交给调用方（float32 采样）"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for chunk in self.tts.synthesize_stream(text):
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        loop.run_in_executor(self.registry.tts_executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # 调用方取消时，后台线程在下一段开始前退出
+            cancelled.set()
+
+    def close(self):
+        """释放会话状态（共享模型不受影响）"""
+        self.chat.stop_streaming()
+
+
+class EngineRegistry:
+    """进程级的共享引擎"""
+
+    # ASR 走异步请求，不占线程；TTS 是 CPU 密集的推理，线程数应接近可用核数
+    TTS_WORKERS = int(os.getenv("TTS_WORKERS", "1"))
+
+    def __init__(self):
+        self.asr = None
+        self.tts = None
+        self.session_store = create_session_store()
+        self.admission = AdmissionController()
+        self.tts_executor = ThreadPoolExecutor(max_workers=self.TTS_WORKERS, thread_name_prefix="tts")
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.asr is not None and self.tts is not None
+
+    def load(self):
+        """加载共享模型，重复调用不会重新加载"""
+        with self._lock:
+            if self.asr is None:
+                self.asr = create_processor()
+                logger.info("ASR 引擎已加载")
+            if self.tts is None:
+                self.tts = KokoroTTS()
+                logger.info("TTS 引擎已加载")
+
+    def create_session(self, session_id) -> EngineSession:
+        """为新连接创建会话句柄"""
+        if not self.loaded:
+            self.load()
+        return EngineSession(self, chat=ErnieBot(), session_id=session_id)
+
+    async def warmup(self):
+        """在服务的事件循环中预热 ASR 和对话的连接，第一句话不用等握手（本地模型加载时已预热）"""
+        awarmup = getattr(self.asr, "awarmup", None)
+        if awarmup is not None:
+            await awarmup()
+        try:
+            await ErnieBot().awarmup()
+        except Exception as e:
+            logger.warning(f"预热对话连接失败: {e}")
+
+    async def aclose(self):
+        """关闭事件循环中的异步连接池"""
+        await aclose_clients()
+
+    def close(self):
+        """进程退出时释放共享模型"""
+        with self._lock:
+            self.tts_executor.shutdown(wait=False, cancel_futures=True)
+            self.asr = None
+            self.tts = None
+            self.session_store.close()
+            close_clients()
+
+
+engines = EngineRegistry()
@@ -1,12 +1,13 @@
 from fastapi import FastAPI, WebSocket, Request, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, Response
 from fastapi.templating import Jinja2Templates
 import uvicorn
 import json
 import asyncio
-import io
 import os
+import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -22,11 +23,15 @@ import sys
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 
 # 修改导入语句
-from src.audio.recorder import AudioRecorder
-from src.transcription.senseVoiceSmall import SenseVoiceSmallProcessor
-from src.chat.stream_chat import StreamChat
-from src.audio.text_to_speech import KokoroTTS
-from src.chat.ernie_bot import ErnieBot
+from src.chat.session_store import is_valid_session_id
+from src.front_display.engines import engines
+from src.front_display.session import VoiceSession
+from src.front_display.metrics import register_gauges
+from src.front_display.pipeline import LIVE_PIPELINES
+from src.llm.cache import cache_stats as llm_cache_stats
+from src.utils.http_client import connection_stats, pool_stats
+from src.utils.resilience import endpoint_stats
+from src.utils.metrics import REGISTRY, CONTENT_TYPE
 
 # 确保目录存在
 static_dir = BASE_DIR / "static"
@@ -34,7 +39,16 @@ templates_dir = BASE_DIR / "templates"
 static_dir.mkdir(parents=True, exist_ok=True)
 templates_dir.mkdir(parents=True, exist_ok=True)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """进程启动时加载共享模型，退出时释放"""
+    await asyncio.to_thread(engines.load)
+    await engines.warmup()
+    yield
+    await engines.aclose()
+    engines.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # 挂载静态文件目录
 app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
@@ -59,6 +73,7 @@ class ConnectionManager:
         await websocket.send_text(message)
 
 manager = ConnectionManager()
+register_gauges(manager, engines, LIVE_PIPELINES)
 
 @app.get("/")
 async def get(request: Request):
@@ -111,157 +126,48 @@ async def debug():
             "static_exists": static_dir.exists(),
             "templates_exists": templates_dir.exists(),
             "static_files": [str(f.relative_to(static_dir)) for f in static_files if f.is_file()],
-            "template_files": [str(f.relative_to(templates_dir)) for f in template_files if f.is_file()]
+            "template_files": [str(f.relative_to(templates_dir)) for f in template_files if f.is_file()],
+            "admission": engines.admission.stats(),
+            "http": connection_stats(),
+            "http_pools": pool_stats(),
+            "api": endpoint_stats(),
+            "asr_cache": engines.asr.cache_stats() if hasattr(engines.asr, "cache_stats") else None,
+            "asr_hedge": engines.asr.hedge_stats() if hasattr(engines.asr, "hedge_stats") else None,
+            "llm_cache": llm_cache_stats()
         }
     except Exception as e:
         import traceback
         traceback.print_exc()
         return {"error": str(e)}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """处理 WebSocket 连接"""
+    session = None
     try:
         await manager.connect(websocket)
         print("WebSocket connected")
-        
-        recorder = AudioRecorder()
-        sense_voice = SenseVoiceSmallProcessor()
-        stream_chat = ErnieBot()
-        tts = KokoroTTS()
-        current_task = None
-        is_connected = True
-        
-        while is_connected:
-            try:
-                message = await websocket.receive()
-                message_type = message.get("type", "")
-                
-                if message_type == "websocket.disconnect":
-                    print("Received disconnect message")
-                    is_connected = False
-                    break
-                
-                # 如果是停止命令
-                if message_type == "websocket.receive" and message.get("text"):
-                    try:
-                        data = json.loads(message["text"])
-                        if data.get("type") == "stop":
-                            print("Received stop command")
-                            stream_chat.stop_streaming()
-                            if current_task and not current_task.done():
-                                current_task.cancel()
-                                try:
-                                    await current_task
-                                except asyncio.CancelledError:
-                                    pass
-                            stream_chat.reset()
-                            continue
-                    except json.JSONDecodeError as e:
-                        print(f"Error decoding JSON: {e}")
-                        continue
-                
-                # 如果是音频数据
-                if message_type == "websocket.receive" and message.get("bytes"):
-                    # 取消之前的任务
-                    if current_task and not current_task.done():
-                        current_task.cancel()
-                        try:
-                            await current_task
-                        except asyncio.CancelledError:
-                            pass
-                    
-                    received_audio_data = message["bytes"]  # 重命名变量
-                    print("Received audio data, length:", len(received_audio_data))
-                    
-                    # 创建新的对话任务，传入音频数据
-                    async def process_audio_task(audio_data):  # 添加参数
-                        try:
-                            # 将字节数据转换为 BytesIO 对象
-                            audio_buffer = io.BytesIO(audio_data)
-                            
-                            # 处理音频
-                            result, error = sense_voice.process_audio(audio_buffer)
-                            if error:
-                                print(f"Audio processing error: {error}")
-                                if is_connected:
-                                    await websocket.send_json({
-                                        "type": "error",
-                                        "message": str(error)
-                                    })
-                                return
-                            
-                            if result:
-                                print(f"Transcription result: {result}")
-                                if is_connected:
-                                    await websocket.send_json({
-                                        "type": "transcription",
-                                        "message": result
-                                    })
-                                
-                                # 流式处理 AI 回复
-                                current_response = ""
-                                async for response in stream_chat.stream_chat(result):
-                                    if not is_connected:
-                                        break
-                                        
-                                    if response:
-                                        print(f"Chat response chunk: {response}")
-                                        current_response += response
-                                        await websocket.send_json({
-                                            "type": "chat",
-                                            "message": response
-                                        })
-                                        
-                                        # 如果是完整的句子，就进行语音合成
-                                        if any(char in response for char in '.!?。！？'):
-                                            print(f"Synthesizing speech for: {current_response}")
-                                            try:
-                                                tts_audio = tts.speak(current_response)  # 重命名变量
-                                                if tts_audio and is_connected:
-                                                    print("Sending synthesized audio")
-                                                    await websocket.send_bytes(tts_audio[0])
-                                            except Exception as e:
-                                                print(f"TTS error: {e}")
-                                            current_response = ""
-                            else:
-                                print("No transcription result")
-                                
-                        except Exception as e:
-                            print(f"Error processing audio: {e}")
-                            import traceback
-                            traceback.print_exc()
-                            if is_connected:
-                                await websocket.send_json({
-                                    "type": "error",
-                                    "message": str(e)
-                                })
-                    
-                    # 创建任务时传入音频数据
-                    current_task = asyncio.create_task(process_audio_task(received_audio_data))
-                    await current_task
-                    
-            except WebSocketDisconnect:
-                print("WebSocket disconnected")
-                is_connected = False
-                break
-            except Exception as e:
-                print(f"Error in websocket loop: {e}")
-                import traceback
-                traceback.print_exc()
-                if str(e).startswith("Cannot call \"receive\" once a disconnect"):
-                    is_connected = False
-                    break
-                
+
+        # 客户端会话 ID，用于在任意 worker 上恢复对话历史
+        session_id = websocket.query_params.get("session_id") or uuid.uuid4().hex
+        if not is_valid_session_id(session_id):
+            print(f"拒绝无效的会话 ID: {session_id[:80]!r}")
+            await websocket.close(code=1008, reason="invalid session_id")
+            return
+
+        # 共享模型只在进程内加载一次，这里只创建会话句柄
+        engine_session = engines.create_session(session_id)
+        await engine_session.load_history()
+        session = VoiceSession(websocket, engine_session)
+        await session.run()
     finally:
-        if current_task and not current_task.done():
-            current_task.cancel()
-            try:
-                await current_task
-            except asyncio.CancelledError:
-                pass
-        
-        stream_chat.stop_streaming()
+        if session:
+            await session.close()
         manager.disconnect(websocket)
         try:
             await websocket.close()
@@ -0,0 +1,86 @@
+"""web 语音助手的运行指标，通过 /metrics 暴露"""
+from src.llm.cache import cache_stats
+from src.utils.http_client import connection_stats, pool_stats
+from src.utils.metrics import Counter, Gauge, Histogram
+from src.utils.resilience import endpoint_stats
+
+RECORDING_SECONDS = Histogram(
+    "voice_recording_seconds", "录音时长",
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60, 120)
+)
+ASR_SECONDS = Histogram("voice_asr_seconds", "语音识别耗时", ["status"])
+LLM_FIRST_TOKEN_SECONDS = Histogram("voice_llm_first_token_seconds", "LLM 首个片段耗时（从请求开始）")
+LLM_STREAM_SECONDS = Histogram("voice_llm_stream_seconds", "LLM 流式输出总耗时")
+TTS_SENTENCE_SECONDS = Histogram("voice_tts_sentence_seconds", "单句语音合成耗时")
+TIME_TO_FIRST_AUDIO_SECONDS = Histogram(
+    "voice_time_to_first_audio_seconds", "从用户说完到首段音频发出的端到端耗时"
+)
+CHAT_PROMPT_TOKENS = Histogram(
+    "voice_chat_prompt_tokens", "每轮发送给 LLM 的上下文 token 数（估算）",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+)
+TURNS = Counter("voice_turns_total", "对话回合数", ["status"])
+VAD_FRAMES = Counter("voice_vad_frames_total", "VAD 处理的帧数")
+VAD_SECONDS = Counter("voice_vad_seconds_total", "VAD 累计耗时")
+TTS_AUDIO_BYTES = Counter("voice_tts_audio_bytes_total", "发送给浏览器的音频字节数")
+
+
+def register_gauges(manager, engines, pipelines):
+    """注册采集时读取当前状态的指标（连接数、队列深度、准入计数）"""
+    admission = engines.admission
+
+    def stage_value(field):
+        return lambda: {(stage,): s[field] for stage, s in admission.stats().items()}
+
+    def http_value(field):
+        return lambda: {(name,): s[field] for name, s in connection_stats().items()}
+
+    def pool_value(field):
+        return lambda: {(name,): s[field] for name, s in pool_stats().items()}
+
+    def api_value(field, convert=None):
+        return lambda: {(name,): convert(s[field]) if convert else s[field] for name, s in endpoint_stats().items()}
+
+    def llm_cache_value(field):
+        return lambda: {(name,): s[field] for name, s in cache_stats().items()}
+
+    def hedge_value(field):
+        def read():
+            stats = engines.asr.hedge_stats() if hasattr(engines.asr, "hedge_stats") else None
+            return stats[field] if stats else 0
+        return read
+
+    def pipeline_depth():
+        depth = {("text",): 0, ("sentence",): 0, ("audio",): 0}
+        for pipeline in list(pipelines):
+            depth[("text",)] += pipeline.text_queue.qsize()
+            depth[("sentence",)] += pipeline.sentence_queue.qsize()
+            depth[("audio",)] += pipeline.audio_queue.qsize()
+        return depth
+
+    Gauge("voice_active_websockets", "当前 WebSocket 连接数",
+          callback=lambda: len(manager.active_connections))
+    Gauge("voice_stage_active", "各阶段正在执行的请求数", ["stage"], callback=stage_value("active"))
+    Gauge("voice_stage_queued", "各阶段排队中的请求数", ["stage"], callback=stage_value("queued"))
+    Counter("voice_stage_admitted_total", "各阶段已放行的请求数", ["stage"], callback=stage_value("admitted"))
+    Counter("voice_stage_rejected_total", "各阶段因繁忙拒绝的请求数", ["stage"], callback=stage_value("rejected"))
+    Gauge("voice_pipeline_queue_depth", "回复流水线各队列中的积压项数", ["queue"], callback=pipeline_depth)
+    Counter("http_client_requests_total", "外部 API 请求数", ["client"], callback=http_value("requests"))
+    Counter("http_client_new_connections_total", "外部 API 新建连接数（其余请求复用已有连接）", ["client"],
+            callback=http_value("new_connections"))
+    Gauge("http_pool_connections", "连接池中的连接数", ["client"], callback=pool_value("connections"))
+    Gauge("http_pool_idle_connections", "连接池中的空闲连接数", ["client"], callback=pool_value("idle"))
+    Gauge("http_pool_queued_requests", "等待空闲连接的请求数", ["client"], callback=pool_value("queued_requests"))
+    Gauge("api_circuit_state", "外部 API 熔断器状态（0 关闭，1 半开，2 打开）", ["endpoint"],
+          callback=api_value("state", {"closed": 0, "half_open": 1, "open": 2}.get))
+    Counter("api_retries_total", "外部 API 重试次数", ["endpoint"], callback=api_value("retries"))
+    Counter("api_short_circuited_total", "熔断期间直接拒绝的外部 API 请求数", ["endpoint"],
+            callback=api_value("short_circuited"))
+    Counter("asr_hedge_fired_total", "主识别服务慢或失败、改发备用服务的次数", callback=hedge_value("fired"))
+    Counter("asr_hedge_won_total", "对冲请求中备用服务先返回的次数", callback=hedge_value("won"))
+    Counter("llm_cache_hits_total", "LLM 响应缓存命中次数（内存和磁盘）", ["cache"],
+            callback=lambda: {(name,): s["memory_hits"] + s["disk_hits"] for name, s in cache_stats().items()})
+    Counter("llm_cache_coalesced_total", "与进行中的相同请求合并、没有单独请求上游的次数", ["cache"],
+            callback=llm_cache_value("coalesced"))
+    Counter("llm_cache_misses_total", "LLM 响应缓存未命中、请求上游的次数", ["cache"], callback=llm_cache_value("misses"))
+    Gauge("llm_cache_entries", "LLM 响应缓存内存中的条数", ["cache"], callback=llm_cache_value("memory_entries"))
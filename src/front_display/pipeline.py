@@ -0,0 +1,195 @@
+"""回复流水线
+
+LLM 流式输出、句子组装、语音合成、音频发送四个协程通过有界队列串联：
+合成第 N+1 句时，第 N 句的音频正在发往浏览器，LLM 也在继续输出后面的内容。
+队列有上限，合成跟不上时会对上游形成背压，而不是无限堆积。
+
+音频以帧（见 src/audio/framing.py）的形式发送，每段合成完立即切帧发出。
+"""
+import asyncio
+import os
+import time
+import weakref
+
+from src.audio.framing import AudioFramer
+from src.chat.segmenter import SentenceSegmenter
+from src.front_display import metrics
+from src.front_display.admission import BusyError
+
+_DONE = object()  # 队列结束标记
+
+# 正在运行的流水线，用于采集队列深度
+LIVE_PIPELINES = weakref.WeakSet()
+
+
+class PipelineStats:
+    """一次回复的时间统计（相对于回合开始，即用户说完话的时刻）"""
+
+    def __init__(self, started_at=None):
+        self.started_at = started_at or time.perf_counter()
+        self.first_token = None   # 首个 LLM 片段
+        self.first_audio = None   # 首段音频发出（time-to-first-audio）
+        self.audio_sent_at = []   # 每句音频首帧发出的时间
+        self.sentences = 0
+        self.audio_bytes = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    @property
+    def gaps(self):
+        """相邻两句音频发出的间隔"""
+        return [b - a for a, b in zip(self.audio_sent_at, self.audio_sent_at[1:])]
+
+    def summary(self):
+        gaps = self.gaps
+        fmt = lambda v: f"{v:.2f}s" if v is not None else "-"
+        return (f"首字: {fmt(self.first_token)}, 首段音频: {fmt(self.first_audio)}, "
+                f"句数: {self.sentences}, 最大句间隔: {fmt(max(gaps) if gaps else None)}, "
+                f"音频: {self.audio_bytes / 1024:.1f}KB, 总耗时: {self.elapsed():.2f}s")
+
+
+class ResponsePipeline:
+    TEXT_QUEUE_SIZE = int(os.getenv("PIPELINE_TEXT_QUEUE_SIZE", "64"))       # LLM 片段
+    SENTENCE_QUEUE_SIZE = int(os.getenv("PIPELINE_SENTENCE_QUEUE_SIZE", "4"))  # 待合成的句子
+    AUDIO_QUEUE_SIZE = int(os.getenv("PIPELINE_AUDIO_QUEUE_SIZE", "16"))     # 待发送的音频帧
+
+    def __init__(self, session, started_at=None, turn=0):
+        self.session = session
+        self.engine = session.engine
+        self.stats = PipelineStats(started_at)
+        self.framer = AudioFramer(self.engine.tts.SAMPLE_RATE, turn=turn)
+        self.text_queue = asyncio.Queue(self.TEXT_QUEUE_SIZE)
+        self.sentence_queue = asyncio.Queue(self.SENTENCE_QUEUE_SIZE)
+        self.audio_queue = asyncio.Queue(self.AUDIO_QUEUE_SIZE)
+        LIVE_PIPELINES.add(self)
+
+    async def run(self, user_text):
+        """运行整条流水线，直到最后一段音频发出"""
+        tasks = [
+            asyncio.create_task(self._stream_llm(user_text)),
+            asyncio.create_task(self._assemble_sentences()),
+            asyncio.create_task(self._synthesize()),
+            asyncio.create_task(self._send_audio()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # 任何一级出错或整个回合被取消时，停掉其余各级
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            print(f"Pipeline stats: {self.stats.summary()}")
+        return self.stats
+
+    async def _stream_llm(self, user_text):
+        """第一级：读取 LLM 流式输出，实时推送文字"""
+        try:
+            async with self.engine.admission.slot("chat"):
+                request_start = time.perf_counter()
+                async for response in self.engine.chat.stream_chat(user_text):
+                    if not self.session.is_connected:
+                        break
+                    if not response:
+                        continue
+                    if self.stats.first_token is None:
+                        self.stats.first_token = self.stats.elapsed()
+                        metrics.LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - request_start)
+                    print(f"Chat response chunk: {response}")
+                    await self.session.send_json({"type": "chat", "message": response})
+                    await self.text_queue.put(response)
+                metrics.LLM_STREAM_SECONDS.observe(time.perf_counter() - request_start)
+                history = getattr(self.engine.chat, "history", None)
+                if history is not None and history.last_prompt_tokens:
+                    metrics.CHAT_PROMPT_TOKENS.observe(history.last_prompt_tokens)
+        finally:
+            await self.text_queue.put(_DONE)
+
+    async def _assemble_sentences(self):
+        """第二级：把 LLM 片段拼成完整的句子"""
+        segmenter = SentenceSegmenter()
+        try:
+            while True:
+                chunk = await self.text_queue.get()
+                if chunk is _DONE:
+                    break
+                for sentence in segmenter.feed(chunk):
+                    if sentence.strip():
+                        await self.sentence_queue.put(sentence)
+            for sentence in segmenter.flush():
+                if sentence.strip():
+                    await self.sentence_queue.put(sentence)
+        finally:
+            await self.sentence_queue.put(_DONE)
+
+    async def _synthesize(self):
+        """第三级：逐句合成语音（线程池中执行），每段生成后立即切帧
+
+        全局 TTS 名额只在合成期间占用：切好的帧先放进本句的缓冲队列，由 _forward 转交给发送队列，
+        慢的客户端只会拖慢自己的发送，不会一直占着其他连接也要用的 TTS 名额。
+        """
+        busy_reported = False
+        try:
+            while True:
+                sentence = await self.sentence_queue.get()
+                if sentence is _DONE:
+                    break
+                print(f"Synthesizing speech for: {sentence}")
+                sentence_start = True
+                pending = asyncio.Queue()  # 本句的帧，放入时不等待
+                forward = asyncio.create_task(self._forward(pending))
+                try:
+                    try:
+                        async with self.engine.admission.slot("tts"):
+                            synth_start = time.perf_counter()
+                            async for audio in self.engine.synthesize_stream(sentence):
+                                for frame in self.framer.frames(audio, sentence_start=sentence_start):
+                                    pending.put_nowait((frame, sentence_start))
+                                    sentence_start = False
+                            metrics.TTS_SENTENCE_SECONDS.observe(time.perf_counter() - synth_start)
+                    except BusyError as e:
+                        # 文字照常显示，只跳过这一句的语音
+                        print(f"TTS rejected: {e}")
+                        if not busy_reported:
+                            await self.session.send_busy(e)
+                            busy_reported = True
+                    except Exception as e:
+                        print(f"TTS error: {e}")
+                    if not sentence_start:
+                        pending.put_nowait((self.framer.end_of_sentence(), False))
+                    pending.put_nowait(_DONE)
+                    # 等本句发完再合成下一句，发送队列的背压仍然传到上游
+                    await forward
+                finally:
+                    if not forward.done():
+                        forward.cancel()
+        finally:
+            await self.audio_queue.put(_DONE)
+
+    async def _forward(self, pending):
+        """把一句的帧按顺序转交给发送队列（客户端慢时在这里等待）"""
+        while True:
+            item = await pending.get()
+            if item is _DONE:
+                return
+            await self.audio_queue.put(item)
+
+    async def _send_audio(self):
+        """第四级：把音频帧发给浏览器"""
+        while True:
+            item = await self.audio_queue.get()
+            if item is _DONE:
+                break
+            frame, sentence_start = item
+            await self.session.send_bytes(frame)
+            self.stats.audio_bytes += len(frame)
+            metrics.TTS_AUDIO_BYTES.inc(len(frame))
+            if not sentence_start:
+                continue
+            sent_at = self.stats.elapsed()
+            if self.stats.first_audio is None:
+                self.stats.first_audio = sent_at
+                metrics.TIME_TO_FIRST_AUDIO_SECONDS.observe(sent_at)
+            self.stats.audio_sent_at.append(sent_at)
+            self.stats.sentences += 1
@@ -0,0 +1,305 @@
+"""WebSocket 语音会话
+
+每个连接有两个协程：
+- 接收循环：只负责读取消息，停止 / 打断命令可以立即处理
+- 对话任务：识别 -> 对话 -> 合成，识别和对话直接 await 异步接口，语音合成放在线程池中执行
+
+录音协议：
+- {"type": "audio_start", "sample_rate": 16000, "format": "pcm_s16le"} 开始一段录音
+- 之后的二进制消息是 PCM 帧，追加到会话缓冲区
+- {"type": "audio_end"} 表示一句话结束，开始识别
+没有 audio_start 时收到的二进制消息按整段录音处理（兼容旧客户端）
+
+流式录音会经过服务端 VAD：识别前裁掉首尾静音；开启自动断句时
+（audio_start 中 "auto_endpoint": true 或 VAD_AUTO_ENDPOINT=true），
+检测到说话后的静音超过 VAD_SILENCE_MS 会发送 {"type": "vad", "event": "speech_end"}
+并自动结束这一句。
+"""
+import asyncio
+import io
+import json
+import os
+import time
+import traceback
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+import numpy as np
+
+from src.audio.preprocess import preprocess_audio, preprocess_samples
+from src.audio.stream_buffer import AudioStreamBuffer
+from src.audio.vad import VoiceActivityDetector
+from src.front_display import metrics
+from src.front_display.admission import BusyError
+from src.front_display.pipeline import ResponsePipeline
+
+
+class VoiceSession:
+    # 录音过程中每累积多少秒新音频做一次中间识别，0 表示关闭
+    PARTIAL_INTERVAL = float(os.getenv("STREAM_PARTIAL_INTERVAL", "0"))
+    # 是否默认根据静音自动结束一句话
+    AUTO_ENDPOINT = os.getenv("VAD_AUTO_ENDPOINT", "false").lower() == "true"
+
+    def __init__(self, websocket: WebSocket, engine_session):
+        self.websocket = websocket
+        self.engine = engine_session
+        self.current_task = None
+        self.turn = 0                # 回合编号，写入音频帧头
+        self.is_connected = True
+        self.stream = None           # 正在接收的录音缓冲区
+        self.vad = None              # 当前录音的语音活动检测
+        self.auto_endpoint = self.AUTO_ENDPOINT
+        self._drop_frames = False    # VAD 自动断句后，丢弃客户端仍在路上的录音帧
+        self.partial_task = None     # 正在进行的中间识别
+        self._last_partial_at = 0.0
+        self._send_lock = asyncio.Lock()
+
+    async def send_json(self, data):
+        """发送 JSON 消息（连接断开时静默忽略）"""
+        if not self.is_connected:
+            return
+        async with self._send_lock:
+            await self.websocket.send_json(data)
+
+    async def send_bytes(self, data):
+        """发送二进制消息（连接断开时静默忽略）"""
+        if not self.is_connected:
+            return
+        async with self._send_lock:
+            await self.websocket.send_bytes(data)
+
+    async def send_busy(self, error: BusyError):
+        """告知客户端某个阶段繁忙，请求已被拒绝"""
+        await self.send_json({
+            "type": "busy",
+            "stage": error.stage,
+            "reason": error.reason,
+            "message": "服务繁忙，请稍后再试"
+        })
+
+    async def run(self):
+        """接收循环，直到连接断开"""
+        while self.is_connected:
+            try:
+                message = await self.websocket.receive()
+                message_type = message.get("type", "")
+
+                if message_type == "websocket.disconnect":
+                    print("Received disconnect message")
+                    self.is_connected = False
+                    break
+
+                if message_type != "websocket.receive":
+                    continue
+
+                if message.get("text"):
+                    await self.handle_text(message["text"])
+                elif message.get("bytes"):
+                    await self.handle_audio(message["bytes"])
+
+            except WebSocketDisconnect:
+                print("WebSocket disconnected")
+                self.is_connected = False
+                break
+            except Exception as e:
+                print(f"Error in websocket loop: {e}")
+                traceback.print_exc()
+                if str(e).startswith("Cannot call \"receive\" once a disconnect"):
+                    self.is_connected = False
+                    break
+
+    async def handle_text(self, text):
+        """处理控制消息"""
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            print(f"Error decoding JSON: {e}")
+            return
+
+        message_type = data.get("type")
+        if message_type == "stop":
+            print("Received stop command")
+            await self.stop()
+        elif message_type == "audio_start":
+            self._drop_frames = False
+            await self.start_utterance(data)
+        elif message_type == "audio_end":
+            if self._drop_frames:
+                # 这一句已经被 VAD 自动结束
+                self._drop_frames = False
+                return
+            await self.end_utterance()
+
+    async def handle_audio(self, audio_data):
+        """处理二进制消息：流式录音帧，或旧客户端的整段录音"""
+        if self.stream is not None:
+            if len(audio_data) % 2:
+                # 16 位 PCM 每个采样 2 字节，追加奇数长度的帧会让之后的采样全部错位一个字节
+                print(f"Dropped odd-length audio frame: {len(audio_data)} bytes")
+                return
+            self.stream.append(audio_data)
+            events = self.vad.process(np.frombuffer(audio_data, dtype=np.int16))
+            if self.auto_endpoint and any(event == "speech_end" for event, _ in events):
+                print("VAD detected end of speech")
+                await self.send_json({"type": "vad", "event": "speech_end"})
+                await self.end_utterance()
+                self._drop_frames = True
+                return
+            self._maybe_start_partial()
+            return
+
+        if self._drop_frames:
+            return
+
+        print("Received audio data, length:", len(audio_data))
+        # 能解码的格式先重采样、裁剪、压缩，再交给识别
+        audio_buffer = await asyncio.to_thread(preprocess_audio, io.BytesIO(audio_data))
+        await self.start_turn(audio_buffer)
+
+    async def start_turn(self, audio_buffer):
+        """打断当前回合并开始新的回合"""
+        await self.cancel_turn()
+        self.turn += 1
+        # 不等待对话任务，接收循环继续读取后续的停止 / 打断消息
+        self.current_task = asyncio.create_task(self.process_turn(audio_buffer, self.turn))
+
+    async def start_utterance(self, data):
+        """开始接收流式录音，用户开口即打断正在播放的回合"""
+        await self.cancel_turn()
+        await self._cancel_partial()
+        try:
+            self.stream = AudioStreamBuffer(
+                sample_rate=data.get("sample_rate", 16000),
+                sample_format=data.get("format", "pcm_s16le")
+            )
+        except ValueError as e:
+            await self.send_json({"type": "error", "message": str(e)})
+            return
+        self.vad = VoiceActivityDetector(self.stream.sample_rate)
+        self.auto_endpoint = bool(data.get("auto_endpoint", self.AUTO_ENDPOINT))
+        self._last_partial_at = 0.0
+        print(f"Audio stream started ({self.stream.sample_rate}Hz)")
+
+    async def end_utterance(self):
+        """一句话结束，用已缓冲的音频开始新回合"""
+        stream, self.stream = self.stream, None
+        await self._cancel_partial()
+        vad, self.vad = self.vad, None
+        if stream is None or stream.num_samples == 0:
+            print("Audio stream ended without data")
+            return
+        print(f"Audio stream ended: {stream.frames} frames, {stream.duration:.2f}s, "
+              f"VAD {vad.frames_processed} frames ({vad.cost_per_frame_us:.1f}us/frame)")
+        metrics.RECORDING_SECONDS.observe(stream.duration)
+        metrics.VAD_FRAMES.inc(vad.frames_processed)
+        metrics.VAD_SECONDS.inc(vad.process_time)
+
+        # 裁掉首尾静音，减少上传字节和识别耗时
+        samples = vad.trim(stream.samples())
+        if len(samples) == 0:
+            print("No speech detected")
+            await self.send_json({"type": "vad", "event": "no_speech"})
+            return
+        print(f"Trimmed silence: {stream.duration:.2f}s -> {len(samples) / stream.sample_rate:.2f}s")
+        # 已按 VAD 裁剪过，这里只做重采样和编码
+        audio_buffer = await asyncio.to_thread(preprocess_samples, samples, stream.sample_rate, False)
+        await self.start_turn(audio_buffer)
+
+    def _maybe_start_partial(self):
+        """录音过程中定期对已缓冲的音频做中间识别"""
+        if self.PARTIAL_INTERVAL <= 0:
+            return
+        if self.partial_task and not self.partial_task.done():
+            return
+        if self.stream.duration - self._last_partial_at < self.PARTIAL_INTERVAL:
+            return
+        self._last_partial_at = self.stream.duration
+        self.partial_task = asyncio.create_task(self._run_partial(self.stream.samples(), self.stream.sample_rate))
+
+    async def _run_partial(self, samples, sample_rate):
+        try:
+            audio_buffer = await asyncio.to_thread(preprocess_samples, samples, sample_rate, False)
+            async with self.engine.admission.slot("asr"):
+                result, error = await self.engine.transcribe(audio_buffer)
+        except BusyError:
+            # 中间结果可有可无，繁忙时直接跳过
+            return
+        if result and not error and self.stream is not None:
+            await self.send_json({"type": "partial", "message": result})
+
+    async def _cancel_partial(self):
+        task, self.partial_task = self.partial_task, None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def stop(self):
+        """停止当前回合并重置对话"""
+        self.engine.chat.stop_streaming()
+        await self.cancel_turn()
+        self.engine.chat.reset()
+        await self.engine.save_history()
+
+    async def cancel_turn(self):
+        """取消正在进行的回合"""
+        task = self.current_task
+        self.current_task = None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def process_turn(self, audio_buffer, turn=0):
+        """一个完整回合：语音识别 -> 流式对话 -> 语音合成"""
+        started_at = time.perf_counter()
+        try:
+            # 语音识别：直接 await 识别服务的异步接口（aprocess_audio）
+            async with self.engine.admission.slot("asr"):
+                asr_start = time.perf_counter()
+                result, error = await self.engine.transcribe(audio_buffer)
+                metrics.ASR_SECONDS.observe(time.perf_counter() - asr_start, status="error" if error else "ok")
+            if error:
+                print(f"Audio processing error: {error}")
+                metrics.TURNS.inc(status="asr_error")
+                await self.send_json({"type": "error", "message": str(error)})
+                return
+
+            if not result:
+                print("No transcription result")
+                metrics.TURNS.inc(status="empty")
+                return
+
+            print(f"Transcription result: {result}")
+            await self.send_json({"type": "transcription", "message": result})
+
+            # LLM、分句、合成、发送流水线并行执行
+            await ResponsePipeline(self, started_at=started_at, turn=turn).run(result)
+            await self.engine.save_history()
+            metrics.TURNS.inc(status="ok")
+
+        except asyncio.CancelledError:
+            metrics.TURNS.inc(status="cancelled")
+            raise
+        except BusyError as e:
+            print(f"Rejected: {e}")
+            metrics.TURNS.inc(status="busy")
+            await self.send_busy(e)
+        except Exception as e:
+            print(f"Error processing audio: {e}")
+            metrics.TURNS.inc(status="error")
+            traceback.print_exc()
+            await self.send_json({"type": "error", "message": str(e)})
+
+    async def close(self):
+        """连接关闭时清理"""
+        self.is_connected = False
+        self.stream = None
+        self.vad = None
+        await self._cancel_partial()
+        await self.cancel_turn()
+        self.engine.close()
@@ -1,41 +1,54 @@
 let ws;
-let mediaRecorder;
-let audioChunks = [];
+let micStream = null;           // 麦克风输入流
+let captureContext = null;       // 录音用的 AudioContext
+let captureSource = null;
+let captureProcessor = null;
 let isRecording = false;
-let audioQueue = [];
-let isPlaying = false;
-let currentAudioContext = null;  // 保存当前的 AudioContext
-let currentSource = null;        // 保存当前的音频源
+let playbackContext = null;     // 播放用的 AudioContext，整个页面共用一个
+let playhead = 0;               // 下一帧的计划播放时间
+let activeSources = [];         // 已排期、尚未播放完的音频源
+let lastTurn = 0;               // 收到的最新回合编号
+let minTurn = 0;                // 小于该编号的回合已被打断，其音频帧直接丢弃
 let isStopped = false;          // 标记是否强制停止
 let reconnectAttempts = 0;
 const maxReconnectAttempts = 5;
+const TARGET_SAMPLE_RATE = 16000;   // 服务端 ASR 使用的采样率
+const CAPTURE_FRAME_SIZE = 2048;    // 每帧采样数，16kHz 下约 128ms
+const FRAME_HEADER_SIZE = 16;       // 音频帧头长度，见 src/audio/framing.py
+const CODEC_PCM16 = 0;
+const CODEC_MULAW = 1;
+const PLAYBACK_LEAD = 0.05;         // 开始播放前预留的缓冲时间（秒）
+
+// 客户端会话 ID，刷新页面或重连后服务端据此恢复对话历史
+function getSessionId() {
+    let sessionId = localStorage.getItem('sessionId');
+    if (!sessionId) {
+        sessionId = (window.crypto && crypto.randomUUID) ?
+            crypto.randomUUID() :
+            Date.now().toString(36) + Math.random().toString(36).slice(2);
+        localStorage.setItem('sessionId', sessionId);
+    }
+    return sessionId;
+}
+
+// 是否还有音频在播放或等待播放
+function isAudioPlaying() {
+    return activeSources.length > 0;
+}
 
 // 停止所有音频播放
 function stopAllAudio() {
-    // 清空音频队列
-    audioQueue = [];
-    
-    // 停止当前正在播放的音频
-    if (currentSource) {
-        try {
-            currentSource.stop();
-        } catch (e) {
-            console.log("Error stopping current source:", e);
-        }
-    }
-    
-    // 关闭当前的 AudioContext
-    if (currentAudioContext) {
+    activeSources.forEach(source => {
         try {
-            currentAudioContext.close();
+            source.stop();
         } catch (e) {
-            console.log("Error closing AudioContext:", e);
+            console.log("Error stopping source:", e);
         }
-    }
-    
-    currentSource = null;
-    currentAudioContext = null;
-    isPlaying = false;
+    });
+    activeSources = [];
+    playhead = 0;
+    // 被打断回合的残留音频帧不再播放
+    minTurn = lastTurn + 1;
 }
 
 // 初始化 WebSocket 连接
@@ -47,28 +60,28 @@ function initWebSocket() {
         return;
     }
     
-    ws = new WebSocket(`ws://${window.location.host}/ws`);
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    ws = new WebSocket(`${protocol}://${window.location.host}/ws?session_id=${encodeURIComponent(getSessionId())}`);
+    ws.binaryType = 'arraybuffer';
     
     ws.onopen = function() {
         console.log("WebSocket connection established");
         reconnectAttempts = 0;  // 重置重连次数
+        // 每个新连接在服务端都是新的会话，回合编号从 0 重新开始
+        lastTurn = 0;
+        minTurn = 0;
     };
     
     ws.onmessage = async function(event) {
-        console.log("Received message:", event.data);
         if (isStopped) {
             console.log("Message ignored - stopped state");
             return;
         }
 
         try {
-            // 如果是二进制数据（音频）
-            if (event.data instanceof Blob) {
-                console.log("Received audio data");
-                audioQueue.push(event.data);
-                if (!isPlaying) {
-                    playNextAudio();
-                }
+            // 如果是二进制数据（音频帧）
+            if (event.data instanceof ArrayBuffer) {
+                handleAudioFrame(event.data);
                 return;
             }
 
@@ -76,12 +89,29 @@ function initWebSocket() {
             const data = JSON.parse(event.data);
             console.log("Parsed message data:", data);
             switch(data.type) {
+                case 'partial':
+                    showPartial(data.message);
+                    break;
                 case 'transcription':
+                    clearPartial();
                     addMessage(data.message, 'user');
                     break;
                 case 'chat':
                     addMessage(data.message, 'assistant');
                     break;
+                case 'vad':
+                    if (data.event === 'speech_end' && isRecording) {
+                        // 服务端已根据静音自动结束这一句
+                        finishRecording(false);
+                    } else if (data.event === 'no_speech') {
+                        clearPartial();
+                        addMessage("未检测到语音", 'system');
+                    }
+                    break;
+                case 'busy':
+                    console.warn('Server busy:', data.stage, data.reason);
+                    addMessage(data.message || "服务繁忙，请稍后再试", 'error');
+                    break;
                 case 'error':
                     console.error('Server error:', data.message);
                     addMessage(`Error: ${data.message}`, 'error');
@@ -111,47 +141,71 @@ function initWebSocket() {
     };
 }
 
-// 播放下一个音频
-async function playNextAudio() {
-    if (audioQueue.length === 0 || isPlaying || isStopped) {
+// 解码音频帧数据为浮点采样
+function decodeSamples(payload, codec) {
+    if (codec === CODEC_MULAW) {
+        const bytes = new Uint8Array(payload);
+        const samples = new Float32Array(bytes.length);
+        for (let i = 0; i < bytes.length; i++) {
+            const c = bytes[i] / 255 * 2 - 1;
+            samples[i] = Math.sign(c) * (Math.pow(256, Math.abs(c)) - 1) / 255;
+        }
+        return samples;
+    }
+    const pcm = new Int16Array(payload);
+    const samples = new Float32Array(pcm.length);
+    for (let i = 0; i < pcm.length; i++) {
+        samples[i] = pcm[i] / 32768;
+    }
+    return samples;
+}
+
+// 处理一帧音频：解码后紧接上一帧排期播放
+function handleAudioFrame(buffer) {
+    if (buffer.byteLength < FRAME_HEADER_SIZE) {
+        return;
+    }
+    const view = new DataView(buffer);
+    if (view.getUint8(0) !== 0x4B || view.getUint8(1) !== 0x41) {  // "KA"
+        console.warn("Unknown binary message");
+        return;
+    }
+    const codec = view.getUint8(3);
+    const turn = view.getUint16(6, true);
+    const sampleRate = view.getUint32(12, true);
+
+    if (turn < minTurn) {
         return;
     }
+    lastTurn = Math.max(lastTurn, turn);
 
-    isPlaying = true;
-    const audioData = audioQueue.shift();
+    const samples = decodeSamples(buffer.slice(FRAME_HEADER_SIZE), codec);
+    if (samples.length === 0) {
+        return;  // 句子结束标记
+    }
 
     try {
-        currentAudioContext = new (window.AudioContext || window.webkitAudioContext)();
-        const arrayBuffer = await audioData.arrayBuffer();
-        const audioBuffer = await currentAudioContext.decodeAudioData(arrayBuffer);
-        
-        currentSource = currentAudioContext.createBufferSource();
-        currentSource.buffer = audioBuffer;
-        currentSource.connect(currentAudioContext.destination);
-        
-        // 监听播放结束事件
-        currentSource.onended = () => {
-            isPlaying = false;
-            currentSource = null;
-            currentAudioContext.close();
-            currentAudioContext = null;
-            if (!isStopped) {
-                playNextAudio();  // 只有在未停止的情况下才继续播放
-            }
+        if (!playbackContext) {
+            playbackContext = new (window.AudioContext || window.webkitAudioContext)();
+        }
+        const audioBuffer = playbackContext.createBuffer(1, samples.length, sampleRate);
+        audioBuffer.copyToChannel(samples, 0);
+
+        const source = playbackContext.createBufferSource();
+        source.buffer = audioBuffer;
+        source.connect(playbackContext.destination);
+        source.onended = () => {
+            activeSources = activeSources.filter(s => s !== source);
         };
-        
-        currentSource.start(0);
+
+        // 无缝衔接：上一帧还没播完就排在它后面，否则留一点缓冲后立即播放
+        const now = playbackContext.currentTime;
+        const startAt = playhead > now ? playhead : now + PLAYBACK_LEAD;
+        source.start(startAt);
+        playhead = startAt + audioBuffer.duration;
+        activeSources.push(source);
     } catch (e) {
         console.error('Error playing audio:', e);
-        isPlaying = false;
-        currentSource = null;
-        if (currentAudioContext) {
-            currentAudioContext.close();
-        }
-        currentAudioContext = null;
-        if (!isStopped) {
-            playNextAudio();
-        }
     }
 }
 
@@ -165,37 +219,115 @@ function addMessage(message, type) {
     chatBox.scrollTop = chatBox.scrollHeight;
 }
 
+// 显示录音过程中的中间识别结果
+function showPartial(message) {
+    let partialDiv = document.getElementById('partialMessage');
+    if (!partialDiv) {
+        const chatBox = document.getElementById('chatBox');
+        partialDiv = document.createElement('div');
+        partialDiv.id = 'partialMessage';
+        partialDiv.className = 'message user-message partial-message';
+        chatBox.appendChild(partialDiv);
+    }
+    partialDiv.textContent = message;
+}
+
+function clearPartial() {
+    const partialDiv = document.getElementById('partialMessage');
+    if (partialDiv) {
+        partialDiv.remove();
+    }
+}
+
+// 将浮点采样重采样到 16kHz 并转换为 16 位 PCM
+function toPcm16(input, inputRate) {
+    let samples = input;
+    if (inputRate !== TARGET_SAMPLE_RATE) {
+        const ratio = inputRate / TARGET_SAMPLE_RATE;
+        const length = Math.floor(input.length / ratio);
+        samples = new Float32Array(length);
+        for (let i = 0; i < length; i++) {
+            const pos = i * ratio;
+            const index = Math.floor(pos);
+            const frac = pos - index;
+            const next = Math.min(index + 1, input.length - 1);
+            samples[i] = input[index] * (1 - frac) + input[next] * frac;
+        }
+    }
+    const pcm = new Int16Array(samples.length);
+    for (let i = 0; i < samples.length; i++) {
+        const s = Math.max(-1, Math.min(1, samples[i]));
+        pcm[i] = s < 0 ? s * 0x8000 : s * 0x7FFF;
+    }
+    return pcm;
+}
+
 // 初始化录音功能
 async function initRecording() {
     try {
-        const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-        mediaRecorder = new MediaRecorder(stream);
-        
-        mediaRecorder.ondataavailable = function(event) {
-            audioChunks.push(event.data);
-        };
-        
-        mediaRecorder.onstop = async function() {
-            if (!ws || ws.readyState !== WebSocket.OPEN) {
-                console.error('WebSocket not connected');
-                return;
-            }
-            
-            try {
-                const audioBlob = new Blob(audioChunks, { type: 'audio/wav' });
-                ws.send(await audioBlob.arrayBuffer());
-                console.log("Audio data sent");
-            } catch (e) {
-                console.error('Error sending audio:', e);
-            }
-            audioChunks = [];
-        };
-        
+        micStream = await navigator.mediaDevices.getUserMedia({
+            audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true }
+        });
     } catch (error) {
         console.error('录音初始化失败:', error);
     }
 }
 
+// 开始流式录音：边录边发送 PCM 帧
+function startStreaming() {
+    try {
+        captureContext = new (window.AudioContext || window.webkitAudioContext)({ sampleRate: TARGET_SAMPLE_RATE });
+    } catch (e) {
+        // 部分浏览器不支持指定采样率，使用默认采样率并在发送前重采样
+        captureContext = new (window.AudioContext || window.webkitAudioContext)();
+    }
+
+    ws.send(JSON.stringify({
+        type: 'audio_start',
+        sample_rate: TARGET_SAMPLE_RATE,
+        format: 'pcm_s16le'
+    }));
+
+    captureSource = captureContext.createMediaStreamSource(micStream);
+    captureProcessor = captureContext.createScriptProcessor(CAPTURE_FRAME_SIZE, 1, 1);
+    captureProcessor.onaudioprocess = function(event) {
+        if (!isRecording || !ws || ws.readyState !== WebSocket.OPEN) {
+            return;
+        }
+        const pcm = toPcm16(event.inputBuffer.getChannelData(0), captureContext.sampleRate);
+        ws.send(pcm.buffer);
+    };
+    captureSource.connect(captureProcessor);
+    captureProcessor.connect(captureContext.destination);
+}
+
+// 结束流式录音，sendEnd 为 false 时表示服务端已经结束了这一句
+function stopStreaming(sendEnd = true) {
+    if (captureProcessor) {
+        captureProcessor.disconnect();
+        captureProcessor.onaudioprocess = null;
+    }
+    if (captureSource) {
+        captureSource.disconnect();
+    }
+    if (captureContext) {
+        captureContext.close();
+    }
+    captureProcessor = null;
+    captureSource = null;
+    captureContext = null;
+
+    if (!sendEnd) {
+        return;
+    }
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({ type: 'audio_end' }));
+        console.log("Audio stream ended");
+    } else {
+        console.error('WebSocket not connected');
+    }
+}
+
 // 修改录音按钮事件处理
 document.getElementById('recordButton').addEventListener('mousedown', async function() {
     console.log("Record button pressed");
@@ -208,9 +340,9 @@ document.getElementById('recordButton').addEventListener('mousedown', async func
         return;
     }
     
-    if (!isRecording && mediaRecorder) {
+    if (!isRecording && micStream) {
         // 如果正在进行对话，先停止当前对话
-        if (isPlaying || audioQueue.length > 0) {
+        if (isAudioPlaying()) {
             console.log("Stopping current conversation");
             isStopped = true;
             stopAllAudio();
@@ -219,25 +351,37 @@ document.getElementById('recordButton').addEventListener('mousedown', async func
             }
             addMessage("对话已停止", 'system');
         }
-        
+        // 新的录音会打断服务端尚未发完的回合，丢弃其残留音频
+        stopAllAudio();
+
+        // 浏览器要求在用户操作后才能播放音频
+        if (playbackContext && playbackContext.state === 'suspended') {
+            playbackContext.resume();
+        }
+
         // 重置状态并开始新的录音
         console.log("Starting new recording");
         isStopped = false;
         isRecording = true;
         this.classList.add('recording');
         this.textContent = '松开结束';
-        audioChunks = [];
-        mediaRecorder.start();
+        startStreaming();
     }
 });
 
+// 结束录音并恢复按钮状态
+function finishRecording(sendEnd = true) {
+    const button = document.getElementById('recordButton');
+    isRecording = false;
+    button.classList.remove('recording');
+    button.textContent = '按住说话';
+    stopStreaming(sendEnd);
+    console.log("Recording stopped");
+}
+
 document.getElementById('recordButton').addEventListener('mouseup', function() {
     if (isRecording) {
-        isRecording = false;
-        this.classList.remove('recording');
-        this.textContent = '按住说话';
-        mediaRecorder.stop();
-        console.log("Recording stopped");
+        finishRecording();
     }
 });
 
@@ -8,13 +8,15 @@ class InputState(Enum):
     RECORDING_TRANSLATE = auto()  # 正在录音(翻译模式)
     PROCESSING = auto()     # 正在处理
     TRANSLATING = auto()    # 正在翻译
+    RECORDING_CHAT = auto()  # 正在录音(对话模式)
+    CHATTING = auto()       # 正在生成对话回复
     ERROR = auto()          # 错误状态
     WARNING = auto()        # 警告状态（用于录音时长不足等提示）
 
     @property
     def is_recording(self):
         """检查是否处于录音状态"""
-        return self in (InputState.RECORDING, InputState.RECORDING_TRANSLATE)
+        return self in (InputState.RECORDING, InputState.RECORDING_TRANSLATE, InputState.RECORDING_CHAT)
     
     @property
     def can_start_recording(self):
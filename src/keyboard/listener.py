@@ -4,13 +4,19 @@ from ..utils.logger import logger
 import time
 from .inputState import InputState
 import os
+import threading
 
 
 class KeyboardManager:
+    # 流式输入时攒够这么久或这么多字再粘贴一次，避免每个片段都触发一次剪贴板粘贴
+    STREAM_FLUSH_INTERVAL = float(os.getenv("KEYBOARD_STREAM_FLUSH_INTERVAL", "0.3"))
+    STREAM_FLUSH_CHARS = int(os.getenv("KEYBOARD_STREAM_FLUSH_CHARS", "40"))
+
     def __init__(self, on_record_start, on_record_stop, on_translate_start, on_translate_stop, on_chat_start, on_chat_stop, on_reset_state):
         self.keyboard = Controller()
         self.option_pressed = False
         self.shift_pressed = False
+        self.chat_pressed = False
         self.temp_text_length = 0  # 用于跟踪临时文本的长度
         self.processing_text = None  # 用于跟踪正在处理的文本
         self.error_message = None  # 用于跟踪错误信息
@@ -39,6 +45,8 @@ class KeyboardManager:
             InputState.RECORDING_TRANSLATE: "🎤 正在录音 (翻译模式)",
             InputState.PROCESSING: "🔄 正在转录...",
             InputState.TRANSLATING: "🔄 正在翻译...",
+            InputState.RECORDING_CHAT: "🎤 正在录音 (对话模式)",
+            InputState.CHATTING: "🔄 正在思考...",
             InputState.ERROR: lambda msg: f"{msg}",  # 错误消息使用函数动态生成
             InputState.WARNING: lambda msg: f"⚠️ {msg}"  # 警告消息使用函数动态生成
         }
@@ -68,8 +76,20 @@ class KeyboardManager:
         except KeyError:
             logger.error(f"无效的翻译按钮配置：{translations_button}")
 
+        # 对话按钮可选，不配置时不启用对话模式
+        chat_button = os.getenv("CHAT_BUTTON")
+        self.chat_button = None
+        if chat_button:
+            try:
+                self.chat_button = Key[chat_button]
+                logger.info(f"配置到对话按钮(与转录按钮组合)：{chat_button}")
+            except KeyError:
+                logger.error(f"无效的对话按钮配置：{chat_button}")
+
         logger.info(f"按住 {transcriptions_button} 键：实时语音转录（保持原文）")
         logger.info(f"按住 {translations_button} + {transcriptions_button} 键：实时语音翻译（翻译成英文）")
+        if self.chat_button is not None:
+            logger.info(f"按住 {chat_button} + {transcriptions_button} 键：语音对话（流式输入回复，松开 Ctrl 中断）")
     
     @property
     def state(self):
@@ -112,7 +132,21 @@ class KeyboardManager:
                     self.type_temp_text(message)
                     self.processing_text = message
                     self.on_translate_stop()
-                
+
+                case InputState.RECORDING_CHAT:
+                    # 对话,录音状态
+                    self.temp_text_length = 0
+                    self.type_temp_text(message)
+                    self.on_chat_start()
+
+                case InputState.CHATTING:
+                    # 对话状态：转录和流式输入回复耗时较长，放到工作线程，
+                    # 键盘监听线程不被阻塞，松开 Ctrl 重置状态即可中断输入
+                    self._delete_previous_text()
+                    self.type_temp_text(message)
+                    self.processing_text = message
+                    threading.Thread(target=self.on_chat_stop, daemon=True, name="keyboard-chat").start()
+
                 case InputState.WARNING:
                     # 警告状态
                     message = message(self.warning_message)
@@ -143,7 +177,6 @@ class KeyboardManager:
             time.sleep(2)  # 警告消息显示2秒
             self.state = InputState.IDLE
         
-        import threading
         threading.Thread(target=clear_message, daemon=True).start()
     
     def show_warning(self, warning_message):
@@ -173,7 +206,7 @@ class KeyboardManager:
             
         if not text:
             # 如果没有文本且不是错误，可能是录音时长不足
-            if self.state in (InputState.PROCESSING, InputState.TRANSLATING):
+            if self.state in (InputState.PROCESSING, InputState.TRANSLATING, InputState.CHATTING):
                 self.show_warning("录音时长过短，请至少录制1秒")
             return
             
@@ -198,6 +231,65 @@ class KeyboardManager:
             logger.error(f"文本输入失败: {e}")
             self.show_error(f"❌ 文本输入失败: {e}")
     
+    def type_stream(self, chunks):
+        """把流式生成的文字片段合并后分批输入到当前光标位置
+
+        第一批文字到达时删除“正在处理”的提示；之后距上次粘贴超过 STREAM_FLUSH_INTERVAL 秒
+        或攒够 STREAM_FLUSH_CHARS 个字时粘贴一次，结束时输入剩余部分。
+        应在工作线程中调用：状态被重置为 IDLE 后，下一个片段到达时停止输入并关闭生成器（断开流式请求）。
+
+        Args:
+            chunks: 文字片段的可迭代对象（如 DeepSeekChat.stream_chat 的返回值）
+        """
+        buffer = ""
+        typed = 0
+        last_flush = time.monotonic()
+
+        def flush():
+            nonlocal buffer, typed, last_flush
+            if typed == 0:
+                self._delete_previous_text()
+            self._paste(buffer)
+            typed += len(buffer)
+            buffer = ""
+            last_flush = time.monotonic()
+
+        interruptible = self.state != InputState.IDLE
+        try:
+            logger.info("正在流式输入回复...")
+            for chunk in chunks:
+                if interruptible and self.state == InputState.IDLE:
+                    # 输入过程中被重置，不再继续输入，关闭生成器以断开请求
+                    logger.info("流式输入已中断")
+                    if hasattr(chunks, "close"):
+                        chunks.close()
+                    return
+                buffer += chunk
+                if (len(buffer) >= self.STREAM_FLUSH_CHARS or
+                        time.monotonic() - last_flush >= self.STREAM_FLUSH_INTERVAL):
+                    flush()
+            if buffer:
+                flush()
+        except Exception as e:
+            logger.error(f"流式输入失败: {e}")
+            if typed == 0:
+                self.show_error(f"❌ 文本输入失败: {e}")
+                return
+
+        if typed == 0:
+            self._delete_previous_text()
+        logger.info(f"流式输入完成，共 {typed} 个字符")
+        self.state = InputState.IDLE
+
+    def _paste(self, text):
+        """通过剪贴板粘贴文本"""
+        pyperclip.copy(text)
+
+        # 模拟 Ctrl + V 粘贴文本
+        with self.keyboard.pressed(self.sysetem_platform):
+            self.keyboard.press('v')
+            self.keyboard.release('v')
+
     def _delete_previous_text(self):
         """删除之前输入的临时文本"""
         if self.temp_text_length > 0:
@@ -211,13 +303,7 @@ class KeyboardManager:
         """输入临时状态文本"""
         if not text:
             return
-        # 将文本复制到剪贴板
-        pyperclip.copy(text)
-
-        # 模拟 Ctrl + V 粘贴文本
-        with self.keyboard.pressed(self.sysetem_platform):
-            self.keyboard.press('v')
-            self.keyboard.release('v')
+        self._paste(text)
 
         # 更新临时文本长度
         self.temp_text_length = len(text)
@@ -235,7 +321,10 @@ class KeyboardManager:
                     (current_time - self.option_press_time) >= self.PRESS_DURATION_THRESHOLD):
                     
                     # 达到阈值时触发相应功能
-                    if self.option_pressed and self.shift_pressed and self.state.can_start_recording:
+                    if self.option_pressed and self.chat_pressed and self.state == InputState.IDLE:
+                        self.state = InputState.RECORDING_CHAT
+                        self.has_triggered = True
+                    elif self.option_pressed and self.shift_pressed and self.state.can_start_recording:
                         self.state = InputState.RECORDING_TRANSLATE
                         # self.on_translate_start()
                         self.has_triggered = True
@@ -247,7 +336,6 @@ class KeyboardManager:
                 time.sleep(0.01)  # 短暂休眠以降低 CPU 使用率
 
         self.is_checking_duration = True
-        import threading
         threading.Thread(target=check_duration, daemon=True).start()
 
     def on_press(self, key):
@@ -278,6 +366,8 @@ class KeyboardManager:
                 self.start_duration_check()
             elif key == self.translations_button:
                 self.shift_pressed = True
+            elif self.chat_button is not None and key == self.chat_button:
+                self.chat_pressed = True
         except AttributeError:
             pass
 
@@ -291,7 +381,9 @@ class KeyboardManager:
                 self.is_checking_duration = False
                 
                 if self.has_triggered:
-                    if self.state == InputState.RECORDING_TRANSLATE:
+                    if self.state == InputState.RECORDING_CHAT:
+                        self.state = InputState.CHATTING
+                    elif self.state == InputState.RECORDING_TRANSLATE:
                         self.state = InputState.TRANSLATING
                     elif self.state == InputState.RECORDING:
                         self.state = InputState.PROCESSING
@@ -303,6 +395,13 @@ class KeyboardManager:
                     self.has_triggered):
                     self.state = InputState.TRANSLATING
                     self.has_triggered = False
+            elif self.chat_button is not None and key == self.chat_button:
+                self.chat_pressed = False
+                if (self.state == InputState.RECORDING_CHAT and
+                    not self.option_pressed and
+                    self.has_triggered):
+                    self.state = InputState.CHATTING
+                    self.has_triggered = False
             elif key == self.transcriptions_button:
                 self.on_record_stop()
             elif key == self.translations_button:
@@ -325,6 +424,7 @@ class KeyboardManager:
         # 重置状态标志
         self.option_pressed = False
         self.shift_pressed = False
+        self.chat_pressed = False
         self.option_press_time = None
         self.is_checking_duration = False
         self.has_triggered = False
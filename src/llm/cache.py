@@ -0,0 +1,268 @@
+"""LLM 响应缓存
+
+翻译、加标点和识别后处理的结果只取决于 (模型, 系统提示词, 输入文本, 参数)，
+演示机上用户整天重复说同样的短句，每次都请求 api.siliconflow.cn 既慢又浪费额度。
+
+- 内存 LRU，最多 LLM_CACHE_MEMORY_ENTRIES 条，每条 LLM_CACHE_TTL 秒后过期
+- LLM_CACHE_DISK_MB > 0 时同时写入磁盘目录 LLM_CACHE_DIR/<名称>，重启后仍能命中
+- 相同的请求同时到达时只有第一个发往上游，其余等待它的结果（singleflight）；上游出错时一起失败，不缓存
+只缓存成功的结果。命中率见 cache_stats()（/debug 和 /metrics）。
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from ..utils.disk_cache import DiskCache
+from ..utils.logger import logger
+
+
+class ResponseCache:
+    """带过期时间和条数上限的结果缓存，同一个键的并发请求合并为一次调用"""
+
+    TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+    MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "2048"))  # 0 表示不缓存，只合并并发请求
+    DISK_DIR = os.getenv("LLM_CACHE_DIR", ".cache/llm")
+    DISK_MB = float(os.getenv("LLM_CACHE_DISK_MB", "0"))  # 0 表示不使用磁盘缓存
+
+    def __init__(self, name, ttl=None, max_entries=None, disk_mb=None):
+        self.name = name
+        self.ttl = self.TTL if ttl is None else ttl
+        self.max_entries = self.MEMORY_ENTRIES if max_entries is None else max_entries
+        disk_mb = self.DISK_MB if disk_mb is None else disk_mb
+        self.disk = DiskCache(os.path.join(self.DISK_DIR, name), disk_mb * 1024 * 1024) if disk_mb > 0 else None
+        self._memory = OrderedDict()  # key -> (结果, 过期时间)
+        self._lock = threading.Lock()
+        self._flights = {}   # 同步调用中的请求：key -> concurrent.futures.Future
+        self._aflights = {}  # 异步调用中的请求：(事件循环, key) -> asyncio.Future
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts):
+        """由模型、提示词、输入等组成的缓存键"""
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key):
+        """调用方持有 self._lock"""
+        item = self._memory.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if time.monotonic() > expires_at:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (value, time.monotonic() + self.ttl)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        if self.disk is None:
+            return None
+        value = self.disk.get(key, max_age=self.ttl)
+        if value is not None:
+            self._memory_set(key, value)
+        return value
+
+    def _store(self, key, value):
+        self._memory_set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except OSError as e:
+                logger.warning(f"写入 LLM 缓存失败: {e}")
+
+    def get(self, key):
+        """只查缓存，不调用上游；没有时返回 None"""
+        with self._lock:
+            value = self._memory_get(key)
+            if value is not None:
+                self.memory_hits += 1
+                return value
+        value = self._disk_get(key)
+        with self._lock:
+            if value is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        return value
+
+    async def aget(self, key):
+        """get 的异步版本，读磁盘放到线程中"""
+        if self.disk is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    def set(self, key, value):
+        if value:  # 空结果多半是上游出了问题，不缓存
+            self._store(key, value)
+
+    async def aset(self, key, value):
+        """set 的异步版本，写磁盘放到线程中"""
+        if self.disk is None:
+            self.set(key, value)
+        else:
+            await asyncio.to_thread(self.set, key, value)
+
+    def _join(self, key, flights, flight_key, new_future):
+        """查内存，或加入 / 发起同一个键的请求；返回 (结果, 正在进行的请求, 是否由本次调用发起)"""
+        with self._lock:
+            value = self._memory_get(key)
+            if value is not None:
+                self.memory_hits += 1
+                return value, None, False
+            future = flights.get(flight_key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future, False
+            future = flights[flight_key] = new_future()
+            return None, future, True
+
+    def _finish(self, flights, flight_key, hit):
+        with self._lock:
+            flights.pop(flight_key, None)
+            if hit:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+
+    def get_or_call(self, key, fn, *args, **kwargs):
+        """返回缓存的结果，没有时调用 fn(*args, **kwargs) 并缓存；fn 抛出的异常原样抛出"""
+        value, future, leader = self._join(key, self._flights, key, concurrent.futures.Future)
+        if value is not None:
+            return value
+        if not leader:
+            return future.result()
+
+        hit = False
+        try:
+            value = self._disk_get(key)
+            hit = value is not None
+            if not hit:
+                value = fn(*args, **kwargs)
+                self.set(key, value)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._finish(self._flights, key, hit)
+
+    async def aget_or_call(self, key, fn, *args, **kwargs):
+        """get_or_call 的异步版本，fn 为协程函数；读写磁盘放到线程中"""
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        value, future, leader = self._join(key, self._aflights, flight_key, loop.create_future)
+        if value is not None:
+            return value
+        if not leader:
+            try:
+                # shield：等待方被取消时不影响发起的请求
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    # 发起请求的一方被取消，由本次调用重新发起
+                    return await self.aget_or_call(key, fn, *args, **kwargs)
+                raise
+
+        hit = False
+        try:
+            value = await asyncio.to_thread(self._disk_get, key) if self.disk is not None else None
+            hit = value is not None
+            if not hit:
+                value = await fn(*args, **kwargs)
+                await self.aset(key, value)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 没有等待方时避免“exception was never retrieved”警告
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._finish(self._aflights, flight_key, hit)
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.coalesced + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 3) if total else None,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self.disk.total_bytes if self.disk is not None else 0,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name) -> ResponseCache:
+    """按名称获取共享的缓存（同一用途的所有实例共用）"""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = ResponseCache(name)
+        return cache
+
+
+def cache_stats():
+    """所有 LLM 缓存的命中统计"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
+
+
+def test():
+    cache = ResponseCache("test", disk_mb=0)
+    calls = []
+
+    def slow_upper(text):
+        calls.append(text)
+        time.sleep(0.2)
+        return text.upper()
+
+    key = cache.key("model", "prompt", "hello")
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: cache.get_or_call(key, slow_upper, "hello"), range(8)))
+    print(results[0], "上游调用次数:", len(calls))
+    print(cache.get_or_call(key, slow_upper, "hello"), "上游调用次数:", len(calls))
+
+    async def aslow_upper(text):
+        calls.append(text)
+        await asyncio.sleep(0.2)
+        return text.upper()
+
+    async def run_async():
+        akey = cache.key("model", "prompt", "world")
+        return await asyncio.gather(*(cache.aget_or_call(akey, aslow_upper, "world") for _ in range(8)))
+
+    print(asyncio.run(run_async())[0], "上游调用次数:", len(calls))
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    test()
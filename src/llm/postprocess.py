@@ -0,0 +1,244 @@
+"""识别结果后处理：一次 LLM 请求完成加标点、优化和翻译
+
+原来每个步骤各调用一次 LLM（识别 -> 加标点 -> 优化结果，或识别 -> 翻译），依次等待。
+这里把启用的步骤写进同一个提示词，要求模型返回 JSON：
+    {"text": "最终结果"}
+开启后处理只多一次往返。需要边生成边显示时可以用 astream，按纯文本流式返回最终结果。
+
+只翻译时沿用 TranslateProcessor 的模型（SILICONFLOW_TRANSLATE_MODEL）和提示词，按纯文本返回；
+包含翻译步骤的合并请求也使用翻译模型，其余使用 SILICONFLOW_POSTPROCESS_MODEL（默认同加标点的模型）。
+模型支持 JSON 模式时设置 POSTPROCESS_JSON_MODE=true 才发送 response_format，否则只在提示词中要求 JSON。
+
+结果按请求内容缓存（见 cache.py），相同的输入不再请求；astream 命中缓存时一次返回整段结果。
+默认任何错误都返回原文，不影响识别结果本身；strict=True 时抛出 PostProcessError，
+翻译模式用它把翻译失败报告为错误，而不是把未翻译的原文当作翻译结果。
+"""
+import json
+import os
+import re
+from typing import AsyncGenerator
+
+import dotenv
+
+from .cache import get_cache
+from .translate import SYSTEM_PROMPT as TRANSLATE_PROMPT
+from ..utils.http_client import (
+    arequest_with_deadline, asend_stream, get_async_client, get_client, make_timeout, request_with_deadline
+)
+from ..utils.logger import logger
+from ..utils.resilience import get_endpoint
+
+dotenv.load_dotenv()
+
+STEPS = {
+    "punctuate": "Add appropriate punctuation.",
+    "optimize": "The input is the result of speech recognition and may contain obvious recognition errors. "
+                "Fix them based on your knowledge; if the input is fine, keep it unchanged.",
+    "translate": "Translate the result into English.",
+}
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def build_prompt(steps, structured=True):
+    """按顺序列出启用的步骤"""
+    lines = ["You are a post-processor for speech recognition results.",
+             "Apply the following steps to the user's input, in order:"]
+    lines += [f"{i}. {STEPS[step]}" for i, step in enumerate(steps, 1)]
+    if "translate" not in steps:
+        lines.append("Do not change the user's language. Do not translate the user's input.")
+    lines += ["Do not answer the user's question. Do not add any explanation or other content."]
+    if structured:
+        lines.append('Respond with a JSON object only: {"text": "<the final result>"}')
+    else:
+        lines.append("Output only the final result.")
+    return "\n".join(lines)
+
+
+def parse_result(content, original):
+    """解析模型返回的 JSON；模型没按格式返回时把整段内容当作结果"""
+    content = _FENCE_RE.sub("", content.strip())
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content or original
+    if isinstance(data, dict) and isinstance(data.get("text"), str):
+        return data["text"].strip() or original
+    return content or original
+
+
+class PostProcessError(Exception):
+    """strict=True 时后处理失败"""
+
+
+class PostProcessor:
+    """合并后的后处理步骤，每次调用只发一次请求"""
+
+    TIMEOUT = float(os.getenv("POSTPROCESS_TIMEOUT", "15"))
+    JSON_MODE = os.getenv("POSTPROCESS_JSON_MODE", "false").lower() == "true"
+
+    def __init__(self):
+        self.api_key = os.getenv("SILICONFLOW_API_KEY")
+        self.base_url = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").rstrip("/")
+        self.model = os.getenv(
+            "SILICONFLOW_POSTPROCESS_MODEL", os.getenv("SILICONFLOW_ADD_SYMBOL_MODEL", "THUDM/glm-4-9b-chat")
+        )
+        self.translate_model = os.getenv("SILICONFLOW_TRANSLATE_MODEL", "THUDM/glm-4-9b-chat")
+        self.endpoint = get_endpoint("siliconflow-chat")
+        self.cache = get_cache("postprocess")
+
+    @staticmethod
+    def steps(punctuate=False, optimize=False, translate=False):
+        """启用的步骤（优化结果已经包含加标点）"""
+        steps = []
+        if punctuate and not optimize:
+            steps.append("punctuate")
+        if optimize:
+            steps += ["punctuate", "optimize"]
+        if translate:
+            steps.append("translate")
+        return steps
+
+    def _payload(self, text, steps, stream=False):
+        if steps == ["translate"]:
+            # 只翻译：与 TranslateProcessor 相同的模型和提示词，纯文本返回
+            system_prompt, structured = TRANSLATE_PROMPT, False
+        else:
+            structured = not stream
+            system_prompt = build_prompt(steps, structured=structured)
+        payload = {
+            "model": self.translate_model if "translate" in steps else self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 2000,
+            "stream": stream,
+        }
+        if structured and self.JSON_MODE:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    def _cache_key(self, text, steps):
+        # 流式和非流式请求的结果相同，共用非流式请求的内容作为键
+        return self.cache.key(self._payload(text, steps))
+
+    def _request(self, text, steps):
+        response = self.endpoint.call(
+            request_with_deadline, get_client("siliconflow"), "POST", f"{self.base_url}/chat/completions",
+            self.TIMEOUT, headers=self._headers(), json=self._payload(text, steps)
+        )
+        response.raise_for_status()
+        return parse_result(response.json()["choices"][0]["message"]["content"], text)
+
+    async def _arequest(self, text, steps):
+        response = await self.endpoint.acall(
+            arequest_with_deadline, get_async_client("siliconflow"), "POST",
+            f"{self.base_url}/chat/completions", self.TIMEOUT,
+            headers=self._headers(), json=self._payload(text, steps)
+        )
+        response.raise_for_status()
+        return parse_result(response.json()["choices"][0]["message"]["content"], text)
+
+    @staticmethod
+    def _failed(e, translate, strict):
+        """strict 时抛出 PostProcessError，否则记录日志（调用方返回原文）"""
+        task = "翻译" if translate else "后处理"
+        if strict:
+            logger.error(f"{task}失败: {e}")
+            raise PostProcessError(f"{task}失败: {e}") from e
+        logger.error(f"{task}失败，使用原文: {e}")
+
+    def process(self, text, punctuate=False, optimize=False, translate=False, strict=False):
+        """同步处理，返回处理后的文本；没有启用任何步骤时返回原文
+
+        出错时默认返回原文；strict=True 时抛出 PostProcessError。
+        """
+        steps = self.steps(punctuate, optimize, translate)
+        if not steps or not text:
+            return text
+        logger.info(f"正在后处理识别结果: {'+'.join(steps)}")
+        try:
+            return self.cache.get_or_call(self._cache_key(text, steps), self._request, text, steps)
+        except Exception as e:
+            self._failed(e, translate, strict)
+            return text
+
+    async def aprocess(self, text, punctuate=False, optimize=False, translate=False, strict=False):
+        """process 的异步版本"""
+        steps = self.steps(punctuate, optimize, translate)
+        if not steps or not text:
+            return text
+        logger.info(f"正在后处理识别结果: {'+'.join(steps)}")
+        try:
+            return await self.cache.aget_or_call(self._cache_key(text, steps), self._arequest, text, steps)
+        except Exception as e:
+            self._failed(e, translate, strict)
+            return text
+
+    async def astream(self, text, punctuate=False, optimize=False, translate=False) -> AsyncGenerator[str, None]:
+        """流式返回最终结果的文字片段；出错且还没有输出时返回原文"""
+        steps = self.steps(punctuate, optimize, translate)
+        if not steps or not text:
+            if text:
+                yield text
+            return
+        key = self._cache_key(text, steps)
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            yield cached
+            return
+        emitted = False
+        chunks = []
+        try:
+            client = get_async_client("siliconflow")
+            request = client.build_request(
+                "POST", f"{self.base_url}/chat/completions", headers=self._headers(),
+                json=self._payload(text, steps, stream=True), timeout=make_timeout(self.TIMEOUT)
+            )
+            response = await self.endpoint.acall(asend_stream, client, request)
+            try:
+                async for line in response.aiter_lines():
+                    line = line.strip()
+                    if not line.startswith("data:") or line == "data: [DONE]":
+                        continue
+                    try:
+                        content = json.loads(line[5:])["choices"][0]["delta"].get("content")
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    if content:
+                        emitted = True
+                        chunks.append(content)
+                        yield content
+            finally:
+                await response.aclose()
+            # 完整读完才缓存，中途断开或被取消的结果不缓存
+            await self.cache.aset(key, "".join(chunks).strip())
+        except Exception as e:
+            logger.error(f"流式后处理失败: {e}")
+            if not emitted:
+                yield text
+
+
+def test():
+    import asyncio
+
+    processor = PostProcessor()
+    text = "你好我是小明今天天气很好你吃了吗"
+    print(processor.process(text, punctuate=True))
+    print(processor.process(text, optimize=True, translate=True))
+
+    async def run_stream():
+        async for chunk in processor.astream(text, punctuate=True, translate=True):
+            print(chunk, end="", flush=True)
+        print()
+
+    asyncio.run(run_stream())
+
+
+if __name__ == "__main__":
+    test()
@@ -1,8 +1,10 @@
 import os
 import sys
 from pathlib import Path
-import httpx
+from .cache import get_cache
+from ..utils.http_client import get_client
 from ..utils.logger import logger
+from ..utils.resilience import get_endpoint
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,6 +15,25 @@ class SymbolProcessor:
         if not self.api_key:
             raise ValueError("未设置 SILICONFLOW_API_KEY 环境变量")
         self.model = os.getenv("SILICONFLOW_ADD_SYMBOL_MODEL", "THUDM/glm-4-9b-chat")
+        self.base_url = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").rstrip("/")
+        self.endpoint = get_endpoint("siliconflow-chat")
+        self.cache = get_cache("symbol")
+
+    def _request(self, headers, data):
+        # 调用 API（429 / 5xx 自动重试，服务熔断时直接失败）
+        response = self.endpoint.call(
+            get_client("siliconflow").post,
+            f"{self.base_url}/chat/completions",
+            headers=headers,
+            json=data,
+            timeout=30
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"API 调用失败: {response.text}")
+        
+        # 获取回应文本
+        return response.json()["choices"][0]["message"]["content"]
 
     def add_symbol(self, text):
         """为输入的文本添加合适的标点符号"""
@@ -42,20 +63,8 @@ class SymbolProcessor:
                 "max_tokens": 2000
             }
             
-            # 调用 API
-            response = httpx.post(
-                "https://api.siliconflow.cn/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"API 调用失败: {response.text}")
-            
-            # 获取回应文本
-            result = response.json()["choices"][0]["message"]["content"]
-            return result
+            # 相同的文本直接用缓存，同时到达的只发一次请求
+            return self.cache.get_or_call(self.cache.key(data), self._request, headers, data)
 
         except Exception as e:
             logger.error(f"添加标点符号失败: {str(e)}")
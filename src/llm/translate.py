@@ -1,23 +1,37 @@
 import os
-import requests
 from dotenv import load_dotenv
+from .cache import get_cache
+from ..utils.http_client import get_client
+from ..utils.resilience import get_endpoint
 
 load_dotenv()
 
+SYSTEM_PROMPT = """
+        You are a translation assistant.
+        Please translate the user's input into English.
+        """
+
 class TranslateProcessor:
     def __init__(self):
-        self.url = "https://api.siliconflow.cn/v1/chat/completions"
+        base_url = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").rstrip("/")
+        self.url = f"{base_url}/chat/completions"
         self.headers = {
             'Authorization': f"Bearer {os.getenv('SILICONFLOW_API_KEY')}",
             "Content-Type": "application/json"
         }
         self.model = os.getenv("SILICONFLOW_TRANSLATE_MODEL", "THUDM/glm-4-9b-chat")
+        self.endpoint = get_endpoint("siliconflow-chat")
+        self.cache = get_cache("translate")
+
+    def _request(self, payload):
+        response = self.endpoint.call(
+            get_client("siliconflow").post, self.url, headers=self.headers, json=payload, timeout=30
+        )
+        response.raise_for_status()
+        return response.json().get('choices', [{}])[0].get('message', {}).get('content', '')
 
     def translate(self, text):
-        system_prompt = """
-        You are a translation assistant.
-        Please translate the user's input into English.
-        """
+        system_prompt = SYSTEM_PROMPT
 
         payload = {
             "model": self.model,
@@ -33,8 +47,8 @@ class TranslateProcessor:
             ]
         }
         try:
-            response = requests.request("POST", self.url, headers=self.headers, json=payload)
-            return response.json().get('choices', [{}])[0].get('message', {}).get('content', '')
+            # 结果只取决于请求内容，相同的请求直接用缓存，同时到达的只发一次
+            return self.cache.get_or_call(self.cache.key(payload), self._request, payload)
         except Exception as e:
             return text, e
         
@@ -0,0 +1,202 @@
+"""WebSocket 压测客户端
+
+模拟大量浏览器连接 /ws，每个客户端发送 WAV 录音，记录每个回合的：
+- transcription：录音发完 -> 收到识别结果
+- first_chat：录音发完 -> 收到第一段对话文字
+- first_audio：录音发完 -> 收到第一帧音频
+最后输出各指标的 p50 / p95 / p99。
+
+两种发送方式：
+- clip：整段 WAV 作为一条二进制消息（旧客户端协议）
+- stream：audio_start + 按实时速度发送的 PCM 帧 + audio_end（需要 16kHz 单声道 16 位 WAV）
+"""
+import asyncio
+import io
+import json
+import random
+import time
+import uuid
+import wave
+
+import numpy as np
+import websockets
+
+METRICS = ("transcription", "first_chat", "first_audio")
+
+
+class TurnResult:
+    def __init__(self):
+        self.transcription = None
+        self.first_chat = None
+        self.first_audio = None
+        self.audio_bytes = 0
+        self.status = "timeout"  # ok / busy / error / timeout
+
+
+class Clip:
+    """一段待发送的录音"""
+
+    def __init__(self, data: bytes, name="clip"):
+        self.name = name
+        self.data = data
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            self.sample_rate = wav.getframerate()
+            self.channels = wav.getnchannels()
+            self.sample_width = wav.getsampwidth()
+            self.pcm = wav.readframes(wav.getnframes())
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read(), name=path)
+
+    @classmethod
+    def synthetic(cls, seconds=1.5, sample_rate=16000):
+        """没有提供录音时生成一段带静音首尾的测试音（能通过服务端 VAD）"""
+        t = np.arange(int(sample_rate * seconds)) / sample_rate
+        voiced = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + 0.5 * np.sin(2 * np.pi * 3 * t))
+        silence = np.zeros(int(sample_rate * 0.3))
+        samples = np.concatenate([silence, voiced, silence])
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes((samples * 32767).astype("<i2").tobytes())
+        return cls(buffer.getvalue(), name="synthetic")
+
+    @property
+    def duration(self):
+        return len(self.pcm) / (self.sample_rate * self.channels * self.sample_width)
+
+
+class LoadDriver:
+    CHUNK_SAMPLES = 2048  # 与浏览器 ScriptProcessor 的帧大小一致
+
+    def __init__(self, url, clips, clients=100, turns=1, ramp=5.0, mode="clip",
+                 idle_timeout=2.0, turn_timeout=60.0, realtime=True):
+        if mode not in ("clip", "stream"):
+            raise ValueError(f"不支持的发送方式: {mode}")
+        if mode == "stream":
+            for clip in clips:
+                if (clip.sample_rate, clip.channels, clip.sample_width) != (16000, 1, 2):
+                    raise ValueError(f"stream 模式需要 16kHz 单声道 16 位 WAV: {clip.name}")
+        self.url = url
+        self.clips = clips
+        self.clients = clients
+        self.turns = turns
+        self.ramp = ramp
+        self.mode = mode
+        self.idle_timeout = idle_timeout
+        self.turn_timeout = turn_timeout
+        self.realtime = realtime
+        self.results = []
+        self.connect_errors = 0
+        self.elapsed = 0.0
+
+    async def _send_clip(self, ws, clip):
+        if self.mode == "clip":
+            await ws.send(clip.data)
+            return
+        await ws.send(json.dumps({"type": "audio_start", "sample_rate": clip.sample_rate, "format": "pcm_s16le"}))
+        chunk_bytes = self.CHUNK_SAMPLES * 2
+        chunk_seconds = self.CHUNK_SAMPLES / clip.sample_rate
+        start = time.perf_counter()
+        for i, offset in enumerate(range(0, len(clip.pcm), chunk_bytes)):
+            if self.realtime:
+                # 按录音的实际速度发送
+                wait = start + i * chunk_seconds - time.perf_counter()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            await ws.send(clip.pcm[offset:offset + chunk_bytes])
+        await ws.send(json.dumps({"type": "audio_end"}))
+
+    async def _run_turn(self, ws, clip):
+        result = TurnResult()
+        await self._send_clip(ws, clip)
+        sent_at = time.perf_counter()
+        deadline = sent_at + self.turn_timeout
+
+        while True:
+            now = time.perf_counter()
+            # 收到音频后，连续 idle_timeout 秒没有新消息即认为回合结束
+            timeout = deadline - now
+            if result.first_audio is not None:
+                timeout = min(timeout, self.idle_timeout)
+            if timeout <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout)
+            except asyncio.TimeoutError:
+                if result.first_audio is not None:
+                    result.status = "ok"
+                break
+
+            elapsed = time.perf_counter() - sent_at
+            if isinstance(message, bytes):
+                result.audio_bytes += len(message)
+                if result.first_audio is None:
+                    result.first_audio = elapsed
+                continue
+
+            data = json.loads(message)
+            message_type = data.get("type")
+            if message_type == "transcription" and result.transcription is None:
+                result.transcription = elapsed
+            elif message_type == "chat" and result.first_chat is None:
+                result.first_chat = elapsed
+            elif message_type == "busy":
+                result.status = "busy"
+                break
+            elif message_type == "error":
+                result.status = "error"
+                break
+        return result
+
+    async def _run_client(self, index):
+        await asyncio.sleep(self.ramp * index / max(self.clients, 1))
+        url = f"{self.url}?session_id=loadtest-{uuid.uuid4().hex}"
+        try:
+            async with websockets.connect(url, max_size=None) as ws:
+                for _ in range(self.turns):
+                    self.results.append(await self._run_turn(ws, random.choice(self.clips)))
+        except (OSError, websockets.WebSocketException) as e:
+            print(f"client {index} failed: {e}")
+            self.connect_errors += 1
+
+    async def run(self):
+        start = time.perf_counter()
+        await asyncio.gather(*(self._run_client(i) for i in range(self.clients)))
+        self.elapsed = time.perf_counter() - start
+        return self.results
+
+    def report(self):
+        """各指标的分位数（秒）及回合状态统计"""
+        statuses = {}
+        for result in self.results:
+            statuses[result.status] = statuses.get(result.status, 0) + 1
+
+        lines = [
+            f"clients: {self.clients}, turns: {len(self.results)}, connect errors: {self.connect_errors}, "
+            f"elapsed: {self.elapsed:.1f}s, throughput: {len(self.results) / max(self.elapsed, 1e-9):.2f} turns/s",
+            "status: " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items())),
+            f"{'metric':<14}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}",
+        ]
+        for metric in METRICS:
+            values = [getattr(r, metric) for r in self.results if getattr(r, metric) is not None]
+            if not values:
+                lines.append(f"{metric:<14}{0:>6}{'-':>9}{'-':>9}{'-':>9}{'-':>9}")
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            lines.append(f"{metric:<14}{len(values):>6}{p50:>9.3f}{p95:>9.3f}{p99:>9.3f}{max(values):>9.3f}")
+        return "\n".join(lines)
+
+
+def test():
+    driver = LoadDriver("ws://127.0.0.1:8000/ws", [Clip.synthetic()], clients=5, ramp=1)
+    asyncio.run(driver.run())
+    print(driver.report())
+
+
+if __name__ == "__main__":
+    test()
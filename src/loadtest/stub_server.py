@@ -0,0 +1,160 @@
+"""外部 API 的本地替身（压测用）
+
+一个 FastAPI 应用同时模拟三家服务，路径与线上一致：
+- 硅基流动：POST /v1/audio/transcriptions、POST /v1/chat/completions
+- DeepSeek：POST /v1/chat/completions（stream=true 时按 SSE 返回）
+- 百度：POST /oauth/2.0/token、POST /rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro
+
+把 SILICONFLOW_BASE_URL / DEEPSEEK_BASE_URL / BAIDU_BASE_URL 指向这里，
+web 服务就不会访问线上接口。各接口的延迟、输出长度和错误率都可以配置。
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = (
+    "Sure, here is a short answer. "
+    "The weather today is mild with a light breeze. "
+    "You might want to bring a jacket in the evening. "
+    "Let me know if there is anything else I can help with. "
+)
+
+
+class StubConfig:
+    ASR_LATENCY = float(os.getenv("STUB_ASR_LATENCY", "0.3"))                 # 识别耗时（秒）
+    CHAT_FIRST_TOKEN = float(os.getenv("STUB_CHAT_FIRST_TOKEN", "0.4"))       # 对话首个片段耗时
+    CHAT_TOKEN_INTERVAL = float(os.getenv("STUB_CHAT_TOKEN_INTERVAL", "0.03"))  # 后续片段间隔
+    CHAT_TOKENS = int(os.getenv("STUB_CHAT_TOKENS", "40"))                    # 每次回复的片段数
+    TOKEN_LATENCY = float(os.getenv("STUB_TOKEN_LATENCY", "0.05"))            # 百度令牌接口耗时
+    JITTER = float(os.getenv("STUB_JITTER", "0.2"))                           # 延迟随机浮动比例
+    ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))                     # 返回 500 的比例
+
+    def __init__(self, **overrides):
+        for name, value in overrides.items():
+            if value is None:
+                continue
+            if not hasattr(self, name.upper()):
+                raise ValueError(f"未知的替身配置: {name}")
+            setattr(self, name.upper(), value)
+
+    def delay(self, base):
+        return max(base * (1 + random.uniform(-self.JITTER, self.JITTER)), 0.0)
+
+    def should_fail(self):
+        return self.ERROR_RATE > 0 and random.random() < self.ERROR_RATE
+
+    def reply_tokens(self):
+        """把固定回复切成 CHAT_TOKENS 个片段（不够时循环）"""
+        words = REPLY.split(" ")
+        tokens = []
+        while len(tokens) < self.CHAT_TOKENS:
+            tokens.extend(word + " " for word in words if word)
+        return tokens[:self.CHAT_TOKENS]
+
+
+def create_app(config: StubConfig = None) -> FastAPI:
+    config = config or StubConfig()
+    app = FastAPI()
+    app.state.config = config
+    app.state.requests = Counter()
+
+    def error_response():
+        return JSONResponse({"error": "stub injected failure"}, status_code=500)
+
+    async def stream_tokens(format_chunk, final_chunk=None):
+        await asyncio.sleep(config.delay(config.CHAT_FIRST_TOKEN))
+        tokens = config.reply_tokens()
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(config.delay(config.CHAT_TOKEN_INTERVAL))
+            yield f"data: {json.dumps(format_chunk(token))}\n\n"
+        if final_chunk is not None:
+            yield f"data: {final_chunk}\n\n"
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        app.state.requests["transcriptions"] += 1
+        await request.body()
+        await asyncio.sleep(config.delay(config.ASR_LATENCY))
+        if config.should_fail():
+            return error_response()
+        return {"text": "What is the weather like today?"}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests["chat_completions"] += 1
+        body = await request.json()
+        if config.should_fail():
+            return error_response()
+
+        if not body.get("stream"):
+            tokens = config.reply_tokens()
+            await asyncio.sleep(config.delay(config.CHAT_FIRST_TOKEN + config.CHAT_TOKEN_INTERVAL * len(tokens)))
+            return {
+                "id": uuid.uuid4().hex,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                    "finish_reason": "stop",
+                }],
+            }
+
+        def format_chunk(token):
+            return {"choices": [{"index": 0, "delta": {"content": token}}]}
+
+        return StreamingResponse(stream_tokens(format_chunk, "[DONE]"), media_type="text/event-stream")
+
+    @app.post("/oauth/2.0/token")
+    async def baidu_token():
+        app.state.requests["baidu_token"] += 1
+        await asyncio.sleep(config.delay(config.TOKEN_LATENCY))
+        return {"access_token": uuid.uuid4().hex, "expires_in": 2592000}
+
+    @app.post("/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro")
+    async def baidu_chat(request: Request):
+        app.state.requests["baidu_chat"] += 1
+        await request.body()
+        if config.should_fail():
+            return error_response()
+
+        def format_chunk(token):
+            return {"result": token, "is_end": False}
+
+        final = json.dumps({"result": "", "is_end": True})
+        return StreamingResponse(stream_tokens(format_chunk, final), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return dict(app.state.requests)
+
+    return app
+
+
+async def start_stub_server(host="127.0.0.1", port=9100, config: StubConfig = None):
+    """在当前事件循环中启动替身服务，返回 (server, task)，结束时设置 server.should_exit"""
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()  # 启动失败（如端口被占用）时抛出异常
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+def test():
+    uvicorn.run(create_app(), host="127.0.0.1", port=int(os.getenv("STUB_PORT", "9100")))
+
+
+if __name__ == "__main__":
+    test()
@@ -1 +1,45 @@
+import os
 
+
+def _create_backend(service_platform):
+    if service_platform == "groq":
+        from .whisper import WhisperProcessor
+        return WhisperProcessor(service_platform="groq")
+    if service_platform == "siliconflow":
+        from .senseVoiceSmall import SenseVoiceSmallProcessor
+        return SenseVoiceSmallProcessor()
+    if service_platform == "local":
+        from .local import LocalSenseVoiceProcessor
+        return LocalSenseVoiceProcessor()
+    raise ValueError(f"无效的服务平台: {service_platform}")
+
+
+# 对冲请求默认的备用平台
+_HEDGE_PARTNERS = {"groq": "siliconflow", "siliconflow": "groq"}
+
+
+def create_processor(service_platform=None, long_form=None):
+    """根据 SERVICE_PLATFORM（groq / siliconflow / local）创建语音识别处理器
+
+    各处理器都提供 process_audio / aprocess_audio，返回 (结果文本, 错误信息)。
+    按需导入，未使用的后端不需要安装对应的依赖。
+    ASR_HEDGE=true 时主服务响应慢会同时请求 ASR_HEDGE_PLATFORM（默认 groq 与 siliconflow 互为备用），
+    ASR_LONG_FORM=true（或传入 long_form=True）时长录音会分段并发识别，ASR_CACHE=true 时缓存识别结果。
+    """
+    service_platform = (service_platform or os.getenv("SERVICE_PLATFORM", "siliconflow")).lower()
+    processor = _create_backend(service_platform)
+    if os.getenv("ASR_HEDGE", "false").lower() == "true":
+        secondary = os.getenv("ASR_HEDGE_PLATFORM", _HEDGE_PARTNERS.get(service_platform, "")).lower()
+        if not secondary or secondary == service_platform:
+            raise ValueError(f"ASR_HEDGE 需要另一个识别平台作为备用: {secondary or '未设置'}")
+        from .hedged import HedgedProcessor
+        processor = HedgedProcessor(processor, _create_backend(secondary))
+    if long_form is None:
+        long_form = os.getenv("ASR_LONG_FORM", "false").lower() == "true"
+    if long_form:
+        from .chunked import ChunkedProcessor
+        processor = ChunkedProcessor(processor)
+    if os.getenv("ASR_CACHE", "false").lower() == "true":
+        from .cache import CachedProcessor
+        processor = CachedProcessor(processor)
+    return processor
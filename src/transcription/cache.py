@@ -0,0 +1,177 @@
+"""识别结果缓存
+
+同一段音频（QA 脚本、演示机、浏览器重传）反复识别时直接返回上次的结果。
+键为 (模型, 模式, 提示词, 归一化 PCM) 的 SHA-256：音频先统一成 16kHz 单声道 int16，
+同一段录音换了容器格式或采样率也能命中。
+
+两级存储：
+- 内存 LRU，最多 ASR_CACHE_MEMORY_ENTRIES 段音频；原始字节的哈希作为别名指向同一条记录，完全相同的上传不用解码
+- 磁盘目录 ASR_CACHE_DIR，总大小超过 ASR_CACHE_DISK_MB 时删除最久未使用的文件
+只缓存识别成功的结果。
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+from ..audio.preprocess import downmix, resample
+from ..utils.disk_cache import DiskCache
+from ..utils.logger import logger
+
+
+def audio_fingerprint(data: bytes) -> str:
+    """归一化后 PCM 的哈希；无法解码的格式退回原始字节的哈希"""
+    try:
+        samples, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    except RuntimeError:
+        return "raw-" + hashlib.sha256(data).hexdigest()
+    pcm = (np.clip(resample(downmix(samples), sample_rate), -1.0, 1.0) * 32767).astype("<i2")
+    return hashlib.sha256(pcm.tobytes()).hexdigest()
+
+
+class CachedProcessor:
+    """包装任意识别处理器，命中缓存时不再调用 API"""
+
+    MEMORY_ENTRIES = int(os.getenv("ASR_CACHE_MEMORY_ENTRIES", "1024"))
+    DISK_DIR = os.getenv("ASR_CACHE_DIR", ".cache/asr")
+    DISK_MB = float(os.getenv("ASR_CACHE_DISK_MB", "100"))  # 0 表示不使用磁盘缓存
+
+    def __init__(self, processor, model=None):
+        self.processor = processor
+        self.model = model or f"{type(processor).__name__}:{getattr(processor, 'DEFAULT_MODEL', '')}"
+        self._memory = OrderedDict()  # 归一化 PCM 键 -> (结果, 指向它的原始字节键集合)
+        self._aliases = {}            # 原始字节键 -> 归一化 PCM 键
+        self._lock = threading.Lock()
+        self.disk = DiskCache(self.DISK_DIR, self.DISK_MB * 1024 * 1024) if self.DISK_MB > 0 else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.processor, name)
+
+    def _key(self, fingerprint, mode, prompt):
+        raw = json.dumps([self.model, mode, prompt, fingerprint], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key):
+        """调用方持有 self._lock"""
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        self._memory.move_to_end(key)
+        return entry[0]
+
+    def _memory_set(self, key, text, raw_key):
+        """每段音频一条记录；raw_key 作为别名指向它，记录被淘汰时别名一起删除"""
+        with self._lock:
+            entry = self._memory.get(key)
+            raw_keys = entry[1] if entry is not None else set()
+            raw_keys.add(raw_key)
+            self._aliases[raw_key] = key
+            self._memory[key] = (text, raw_keys)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.MEMORY_ENTRIES:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                for alias in evicted:
+                    self._aliases.pop(alias, None)
+
+    def _raw_lookup(self, data, mode, prompt):
+        """按原始字节查内存（不解码，微秒级）；返回 (结果或 None, 原始字节键)"""
+        raw_key = self._key("bytes-" + hashlib.sha256(data).hexdigest(), mode, prompt)
+        with self._lock:
+            key = self._aliases.get(raw_key)
+            text = self._memory_get(key) if key is not None else None
+            if text is not None:
+                self.memory_hits += 1
+        return text, raw_key
+
+    def _lookup(self, data, raw_key, mode, prompt):
+        """按归一化 PCM 查内存和磁盘；返回 (结果或 None, 需要写入的键)"""
+        key = self._key(audio_fingerprint(data), mode, prompt)
+        with self._lock:
+            text = self._memory_get(key)
+            if text is not None:
+                self.memory_hits += 1
+        if text is not None:
+            self._memory_set(key, text, raw_key)
+            return text, None
+
+        if self.disk is not None:
+            text = self.disk.get(key)
+            if text is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._memory_set(key, text, raw_key)
+                return text, None
+
+        with self._lock:
+            self.misses += 1
+        return None, (raw_key, key)
+
+    def _store(self, keys, result):
+        text, error = result
+        if error or text is None:
+            return
+        raw_key, key = keys
+        self._memory_set(key, text, raw_key)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, text)
+            except OSError as e:
+                logger.warning(f"写入识别缓存失败: {e}")
+
+    @staticmethod
+    def _read(audio_buffer):
+        data = audio_buffer.read()
+        name = getattr(audio_buffer, "name", None)
+        audio_buffer.close()
+        buffer = io.BytesIO(data)
+        if name:
+            buffer.name = name
+        return data, buffer
+
+    def process_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        data, buffer = self._read(audio_buffer)
+        text, raw_key = self._raw_lookup(data, mode, prompt)
+        if text is None:
+            text, keys = self._lookup(data, raw_key, mode, prompt)
+        if text is not None:
+            logger.info(f"识别缓存命中: {text}")
+            return text, None
+        result = self.processor.process_audio(buffer, mode, prompt)
+        self._store(keys, result)
+        return result
+
+    async def aprocess_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        data, buffer = self._read(audio_buffer)
+        text, raw_key = self._raw_lookup(data, mode, prompt)
+        if text is None:
+            # 解码、重采样和读磁盘放到线程中
+            text, keys = await asyncio.to_thread(self._lookup, data, raw_key, mode, prompt)
+        if text is not None:
+            logger.info(f"识别缓存命中: {text}")
+            return text, None
+        result = await self.processor.aprocess_audio(buffer, mode, prompt)
+        await asyncio.to_thread(self._store, keys, result)
+        return result
+
+    def cache_stats(self):
+        with self._lock:
+            memory_hits, disk_hits, misses = self.memory_hits, self.disk_hits, self.misses
+            entries = len(self._memory)
+        total = memory_hits + disk_hits + misses
+        return {
+            "memory_hits": memory_hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_ratio": round((memory_hits + disk_hits) / total, 3) if total else None,
+            "memory_entries": entries,
+            "disk_bytes": self.disk.total_bytes if self.disk is not None else 0,
+        }
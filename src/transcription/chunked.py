@@ -0,0 +1,182 @@
+"""长录音分段识别
+
+长录音整段上传既容易超时，也只能串行等待。这里在静音处把音频切成不超过
+LONG_FORM_MAX_CHUNK_SECONDS 的片段，并发（最多 LONG_FORM_FAN_OUT 个）交给底层处理器识别，
+再按顺序拼接文本，总耗时取决于最长的一段而不是录音总长。
+
+找不到足够安静的切点时，相邻片段会多带 LONG_FORM_OVERLAP_SECONDS 的重叠音频，
+拼接时去掉前一段结尾和后一段开头重复识别出的文字。
+"""
+import asyncio
+import io
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from ..audio.preprocess import TARGET_SAMPLE_RATE, downmix, encode, resample
+from ..audio.vad import VoiceActivityDetector
+from ..utils.logger import logger
+
+# 中日韩单字、单词（字母数字）各算一个词元，用于对齐重叠部分
+_TOKEN_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]|[^\W_\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+")
+
+
+def find_split_points(samples, sample_rate, max_chunk, search, frame_ms=30):
+    """在静音处选切点，返回 [(切点采样位置, 是否落在静音上)]
+
+    每段最长 max_chunk 秒；在每段末尾 search 秒内选能量最低的一帧作为切点。
+    """
+    frame = sample_rate * frame_ms // 1000
+    num_frames = len(samples) // frame
+    if num_frames == 0:
+        return []
+    frames = samples[:num_frames * frame].reshape(num_frames, frame)
+    energy_db = 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-10)
+    silence_db = VoiceActivityDetector.THRESHOLD_DB
+
+    max_frames = int(max_chunk * 1000 / frame_ms)
+    search_frames = max(int(search * 1000 / frame_ms), 1)
+    points = []
+    start = 0
+    while num_frames - start > max_frames:
+        lo = start + max(max_frames - search_frames, 1)
+        hi = start + max_frames
+        cut = lo + int(np.argmin(energy_db[lo:hi]))
+        points.append((cut * frame, bool(energy_db[cut] < silence_db)))
+        start = cut
+    return points
+
+
+def _tokens(text):
+    return [(m.group().lower(), m.end()) for m in _TOKEN_RE.finditer(text)]
+
+
+def merge_overlap(previous, current, max_tokens=20):
+    """去掉 current 开头与 previous 结尾重复的部分（按词元比较，忽略标点和大小写）"""
+    prev_tokens = [t for t, _ in _tokens(previous)]
+    cur_tokens = _tokens(current)
+    limit = min(len(prev_tokens), len(cur_tokens), max_tokens)
+    for k in range(limit, 0, -1):
+        if prev_tokens[-k:] == [t for t, _ in cur_tokens[:k]]:
+            return current[cur_tokens[k - 1][1]:].lstrip(" ，,。.")
+    return current
+
+
+def join_texts(texts):
+    """按顺序拼接各段文本，中文直接相连，其他语言以空格分隔"""
+    result = ""
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if result and re.match(r"[A-Za-z0-9]", text[0]) and re.search(r"[A-Za-z0-9.,!?;:]$", result):
+            result += " "
+        result += text
+    return result
+
+
+class ChunkedProcessor:
+    """包装任意识别处理器：短录音直接转发，长录音分段并发识别"""
+
+    MAX_CHUNK_SECONDS = float(os.getenv("LONG_FORM_MAX_CHUNK_SECONDS", "15"))
+    SEARCH_SECONDS = float(os.getenv("LONG_FORM_SEARCH_SECONDS", "4"))
+    OVERLAP_SECONDS = float(os.getenv("LONG_FORM_OVERLAP_SECONDS", "1"))
+    FAN_OUT = int(os.getenv("LONG_FORM_FAN_OUT", "4"))
+
+    def __init__(self, processor, fan_out=None):
+        self.processor = processor
+        self.fan_out = fan_out or self.FAN_OUT
+        self._executor = ThreadPoolExecutor(max_workers=self.fan_out, thread_name_prefix="asr-chunk")
+
+    def __getattr__(self, name):
+        # warmup、timeout_seconds 等沿用底层处理器
+        return getattr(self.processor, name)
+
+    def _split(self, audio_buffer):
+        """返回 (原始字节, 文件名, [(片段上传缓冲区, 是否与上一段重叠)])，不需要分段时片段列表为 None"""
+        data = audio_buffer.read()
+        name = getattr(audio_buffer, "name", None)
+        audio_buffer.close()
+        try:
+            samples, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+        except RuntimeError:
+            return data, name, None  # 无法解码的格式只能整段识别
+
+        if len(samples) / sample_rate <= self.MAX_CHUNK_SECONDS:
+            return data, name, None
+
+        samples = resample(downmix(samples), sample_rate)
+        points = find_split_points(samples, TARGET_SAMPLE_RATE, self.MAX_CHUNK_SECONDS, self.SEARCH_SECONDS)
+        overlap = int(self.OVERLAP_SECONDS * TARGET_SAMPLE_RATE)
+        chunks = []
+        start, start_overlapped = 0, False
+        for cut, silent in points + [(len(samples), True)]:
+            # 切点不在静音上时，两侧各多带一段重叠音频，避免切断的字丢失
+            begin = start - overlap if start_overlapped else start
+            end = cut if silent else min(cut + overlap, len(samples))
+            chunks.append((encode(samples[max(begin, 0):end]), start_overlapped))
+            start, start_overlapped = cut, not silent
+        return data, name, chunks
+
+    def _stitch(self, results, overlapped):
+        texts = []
+        for text, has_overlap in zip(results, overlapped):
+            text = text or ""
+            if has_overlap and texts:
+                text = merge_overlap(texts[-1], text)
+            texts.append(text)
+        return join_texts(texts)
+
+    @staticmethod
+    def _raw_buffer(data, name):
+        buffer = io.BytesIO(data)
+        if name:
+            buffer.name = name
+        return buffer
+
+    def process_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        data, name, chunks = self._split(audio_buffer)
+        if chunks is None:
+            return self.processor.process_audio(self._raw_buffer(data, name), mode, prompt)
+
+        start_time = time.time()
+        futures = [self._executor.submit(self.processor.process_audio, chunk, mode, prompt) for chunk, _ in chunks]
+        results = [future.result() for future in futures]
+        return self._finish(results, [o for _, o in chunks], start_time)
+
+    async def aprocess_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        data, name, chunks = await asyncio.to_thread(self._split, audio_buffer)
+        if chunks is None:
+            return await self.processor.aprocess_audio(self._raw_buffer(data, name), mode, prompt)
+
+        start_time = time.time()
+        semaphore = asyncio.Semaphore(self.fan_out)
+
+        async def run(chunk):
+            async with semaphore:
+                return await self.processor.aprocess_audio(chunk, mode, prompt)
+
+        results = await asyncio.gather(*(run(chunk) for chunk, _ in chunks))
+        return self._finish(results, [o for _, o in chunks], start_time)
+
+    def _finish(self, results, overlapped, start_time):
+        errors = [error for _, error in results if error]
+        if errors:
+            return None, errors[0]
+        text = self._stitch([text for text, _ in results], overlapped)
+        logger.info(f"分段识别完成: {len(results)} 段（并发 {self.fan_out}），耗时: {time.time() - start_time:.1f}秒")
+        return text, None
+
+
+def test():
+    print(merge_overlap("今天天气很好我们去公园", "去公园散步吧"))
+    print(merge_overlap("we went to the park and", "Park and then we had lunch."))
+    print(join_texts(["Hello there.", "How are you?", "我很好"]))
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,174 @@
+"""对冲请求：主备两个识别服务赛跑
+
+单个服务的长尾延迟是 p99 的主要来源。主服务在 ASR_HEDGE_PERCENTILE 分位的延迟内
+没有返回时，再向备用服务发同样的请求，取先成功的结果并取消另一个。
+主服务直接失败时立即改发备用服务。
+
+对冲延迟按最近 ASR_HEDGE_WINDOW 次主服务耗时的分位数计算，限制在
+[ASR_HEDGE_MIN_DELAY, ASR_HEDGE_MAX_DELAY] 之间；样本不足时使用 ASR_HEDGE_INITIAL_DELAY。
+默认 p95 意味着大约 5% 的请求会多发一次。
+"""
+import asyncio
+import io
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from ..utils.logger import logger
+
+
+class HedgedProcessor:
+    """包装主、备两个识别处理器，接口与普通处理器相同"""
+
+    PERCENTILE = float(os.getenv("ASR_HEDGE_PERCENTILE", "95"))
+    WINDOW = int(os.getenv("ASR_HEDGE_WINDOW", "200"))
+    MIN_SAMPLES = int(os.getenv("ASR_HEDGE_MIN_SAMPLES", "20"))
+    INITIAL_DELAY = float(os.getenv("ASR_HEDGE_INITIAL_DELAY", "1.5"))
+    MIN_DELAY = float(os.getenv("ASR_HEDGE_MIN_DELAY", "0.3"))
+    MAX_DELAY = float(os.getenv("ASR_HEDGE_MAX_DELAY", "5"))
+
+    def __init__(self, primary, secondary):
+        self.processor = primary
+        self.secondary = secondary
+        self._latencies = deque(maxlen=self.WINDOW)
+        self._lock = threading.Lock()
+        # 同步接口下被放弃的一方无法中断，只能在后台跑完
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="asr-hedge")
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+
+    def __getattr__(self, name):
+        return getattr(self.processor, name)
+
+    def hedge_delay(self):
+        """当前的对冲延迟（秒）"""
+        with self._lock:
+            if len(self._latencies) < self.MIN_SAMPLES:
+                return self.INITIAL_DELAY
+            delay = float(np.percentile(self._latencies, self.PERCENTILE))
+        return min(max(delay, self.MIN_DELAY), self.MAX_DELAY)
+
+    def _record(self, latency):
+        # 只记录主服务成功的耗时；主服务被放弃时记录已等待的时间（真实耗时的下限），否则只统计到快的请求，分位数会偏低。
+        # 失败不记录：熔断打开时 CircuitOpenError 几乎立即返回，会把对冲延迟压到最小值
+        with self._lock:
+            self._latencies.append(latency)
+
+    @staticmethod
+    def _read(audio_buffer):
+        data = audio_buffer.read()
+        name = getattr(audio_buffer, "name", None)
+        audio_buffer.close()
+
+        def copy():
+            buffer = io.BytesIO(data)
+            if name:
+                buffer.name = name
+            return buffer
+
+        return copy
+
+    def _fire(self, reason):
+        self.fired += 1
+        logger.info(f"主识别服务{reason}，发起对冲请求: {type(self.secondary).__name__}")
+
+    def _finish(self, winner, result, start_time):
+        if winner == "secondary":
+            self.won += 1
+        logger.info(f"对冲识别完成: {winner} 胜出，耗时: {time.time() - start_time:.1f}秒")
+        return result
+
+    def process_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        copy = self._read(audio_buffer)
+        self.requests += 1
+        start_time = time.time()
+        delay = self.hedge_delay()
+
+        primary = self._executor.submit(self.processor.process_audio, copy(), mode, prompt)
+        done, _ = wait([primary], timeout=delay)
+        first_error = None
+        if done:
+            first_error = primary.result()
+            if not first_error[1]:
+                self._record(time.time() - start_time)
+                return first_error
+            self._fire("失败")
+        else:
+            self._fire(f"{delay:.2f}秒内未返回")
+
+        secondary = self._executor.submit(self.secondary.process_audio, copy(), mode, prompt)
+        names = {primary: "primary", secondary: "secondary"}
+        pending = {primary, secondary} - done
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if not result[1]:
+                    if future is primary or primary in pending:
+                        self._record(time.time() - start_time)
+                    return self._finish(names[future], result, start_time)
+                first_error = first_error or result
+        return first_error
+
+    async def aprocess_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        copy = self._read(audio_buffer)
+        self.requests += 1
+        start_time = time.time()
+        delay = self.hedge_delay()
+
+        primary = asyncio.create_task(self.processor.aprocess_audio(copy(), mode, prompt))
+        tasks = {primary: "primary"}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            first_error = None
+            if done:
+                first_error = primary.result()
+                if not first_error[1]:
+                    self._record(time.time() - start_time)
+                    return first_error
+                self._fire("失败")
+            else:
+                self._fire(f"{delay:.2f}秒内未返回")
+
+            secondary = asyncio.create_task(self.secondary.aprocess_audio(copy(), mode, prompt))
+            tasks[secondary] = "secondary"
+            pending = set(tasks) - done
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not result[1]:
+                        if task is primary:
+                            self._record(time.time() - start_time)
+                        return self._finish(tasks[task], result, start_time)
+                    first_error = first_error or result
+            return first_error
+        finally:
+            # 取消落后的一方（调用方被取消时两个都取消）
+            if not primary.done():
+                self._record(time.time() - start_time)
+            for task in tasks:
+                task.cancel()
+
+    async def awarmup(self):
+        for processor in (self.processor, self.secondary):
+            awarmup = getattr(processor, "awarmup", None)
+            if awarmup is not None:
+                await awarmup()
+
+    def hedge_stats(self):
+        return {
+            "primary": type(self.processor).__name__,
+            "secondary": type(self.secondary).__name__,
+            "requests": self.requests,
+            "fired": self.fired,
+            "won": self.won,
+            "fire_ratio": round(self.fired / self.requests, 3) if self.requests else None,
+            "win_ratio": round(self.won / self.fired, 3) if self.fired else None,
+            "delay_seconds": round(self.hedge_delay(), 3),
+        }
@@ -0,0 +1,186 @@
+"""本地离线语音识别（sherpa-onnx + SenseVoice）
+
+模型在进程内常驻，识别不需要任何网络请求（翻译模式仍会调用翻译 API）。
+同一时刻到达的多个请求会合并成一批交给 decode_streams 一起推理。
+
+模型下载：https://github.com/k2-fsa/sherpa-onnx/releases/tag/asr-models
+（sherpa-onnx-sense-voice-zh-en-ja-ko-yue-*），解压后目录中需要有 model.int8.onnx（或 model.onnx）和 tokens.txt。
+
+配置（环境变量）：
+- LOCAL_ASR_MODEL_DIR：模型目录
+- LOCAL_ASR_NUM_THREADS：推理线程数，默认 4
+- LOCAL_ASR_LANGUAGE：auto / zh / en / ja / ko / yue
+- LOCAL_ASR_USE_ITN：是否做逆文本正则化（数字、标点），默认 true
+- LOCAL_ASR_MAX_BATCH：一批最多几个请求
+- LOCAL_ASR_BATCH_WAIT_MS：凑批最多等待的毫秒数
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import dotenv
+import numpy as np
+import sherpa_onnx
+import soundfile as sf
+
+from ..llm.postprocess import PostProcessor
+from ..utils.logger import logger
+
+dotenv.load_dotenv()
+
+
+class LocalSenseVoiceProcessor:
+    DEFAULT_MODEL_DIR = "models/sherpa-onnx-sense-voice-zh-en-ja-ko-yue-2024-07-17"
+    DEFAULT_TIMEOUT = float(os.getenv("ASR_TIMEOUT", "10"))  # 排队 + 推理的最长时间（秒）
+    NUM_THREADS = int(os.getenv("LOCAL_ASR_NUM_THREADS", "4"))
+    MAX_BATCH = int(os.getenv("LOCAL_ASR_MAX_BATCH", "8"))
+    BATCH_WAIT_MS = float(os.getenv("LOCAL_ASR_BATCH_WAIT_MS", "10"))
+    service_platform = "local"
+
+    def __init__(self, model_dir=None, num_threads=None):
+        model_dir = Path(model_dir or os.getenv("LOCAL_ASR_MODEL_DIR", self.DEFAULT_MODEL_DIR))
+        model = model_dir / "model.int8.onnx"
+        if not model.exists():
+            model = model_dir / "model.onnx"
+        tokens = model_dir / "tokens.txt"
+        if not model.exists() or not tokens.exists():
+            raise FileNotFoundError(f"本地 ASR 模型不存在: {model_dir}（需要 model.int8.onnx / model.onnx 和 tokens.txt）")
+
+        self.timeout_seconds = self.DEFAULT_TIMEOUT
+        self.num_threads = num_threads or self.NUM_THREADS
+        start_time = time.time()
+        self.recognizer = sherpa_onnx.OfflineRecognizer.from_sense_voice(
+            model=str(model),
+            tokens=str(tokens),
+            num_threads=self.num_threads,
+            language=os.getenv("LOCAL_ASR_LANGUAGE", "auto"),
+            use_itn=os.getenv("LOCAL_ASR_USE_ITN", "true").lower() == "true",
+            provider="cpu",
+        )
+        logger.info(f"本地 ASR 模型已加载: {model}（{self.num_threads} 线程，耗时 {time.time() - start_time:.1f}秒）")
+
+        self.postprocessor = PostProcessor()
+        self.batches = 0
+        self.batched_requests = 0
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._decode_loop, name="local-asr", daemon=True)
+        self._worker.start()
+
+        # 先跑一次推理，让第一条真实请求不用承担初始化开销
+        self._submit(np.zeros(16000 // 2, dtype=np.float32), 16000).result()
+
+    def _submit(self, samples, sample_rate) -> Future:
+        future = Future()
+        self._requests.put((samples, sample_rate, future))
+        return future
+
+    def _collect_batch(self):
+        """取出一批请求：第一条到达后，最多再等 BATCH_WAIT_MS 凑满 MAX_BATCH"""
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.BATCH_WAIT_MS / 1000
+        while len(batch) < self.MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _decode_loop(self):
+        while True:
+            # 调用方已经放弃（取消 / 超时）的请求不再推理
+            batch = [item for item in self._collect_batch() if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                streams = []
+                for samples, sample_rate, _ in batch:
+                    stream = self.recognizer.create_stream()
+                    stream.accept_waveform(sample_rate, samples)
+                    streams.append(stream)
+                self.recognizer.decode_streams(streams)
+                self.batches += 1
+                self.batched_requests += len(batch)
+                for stream, (_, _, future) in zip(streams, batch):
+                    future.set_result(stream.result.text.strip())
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+
+    @staticmethod
+    def _read_audio(audio_buffer):
+        """WAV 字节流 -> (float32 单声道采样, 采样率)，重采样由 sherpa-onnx 完成"""
+        samples, sample_rate = sf.read(audio_buffer, dtype="float32", always_2d=True)
+        return np.ascontiguousarray(samples.mean(axis=1)), sample_rate
+
+    def _error(self, e):
+        """把异常转换为 (None, 错误信息)"""
+        if isinstance(e, (TimeoutError, asyncio.TimeoutError)):
+            error_msg = f"❌ 本地识别超时 ({self.timeout_seconds}秒)"
+            logger.error(error_msg)
+        else:
+            error_msg = f"❌ {str(e)}"
+            logger.error(f"音频处理错误: {str(e)}", exc_info=True)
+        return None, error_msg
+
+    def process_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        """处理音频（转录或翻译），返回 (结果文本, 错误信息)，与在线处理器一致"""
+        future = None
+        try:
+            start_time = time.time()
+            future = self._submit(*self._read_audio(audio_buffer))
+            result = future.result(timeout=self.timeout_seconds)
+            logger.info(f"本地识别完成 ({mode}), 耗时: {time.time() - start_time:.2f}秒")
+            if mode == "translations":
+                result = self.postprocessor.process(result, translate=True, strict=True)
+            logger.info(f"识别结果: {result}")
+            return result, None
+        except Exception as e:
+            if future is not None:
+                future.cancel()
+            return self._error(e)
+        finally:
+            audio_buffer.close()
+
+    async def aprocess_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        """异步版本：推理在后台线程中进行，协程被取消时尚未开始的请求不再推理"""
+        future = None
+        try:
+            start_time = time.time()
+            future = self._submit(*self._read_audio(audio_buffer))
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout_seconds)
+            logger.info(f"本地识别完成 ({mode}), 耗时: {time.time() - start_time:.2f}秒")
+            if mode == "translations":
+                result = await self.postprocessor.aprocess(result, translate=True, strict=True)
+            logger.info(f"识别结果: {result}")
+            return result, None
+        except Exception as e:
+            return self._error(e)
+        finally:
+            if future is not None:
+                future.cancel()
+            audio_buffer.close()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.batched_requests,
+            "avg_batch": round(self.batched_requests / self.batches, 2) if self.batches else None,
+        }
+
+
+def test():
+    processor = LocalSenseVoiceProcessor()
+    test_audio_path = "path/to/test/audio.wav"  # 替换为实际的测试音频文件路径
+    with open(test_audio_path, "rb") as audio_file:
+        print(processor.process_audio(audio_file))
+
+
+if __name__ == "__main__":
+    test()
@@ -1,49 +1,24 @@
 import os
-import threading
 import time
-from functools import wraps
 
 import dotenv
 import httpx
 
-from src.llm.translate import TranslateProcessor
+from src.audio.preprocess import upload_filename
+from src.llm.postprocess import PostProcessor
+from ..utils.http_client import (
+    arequest_with_deadline, awarmup, get_async_client, get_client, request_with_deadline, warmup
+)
 from ..utils.logger import logger
+from ..utils.resilience import get_endpoint
 
 dotenv.load_dotenv()
 
-def timeout_decorator(seconds):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            result = [None]
-            error = [None]
-            completed = threading.Event()
-
-            def target():
-                try:
-                    result[0] = func(*args, **kwargs)
-                except Exception as e:
-                    error[0] = e
-                finally:
-                    completed.set()
-
-            thread = threading.Thread(target=target)
-            thread.daemon = True
-            thread.start()
-
-            if completed.wait(seconds):
-                if error[0] is not None:
-                    raise error[0]
-                return result[0]
-            raise TimeoutError(f"操作超时 ({seconds}秒)")
-
-        return wrapper
-    return decorator
-
 class SenseVoiceSmallProcessor:
     # 类级别的配置参数
-    DEFAULT_TIMEOUT = 20  # API 超时时间（秒）
+    DEFAULT_TIMEOUT = float(os.getenv("ASR_TIMEOUT", "10"))  # API 超时时间（秒）
     DEFAULT_MODEL = "FunAudioLLM/SenseVoiceSmall"
+    service_platform = "siliconflow"
     
     def __init__(self):
         api_key = os.getenv("SILICONFLOW_API_KEY")
@@ -55,7 +30,10 @@ class SenseVoiceSmallProcessor:
         # self.add_symbol = os.getenv("ADD_SYMBOL", "false").lower() == "true"
         # self.optimize_result = os.getenv("OPTIMIZE_RESULT", "false").lower() == "true"
         self.timeout_seconds = self.DEFAULT_TIMEOUT
-        self.translate_processor = TranslateProcessor()
+        self.base_url = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").rstrip("/")
+        self.postprocessor = PostProcessor()
+        # 录音上传较大，最多重试一次
+        self.endpoint = get_endpoint("siliconflow-asr", attempts=2)
 
     def _convert_traditional_to_simplified(self, text):
         """将繁体中文转换为简体中文"""
@@ -63,25 +41,68 @@ class SenseVoiceSmallProcessor:
             return text
         return self.cc.convert(text)
 
-    @timeout_decorator(10)
-    def _call_api(self, audio_data):
-        """调用硅流 API"""
-        transcription_url = "https://api.siliconflow.cn/v1/audio/transcriptions"
+    def warmup(self):
+        """提前建立到硅基流动的连接"""
+        warmup("siliconflow", self.base_url)
+
+    async def awarmup(self):
+        """提前建立异步连接池到硅基流动的连接"""
+        await awarmup("siliconflow", self.base_url)
+
+    def _request(self, audio_data):
+        """转录请求的 url、表单和请求头"""
+        transcription_url = f"{self.base_url}/audio/transcriptions"
         
         files = {
-            'file': ('audio.wav', audio_data),
+            'file': (upload_filename(audio_data), audio_data),
             'model': (None, self.DEFAULT_MODEL)
         }
 
         headers = {
             'Authorization': f"Bearer {os.getenv('SILICONFLOW_API_KEY')}"
         }
+        return transcription_url, files, headers
 
-        with httpx.Client() as client:
-            response = client.post(transcription_url, files=files, headers=headers)
+    def _call_api(self, audio_data):
+        """调用硅流 API"""
+        url, files, headers = self._request(audio_data)
+
+        def send():
+            audio_data.seek(0)  # 重试时重新上传整段音频
+            # 共享连接池，热连接上不再握手；超时后请求被中断，不会遗留线程
+            response = request_with_deadline(
+                get_client("siliconflow"), "POST", url,
+                self.timeout_seconds, files=files, headers=headers
+            )
             response.raise_for_status()
-            return response.json().get('text', '获取失败')
+            return response
 
+        return self.endpoint.call(send).json().get('text', '获取失败')
+
+    async def _acall_api(self, audio_data):
+        """异步调用硅流 API，协程被取消时上传随之中断"""
+        url, files, headers = self._request(audio_data)
+
+        async def send():
+            audio_data.seek(0)
+            response = await arequest_with_deadline(
+                get_async_client("siliconflow"), "POST", url,
+                self.timeout_seconds, files=files, headers=headers
+            )
+            response.raise_for_status()
+            return response
+
+        return (await self.endpoint.acall(send)).json().get('text', '获取失败')
+
+    def _error(self, e):
+        """把异常转换为 (None, 错误信息)"""
+        if isinstance(e, (TimeoutError, httpx.TimeoutException)):
+            error_msg = f"❌ API 请求超时 ({self.timeout_seconds}秒)"
+            logger.error(error_msg)
+        else:
+            error_msg = f"❌ {str(e)}"
+            logger.error(f"音频处理错误: {str(e)}", exc_info=True)
+        return None, error_msg
 
     def process_audio(self, audio_buffer, mode="transcriptions", prompt=""):
         """处理音频（转录或翻译）
@@ -104,7 +125,7 @@ class SenseVoiceSmallProcessor:
             logger.info(f"API 调用成功 ({mode}), 耗时: {time.time() - start_time:.1f}秒")
             # result = self._convert_traditional_to_simplified(result)
             if mode == "translations":
-                result = self.translate_processor.translate(result)
+                result = self.postprocessor.process(result, translate=True, strict=True)
             logger.info(f"识别结果: {result}")
             
             # if self.add_symbol:
@@ -116,17 +137,31 @@ class SenseVoiceSmallProcessor:
 
             return result, None
 
-        except TimeoutError:
-            error_msg = f"❌ API 请求超时 ({self.timeout_seconds}秒)"
-            logger.error(error_msg)
-            return None, error_msg
         except Exception as e:
-            error_msg = f"❌ {str(e)}"
-            logger.error(f"音频处理错误: {str(e)}", exc_info=True)
-            return None, error_msg
+            return self._error(e)
         finally:
             audio_buffer.close()  # 显式关闭字节流
 
+    async def aprocess_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        """process_audio 的异步版本，不占用线程；取消时中断正在进行的上传"""
+        try:
+            start_time = time.time()
+
+            logger.info(f"正在调用 硅基流动 API... (模式: {mode})")
+            result = await self._acall_api(audio_buffer)
+
+            logger.info(f"API 调用成功 ({mode}), 耗时: {time.time() - start_time:.1f}秒")
+            if mode == "translations":
+                result = await self.postprocessor.aprocess(result, translate=True, strict=True)
+            logger.info(f"识别结果: {result}")
+
+            return result, None
+
+        except Exception as e:
+            return self._error(e)
+        finally:
+            audio_buffer.close()
+
 def test():
     # 创建一个测试实例
     senseVoiceSmall = SenseVoiceSmallProcessor()
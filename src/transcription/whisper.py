@@ -1,68 +1,56 @@
+import asyncio
 import os
-import threading
 import time
-from functools import wraps
+import weakref
 
 import dotenv
 import httpx
-from openai import OpenAI
+from openai import APITimeoutError, AsyncOpenAI, OpenAI
 from opencc import OpenCC
 
-from ..llm.symbol import SymbolProcessor
+from ..audio.preprocess import upload_filename
+from ..llm.postprocess import PostProcessor
+from ..utils.http_client import get_async_client, get_client, make_timeout
 from ..utils.logger import logger
+from ..utils.resilience import get_endpoint
 
 dotenv.load_dotenv()
 
-def timeout_decorator(seconds):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            result = [None]
-            error = [None]
-            completed = threading.Event()
-
-            def target():
-                try:
-                    result[0] = func(*args, **kwargs)
-                except Exception as e:
-                    error[0] = e
-                finally:
-                    completed.set()
-
-            thread = threading.Thread(target=target)
-            thread.daemon = True
-            thread.start()
-
-            if completed.wait(seconds):
-                if error[0] is not None:
-                    raise error[0]
-                return result[0]
-            raise TimeoutError(f"操作超时 ({seconds}秒)")
-
-        return wrapper
-    return decorator
-
 class WhisperProcessor:
     # 类级别的配置参数
-    DEFAULT_TIMEOUT = 20  # API 超时时间（秒）
+    DEFAULT_TIMEOUT = float(os.getenv("ASR_TIMEOUT", "10"))  # API 超时时间（秒）
     DEFAULT_MODEL = None
     
-    def __init__(self):
+    def __init__(self, service_platform="groq"):
+        """
+        Args:
+            service_platform: 使用的平台，由 create_processor 传入；不读取 SERVICE_PLATFORM，
+                作为其他平台的对冲备用时也能正确创建 groq 客户端
+        """
         api_key = os.getenv("GROQ_API_KEY")
         base_url = os.getenv("GROQ_BASE_URL")
         self.convert_to_simplified = os.getenv("CONVERT_TO_SIMPLIFIED", "false").lower() == "true"
         self.cc = OpenCC('t2s') if self.convert_to_simplified else None
-        self.symbol = SymbolProcessor()
+        self.postprocessor = PostProcessor()
         self.add_symbol = os.getenv("ADD_SYMBOL", "false").lower() == "true"
         self.optimize_result = os.getenv("OPTIMIZE_RESULT", "false").lower() == "true"
         self.timeout_seconds = self.DEFAULT_TIMEOUT
-        self.service_platform = os.getenv("SERVICE_PLATFORM", "groq").lower()
+        self.service_platform = service_platform.lower()
+
+        self._api_key = api_key
+        self._base_url = base_url if base_url else None
+        self._async_clients = weakref.WeakKeyDictionary()  # 事件循环 -> AsyncOpenAI
+        self.endpoint = get_endpoint("groq-asr", attempts=2)
 
         if self.service_platform == "groq":
             assert api_key, "未设置 GROQ_API_KEY 环境变量"
+            # 使用共享连接池；超时由 httpx 执行，SDK 不再额外重试
             self.client = OpenAI(
                 api_key=api_key,
-                base_url=base_url if base_url else None
+                base_url=base_url if base_url else None,
+                http_client=get_client("groq"),
+                timeout=make_timeout(self.timeout_seconds),
+                max_retries=0
             )
             self.DEFAULT_MODEL = "whisper-large-v3-turbo"
         elif self.service_platform == "siliconflow":
@@ -77,24 +65,90 @@ class WhisperProcessor:
             return text
         return self.cc.convert(text)
     
-    @timeout_decorator(10)
+    def _async_client(self):
+        """当前事件循环的异步客户端，与其他会话共享连接池"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                http_client=get_async_client("groq"),
+                timeout=make_timeout(self.timeout_seconds),
+                max_retries=0
+            )
+            self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _api_args(mode, audio_data, prompt):
+        """返回 (接口名, 请求参数)"""
+        model = "whisper-large-v3" if mode == "translations" else "whisper-large-v3-turbo"
+        return mode, dict(
+            model=model,
+            response_format="text",
+            prompt=prompt,
+            file=(upload_filename(audio_data), audio_data)
+        )
+
     def _call_whisper_api(self, mode, audio_data, prompt):
         """调用 Whisper API"""
-        if mode == "translations":
-            response = self.client.audio.translations.create(
-                model="whisper-large-v3",
-                response_format="text",
-                prompt=prompt,
-                file=("audio.wav", audio_data)
-            )
-        else:  # transcriptions
-            response = self.client.audio.transcriptions.create(
-                model="whisper-large-v3-turbo",
-                response_format="text",
-                prompt=prompt,
-                file=("audio.wav", audio_data)
+        endpoint, kwargs = self._api_args(mode, audio_data, prompt)
+
+        def send():
+            audio_data.seek(0)  # 重试时重新上传整段音频
+            return getattr(self.client.audio, endpoint).create(**kwargs)
+
+        return str(self.endpoint.call(send)).strip()
+
+    async def _acall_whisper_api(self, mode, audio_data, prompt):
+        """异步调用 Whisper API，协程被取消时请求随之中断"""
+        endpoint, kwargs = self._api_args(mode, audio_data, prompt)
+
+        async def send():
+            audio_data.seek(0)
+            return await asyncio.wait_for(
+                getattr(self._async_client().audio, endpoint).create(**kwargs), self.timeout_seconds
             )
-        return str(response).strip()
+
+        return str(await self.endpoint.acall(send)).strip()
+
+    def _postprocess_options(self):
+        # 仅在 groq API 时添加标点符号
+        return dict(
+            punctuate=self.service_platform == "groq" and self.add_symbol,
+            optimize=self.optimize_result
+        )
+
+    def _postprocess(self, result):
+        """繁简转换，添加标点和优化结果合并为一次请求"""
+        result = self._convert_traditional_to_simplified(result)
+        logger.info(f"识别结果: {result}")
+
+        processed = self.postprocessor.process(result, **self._postprocess_options())
+        if processed != result:
+            logger.info(f"后处理结果: {processed}")
+        return processed
+
+    async def _apostprocess(self, result):
+        """_postprocess 的异步版本"""
+        result = self._convert_traditional_to_simplified(result)
+        logger.info(f"识别结果: {result}")
+
+        processed = await self.postprocessor.aprocess(result, **self._postprocess_options())
+        if processed != result:
+            logger.info(f"后处理结果: {processed}")
+        return processed
+
+    def _error(self, e):
+        """把异常转换为 (None, 错误信息)"""
+        if isinstance(e, (TimeoutError, asyncio.TimeoutError, httpx.TimeoutException, APITimeoutError)):
+            error_msg = f"❌ API 请求超时 ({self.timeout_seconds}秒)"
+            logger.error(error_msg)
+        else:
+            error_msg = f"❌ {str(e)}"
+            logger.error(f"音频处理错误: {str(e)}", exc_info=True)
+        return None, error_msg
 
     def process_audio(self, audio_buffer, mode="transcriptions", prompt=""):
         """调用 Whisper API 处理音频（转录或翻译）
@@ -116,27 +170,25 @@ class WhisperProcessor:
             result = self._call_whisper_api(mode, audio_buffer, prompt)
 
             logger.info(f"API 调用成功 ({mode}), 耗时: {time.time() - start_time:.1f}秒")
-            result = self._convert_traditional_to_simplified(result)
-            logger.info(f"识别结果: {result}")
-            
-            # 仅在 groq API 时添加标点符号
-            if self.service_platform == "groq" and self.add_symbol:
-                result = self.symbol.add_symbol(result)
-                logger.info(f"添加标点符号: {result}")
-            if self.optimize_result:
-                result = self.symbol.optimize_result(result)
-                logger.info(f"优化结果: {result}")
-
-            return result, None
-            
-
-        except TimeoutError:
-            error_msg = f"❌ API 请求超时 ({self.timeout_seconds}秒)"
-            logger.error(error_msg)
-            return None, error_msg
+            return self._postprocess(result), None
+
         except Exception as e:
-            error_msg = f"❌ {str(e)}"
-            logger.error(f"音频处理错误: {str(e)}", exc_info=True)
-            return None, error_msg
+            return self._error(e)
+        finally:
+            audio_buffer.close()  # 显式关闭字节流
+
+    async def aprocess_audio(self, audio_buffer, mode="transcriptions", prompt=""):
+        """process_audio 的异步版本，不占用线程；取消时中断正在进行的上传"""
+        try:
+            start_time = time.time()
+
+            logger.info(f"正在调用 Whisper API... (模式: {mode})")
+            result = await self._acall_whisper_api(mode, audio_buffer, prompt)
+
+            logger.info(f"API 调用成功 ({mode}), 耗时: {time.time() - start_time:.1f}秒")
+            return await self._apostprocess(result), None
+
+        except Exception as e:
+            return self._error(e)
         finally:
-            audio_buffer.close()  # 显式关闭字节流
\ No newline at end of file
+            audio_buffer.close()
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""简单的磁盘缓存：每条结果一个 JSON 文件，总大小超过上限时删除最久未使用的文件"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class DiskCache:
+    """每条结果一个 JSON 文件，按修改时间淘汰（读取时更新修改时间）"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.total_bytes = sum(f.stat().st_size for f in self.directory.glob("*.json"))
+
+    def _path(self, key):
+        return self.directory / f"{key}.json"
+
+    def get(self, key, max_age=None):
+        """读取结果；写入超过 max_age 秒的结果视为不存在"""
+        path = self._path(key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if max_age is not None and time.time() - data.get("created_at", 0) > max_age:
+                return None
+            os.utime(path)
+            return data["text"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key, text):
+        path = self._path(key)
+        data = json.dumps({"text": text, "created_at": time.time()}, ensure_ascii=False).encode("utf-8")
+        tmp = path.with_suffix(".tmp")
+        with self._lock:
+            old_size = path.stat().st_size if path.exists() else 0
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self.total_bytes += len(data) - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """删除最久未使用的文件，直到总大小降到上限的 90%"""
+        files = sorted(self.directory.glob("*.json"), key=lambda f: f.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        for f in files:
+            if self.total_bytes <= target:
+                break
+            try:
+                size = f.stat().st_size
+                f.unlink()
+                self.total_bytes -= size
+            except OSError:
+                continue
@@ -0,0 +1,357 @@
+"""共享的 HTTP 连接池
+
+每个外部服务一个长期存在的 httpx.Client / httpx.AsyncClient（按名称共享），代替每次请求新建客户端：
+- keep-alive + HTTP/2（安装了 h2 时），热连接上的请求不再做 TCP / TLS 握手
+- 超时由 httpx 在套接字层面执行，超时即中断请求并释放连接，不会遗留线程
+- 异步客户端绑定事件循环，每个事件循环一组；取消协程即中断请求
+- 通过 httpcore 的 trace 扩展统计每个请求是否新建了连接以及握手耗时
+
+配置（环境变量）：
+- HTTP2：是否启用 HTTP/2，默认 true（需要安装 h2）
+- HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE：连接池大小
+- HTTP_KEEPALIVE_EXPIRY：空闲连接保留秒数
+- HTTP_CONNECT_TIMEOUT：建立连接（含 TLS）超时秒数
+"""
+import asyncio
+import importlib.util
+import os
+import socket
+import threading
+import time
+import weakref
+
+import httpx
+
+from .logger import logger
+
+HTTP2 = os.getenv("HTTP2", "true").lower() == "true"
+if HTTP2 and importlib.util.find_spec("h2") is None:
+    logger.warning("未安装 h2，HTTP 客户端使用 HTTP/1.1（pip install 'httpx[http2]'）")
+    HTTP2 = False
+
+LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+)
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+DEFAULT_TOTAL_TIMEOUT = 30.0
+
+
+def make_timeout(total, connect=None) -> httpx.Timeout:
+    """单次操作的超时设置：建立连接最多 connect 秒，每次读写等待不超过 total 秒（总时长由 request_with_deadline 限制）"""
+    connect = min(connect or CONNECT_TIMEOUT, total)
+    return httpx.Timeout(total, connect=connect, pool=connect)
+
+
+class ConnectionStats:
+    """单个客户端的连接复用统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.handshake_seconds = 0.0
+        self.http2_requests = 0
+
+    def record(self, trace, http_version):
+        with self._lock:
+            self.requests += 1
+            self.new_connections += trace.new_connection
+            self.tls_handshakes += trace.tls
+            self.handshake_seconds += trace.handshake_seconds
+            self.http2_requests += http_version == "HTTP/2"
+
+    @property
+    def reused(self):
+        return self.requests - self.new_connections
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused": self.reused,
+                "reuse_ratio": round(self.reused / self.requests, 3) if self.requests else None,
+                "tls_handshakes": self.tls_handshakes,
+                "avg_handshake_ms": round(self.handshake_seconds / self.new_connections * 1000, 1)
+                if self.new_connections else None,
+                "http2_requests": self.http2_requests,
+            }
+
+
+class RequestTrace:
+    """httpcore trace 回调：记录一次请求的建连和握手"""
+
+    _HANDSHAKE_EVENTS = ("connection.connect_tcp", "connection.start_tls")
+
+    def __init__(self):
+        self.new_connection = False
+        self.tls = False
+        self.handshake_seconds = 0.0
+        self._started = {}
+
+    def __call__(self, event_name, info):
+        name, _, phase = event_name.rpartition(".")
+        if name not in self._HANDSHAKE_EVENTS:
+            return
+        if phase == "started":
+            self._started[name] = time.perf_counter()
+        elif phase == "complete":
+            self.handshake_seconds += time.perf_counter() - self._started.pop(name, time.perf_counter())
+            if name == "connection.connect_tcp":
+                self.new_connection = True
+            else:
+                self.tls = True
+
+
+class AsyncRequestTrace(RequestTrace):
+    """异步连接池使用的 trace 回调（httpcore 会 await 它）"""
+
+    async def __call__(self, event_name, info):
+        super().__call__(event_name, info)
+
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()  # 事件循环 -> {名称: AsyncClient}
+_stats = {}
+_lock = threading.Lock()
+
+
+def get_stats(name) -> ConnectionStats:
+    with _lock:
+        return _stats.setdefault(name, ConnectionStats())
+
+
+def _event_hooks(stats):
+    def on_request(request):
+        request.extensions["trace"] = RequestTrace()
+
+    def on_response(response):
+        trace = response.request.extensions.get("trace")
+        if isinstance(trace, RequestTrace):
+            stats.record(trace, response.http_version)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def _async_event_hooks(stats):
+    async def on_request(request):
+        request.extensions["trace"] = AsyncRequestTrace()
+
+    async def on_response(response):
+        trace = response.request.extensions.get("trace")
+        if isinstance(trace, RequestTrace):
+            stats.record(trace, response.http_version)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def get_client(name) -> httpx.Client:
+    """按名称获取共享的同步客户端（线程安全，可在线程池中并发使用）"""
+    stats = get_stats(name)
+    with _lock:
+        client = _clients.get(name)
+        if client is None or client.is_closed:
+            client = httpx.Client(
+                http2=HTTP2,
+                limits=LIMITS,
+                timeout=make_timeout(DEFAULT_TOTAL_TIMEOUT),
+                event_hooks=_event_hooks(stats),
+            )
+            _clients[name] = client
+        return client
+
+
+def get_async_client(name) -> httpx.AsyncClient:
+    """按名称获取当前事件循环共享的异步客户端，所有会话复用同一个连接池"""
+    loop = asyncio.get_running_loop()
+    stats = get_stats(name)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(name)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=HTTP2,
+                limits=LIMITS,
+                timeout=make_timeout(DEFAULT_TOTAL_TIMEOUT),
+                event_hooks=_async_event_hooks(stats),
+            )
+            clients[name] = client
+        return client
+
+
+async def arequest_with_deadline(client: httpx.AsyncClient, method, url, timeout, **kwargs) -> httpx.Response:
+    """异步版本的 request_with_deadline，超时或调用方取消时立即中断请求"""
+    try:
+        return await asyncio.wait_for(
+            client.request(method, url, timeout=make_timeout(timeout), **kwargs), timeout
+        )
+    except asyncio.TimeoutError:
+        raise httpx.ReadTimeout(f"请求超过 {timeout} 秒") from None
+
+
+async def asend_stream(client: httpx.AsyncClient, request: httpx.Request) -> httpx.Response:
+    """发送流式请求并检查状态码，返回尚未读取正文的响应（调用方负责 aclose）
+
+    错误状态码时读完错误信息、关闭响应后抛出 httpx.HTTPStatusError，便于重试。
+    """
+    response = await client.send(request, stream=True)
+    if response.is_error:
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        response.raise_for_status()
+    return response
+
+
+def send_stream(client: httpx.Client, request: httpx.Request) -> httpx.Response:
+    """asend_stream 的同步版本（调用方负责 close）"""
+    response = client.send(request, stream=True)
+    if response.is_error:
+        try:
+            response.read()
+        finally:
+            response.close()
+        response.raise_for_status()
+    return response
+
+
+class _RemainingTimeout(dict):
+    """httpcore 在每次建连、等待连接池、读写套接字前都从这里取超时，取到的是不超过截止时间的剩余秒数"""
+
+    def __init__(self, timeouts, deadline):
+        super().__init__(timeouts)
+        self.deadline = deadline
+
+    def get(self, key, default=None):
+        timeout = super().get(key, default)
+        # 剩余时间用完时给一个极小的正数，让下一次套接字操作立即超时（0 会变成非阻塞模式）
+        remaining = max(self.deadline - time.monotonic(), 0.001)
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+
+def _abort_http11(response):
+    """截止时间到了仍在读 HTTP/1.1 响应正文：关闭套接字，让阻塞的读取立即返回"""
+    stream = response.extensions.get("network_stream")
+    sock = stream.get_extra_info("socket") if stream is not None else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def request_with_deadline(client: httpx.Client, method, url, timeout, **kwargs) -> httpx.Response:
+    """发送请求，整个请求（等待连接、建连、上传、等待、读取响应）必须在 timeout 秒内完成
+
+    每次套接字操作的超时都缩短为距截止时间的剩余秒数；HTTP/1.1 读取正文时 httpcore 只取一次超时，
+    另用定时器在截止时间关闭这个请求独占的连接。超时抛出 httpx.TimeoutException，不会有请求在后台继续运行。
+    """
+    deadline = time.monotonic() + timeout
+    request = client.build_request(method, url, timeout=make_timeout(timeout), **kwargs)
+    request.extensions["timeout"] = _RemainingTimeout(request.extensions["timeout"], deadline)
+    response = client.send(request, stream=True)
+    watchdog = None
+    try:
+        if response.http_version == "HTTP/1.1":
+            # HTTP/2 每次读取都会重新取超时；它的连接由多个请求共用，不能直接关闭
+            watchdog = threading.Timer(max(deadline - time.monotonic(), 0), _abort_http11, (response,))
+            watchdog.daemon = True
+            watchdog.start()
+        chunks = []
+        for chunk in response.iter_raw():
+            chunks.append(chunk)
+            if time.monotonic() > deadline:
+                raise httpx.ReadTimeout(f"请求超过 {timeout} 秒", request=request)
+    except httpx.TransportError as e:
+        if time.monotonic() >= deadline and not isinstance(e, httpx.TimeoutException):
+            raise httpx.ReadTimeout(f"请求超过 {timeout} 秒", request=request) from e
+        raise
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        response.close()
+    return httpx.Response(
+        response.status_code,
+        headers=response.headers,
+        content=b"".join(chunks),
+        request=request,
+        extensions=response.extensions,
+    )
+
+
+def warmup(name, url):
+    """提前建立到 url 所在主机的连接，第一次真正的请求就能复用"""
+    try:
+        get_client(name).head(url, timeout=make_timeout(CONNECT_TIMEOUT * 2))
+    except httpx.HTTPError as e:
+        logger.warning(f"预热连接失败 ({name}): {e}")
+
+
+async def awarmup(name, url):
+    """warmup 的异步版本，预热当前事件循环的连接池"""
+    try:
+        await get_async_client(name).head(url, timeout=make_timeout(CONNECT_TIMEOUT * 2))
+    except httpx.HTTPError as e:
+        logger.warning(f"预热连接失败 ({name}): {e}")
+
+
+def connection_stats():
+    """所有共享客户端的连接复用统计"""
+    with _lock:
+        names = list(_stats)
+    return {name: get_stats(name).snapshot() for name in names}
+
+
+def _pool_usage(client):
+    """读取 httpcore 连接池的当前状态（内部属性，读不到时按空池处理）"""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", ()))
+    requests = list(getattr(pool, "_requests", ()))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    queued = sum(1 for request in requests if request.is_queued())
+    return len(connections), idle, len(requests) - queued, queued
+
+
+def pool_stats():
+    """各共享客户端（同步和所有事件循环的异步客户端合计）的连接池使用情况"""
+    with _lock:
+        clients = list(_clients.items())
+        for loop_clients in list(_async_clients.values()):
+            clients.extend(loop_clients.items())
+    stats = {}
+    for name, client in clients:
+        if client.is_closed:
+            continue
+        usage = stats.setdefault(name, {
+            "connections": 0, "idle": 0, "active_requests": 0, "queued_requests": 0,
+            "max_connections": LIMITS.max_connections,
+        })
+        connections, idle, active, queued = _pool_usage(client)
+        usage["connections"] += connections
+        usage["idle"] += idle
+        usage["active_requests"] += active
+        usage["queued_requests"] += queued
+    return stats
+
+
+def close_clients():
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose_clients():
+    """关闭当前事件循环的异步客户端"""
+    with _lock:
+        clients = list(_async_clients.pop(asyncio.get_running_loop(), {}).values())
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,324 @@
+"""外部 API 调用的重试与熔断
+
+所有对外请求都通过 get_endpoint(名称).call / acall 发出（同一服务共用一个端点）：
+- 429、5xx、连接错误、超时按指数退避重试，退避时间带随机抖动；响应带 Retry-After 时按它等待
+- 每个端点有重试预算：每个请求存入 API_RETRY_BUDGET_RATIO 个令牌，每次重试消耗一个，
+  服务大面积出错时重试量最多是正常流量的这个比例，不会把服务压垮
+- 熔断器：连续失败 CIRCUIT_FAILURE_THRESHOLD 次后打开，CIRCUIT_RESET_SECONDS 内的请求直接抛出
+  CircuitOpenError（或调用 fallback），不再等完整的超时；之后放行一个探测请求，成功即恢复
+
+配置（环境变量；API_<端点名>_ATTEMPTS / BASE_DELAY / MAX_DELAY / BUDGET_RATIO / FAILURE_THRESHOLD /
+RESET_SECONDS 可以单独覆盖某个端点，如 API_GROQ_ASR_ATTEMPTS）：
+- API_RETRY_ATTEMPTS：最多尝试次数（含第一次），默认 3
+- API_RETRY_BASE_DELAY / API_RETRY_MAX_DELAY：退避的初始值和上限（秒）
+- API_RETRY_BUDGET_RATIO：重试预算比例，默认 0.2
+- CIRCUIT_FAILURE_THRESHOLD / CIRCUIT_RESET_SECONDS：熔断阈值和熔断时长
+"""
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+
+import httpx
+
+from .logger import logger
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+_RETRYABLE_ERRORS = [httpx.TransportError, TimeoutError, asyncio.TimeoutError, ConnectionError]
+try:
+    import openai
+    _RETRYABLE_ERRORS.append(openai.APIConnectionError)  # 包括 APITimeoutError
+except ImportError:
+    pass
+try:
+    import requests
+    _RETRYABLE_ERRORS.extend([requests.ConnectionError, requests.Timeout])
+except ImportError:
+    pass
+RETRYABLE_ERRORS = tuple(_RETRYABLE_ERRORS)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，请求未发出"""
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"{endpoint} 暂时不可用（熔断中，{retry_in:.1f}秒后重试）")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def status_code(result):
+    """异常或响应对象上的 HTTP 状态码（httpx、requests、openai 通用）"""
+    code = getattr(result, "status_code", None)
+    if code is None:
+        code = getattr(getattr(result, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def retry_after(result):
+    """从响应头读取 Retry-After（秒数或 HTTP 日期），没有时返回 None"""
+    response = result if hasattr(result, "headers") else getattr(result, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return status_code(error) in RETRYABLE_STATUS
+
+
+def _env_name(name):
+    return "".join(c if c.isalnum() else "_" for c in name).upper()
+
+
+def _setting(name, key, global_env, default):
+    """端点单独的配置 API_<端点名>_<key> 优先，其次是全局配置"""
+    return float(os.getenv(f"API_{_env_name(name)}_{key}", os.getenv(global_env, default)))
+
+
+class CircuitBreaker:
+    """连续失败计数熔断器（线程安全）"""
+
+    def __init__(self, name, failure_threshold, reset_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_total = 0
+        self.short_circuited = 0
+        self._probing = False
+
+    def before_call(self):
+        """请求前检查，熔断中抛出 CircuitOpenError；半开状态只放行一个探测请求"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == OPEN and retry_in <= 0:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                logger.info(f"熔断器半开，发送探测请求: {self.name}")
+                return
+            self.short_circuited += 1
+            raise CircuitOpenError(self.name, max(retry_in, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"熔断器关闭，服务已恢复: {self.name}")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    self.opened_total += 1
+                    logger.warning(f"熔断器打开: {self.name}（连续失败 {self.failures} 次）")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def release_probe(self):
+        """探测请求既没成功也没失败（如被取消、4xx）时允许下一个请求继续探测"""
+        with self._lock:
+            self._probing = False
+
+
+class Endpoint:
+    """一个外部端点的重试策略、重试预算和熔断器"""
+
+    def __init__(self, name, attempts=None, base_delay=None, max_delay=None):
+        self.name = name
+        self.attempts = max(int(attempts or _setting(name, "ATTEMPTS", "API_RETRY_ATTEMPTS", "3")), 1)
+        self.base_delay = (base_delay if base_delay is not None
+                           else _setting(name, "BASE_DELAY", "API_RETRY_BASE_DELAY", "0.2"))
+        self.max_delay = (max_delay if max_delay is not None
+                          else _setting(name, "MAX_DELAY", "API_RETRY_MAX_DELAY", "5"))
+        self.budget_ratio = _setting(name, "BUDGET_RATIO", "API_RETRY_BUDGET_RATIO", "0.2")
+        self.budget_cap = max(self.budget_ratio * 50, 1.0)  # 空闲后最多攒下的重试次数
+        self.breaker = CircuitBreaker(
+            name,
+            int(_setting(name, "FAILURE_THRESHOLD", "CIRCUIT_FAILURE_THRESHOLD", "5")),
+            _setting(name, "RESET_SECONDS", "CIRCUIT_RESET_SECONDS", "30"),
+        )
+        self._lock = threading.Lock()
+        self._tokens = self.budget_cap
+        self.requests = 0
+        self.retries = 0
+        self.retries_denied = 0
+        self.failures = 0
+
+    def _deposit(self):
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self._tokens + self.budget_ratio, self.budget_cap)
+
+    def _take_retry(self):
+        with self._lock:
+            if self._tokens < 1:
+                self.retries_denied += 1
+                return False
+            self._tokens -= 1
+            self.retries += 1
+            return True
+
+    def _backoff(self, attempt, result):
+        delay = retry_after(result)
+        if delay is None:
+            # full jitter：在 [0, base * 2^attempt] 内随机，避免大量客户端同时重试
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return min(delay, self.max_delay)
+
+    def _finish_attempt(self, attempt, result, error):
+        """记录一次尝试的结果，返回需要等待的秒数；不再重试时返回 None
+
+        可重试的错误同时计为服务故障。fn 返回的响应对象状态码可重试时同样重试，
+        最后一次仍原样返回给调用方处理。
+        """
+        if error is not None:
+            retryable = is_retryable(error)
+        else:
+            retryable = status_code(result) in RETRYABLE_STATUS
+        if retryable:
+            self.breaker.record_failure()
+            with self._lock:
+                self.failures += 1
+        elif error is None:
+            self.breaker.record_success()
+        else:
+            self.breaker.release_probe()  # 4xx 等说明服务在线，但不能作为恢复的依据
+
+        if not retryable or attempt + 1 >= self.attempts or self.breaker.state == OPEN:
+            return None
+        if not self._take_retry():
+            return None
+        delay = self._backoff(attempt, error if error is not None else result)
+        code = status_code(error if error is not None else result)
+        reason = f"HTTP {code}" if code else repr(error)
+        logger.warning(f"{self.name} 请求失败（{reason}），{delay:.2f}秒后第 {attempt + 1} 次重试")
+        return delay
+
+    def call(self, fn, *args, fallback=None, **kwargs):
+        """同步调用 fn(*args, **kwargs)，按策略重试；熔断或失败且提供了 fallback 时返回 fallback()"""
+        self._deposit()
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                if fallback is not None:
+                    return fallback()
+                raise
+            try:
+                result, error = fn(*args, **kwargs), None
+            except Exception as e:
+                result, error = None, e
+            delay = self._finish_attempt(attempt, result, error)
+            if delay is None:
+                if error is None:
+                    return result
+                if fallback is not None and is_retryable(error):
+                    logger.warning(f"{self.name} 请求失败，使用备用结果: {error}")
+                    return fallback()
+                raise error
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, fn, *args, fallback=None, **kwargs):
+        """异步版本，fn 返回协程；取消时立即停止，不计入熔断"""
+        self._deposit()
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                if fallback is not None:
+                    return fallback()
+                raise
+            try:
+                result, error = await fn(*args, **kwargs), None
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                result, error = None, e
+            delay = self._finish_attempt(attempt, result, error)
+            if delay is None:
+                if error is None:
+                    return result
+                if fallback is not None and is_retryable(error):
+                    logger.warning(f"{self.name} 请求失败，使用备用结果: {error}")
+                    return fallback()
+                raise error
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def snapshot(self):
+        breaker = self.breaker
+        return {
+            "state": breaker.state,
+            "consecutive_failures": breaker.failures,
+            "opened_total": breaker.opened_total,
+            "short_circuited": breaker.short_circuited,
+            "requests": self.requests,
+            "failures": self.failures,
+            "retries": self.retries,
+            "retries_denied": self.retries_denied,
+            "retry_tokens": round(self._tokens, 2),
+        }
+
+
+_endpoints = {}
+_lock = threading.Lock()
+
+
+def get_endpoint(name, **defaults) -> Endpoint:
+    """按名称获取共享的端点（同一服务的所有实例共用熔断状态）
+
+    defaults 为该端点的默认策略（如 attempts=2），环境变量中的单独配置优先。
+    """
+    with _lock:
+        endpoint = _endpoints.get(name)
+        if endpoint is None:
+            overrides = {k: v for k, v in defaults.items() if f"API_{_env_name(name)}_{k.upper()}" not in os.environ}
+            endpoint = _endpoints[name] = Endpoint(name, **overrides)
+        return endpoint
+
+
+def endpoint_stats():
+    """所有端点的熔断状态和重试统计"""
+    with _lock:
+        endpoints = list(_endpoints.values())
+    return {endpoint.name: endpoint.snapshot() for endpoint in endpoints}